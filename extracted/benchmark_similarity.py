@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+File Similarity Benchmark
+
+Generates reproducible synthetic corpora and measures how fast each
+comparison engine and mode of compare_file_similarity.py runs on them,
+and how close its results are to the exhaustive ground truth.
+"""
+
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import platform
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from compare_file_similarity import STAGE_SEQUENCE_MATCHER, compare_files
+
+
+# Constants
+BENCHMARK_FORMAT_VERSION = 1  # Bump when the JSON report layout changes
+WORDS = (
+    "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi omicron pi rho "
+    "sigma tau upsilon phi chi psi omega config value return import class def self data file "
+    "path error result index cache worker thread stream record").split()
+
+# Modes compared against the reference; each maps to compare_files options. The reference
+# visits every pair; its prefilter bounds are exact, so it still finds every similar pair
+REFERENCE_MODE = 'reference'
+MODES: Dict[str, Dict[str, Any]] = {
+    REFERENCE_MODE: {'size_window': False, 'exact_duplicates': False},
+    'exhaustive': {},
+    'line': {'metric': 'line'},
+    'lsh': {'engine': 'lsh'},
+    'workers': {'workers': 4},
+}
+
+
+def generate_corpus(root_dir: Path, num_files: int = 100, mean_size: int = 1500, size_sigma: float = 0.8,
+                    near_duplicate_rate: float = 0.3, mutation_rate: float = 0.02,
+                    seed: int = 0) -> Dict[str, Any]:
+    """
+    Write a reproducible synthetic corpus of text files.
+    
+    Original files get a log-normal size around mean_size, made of random
+    lines of words. A near_duplicate_rate share of the files are instead
+    copies of an earlier file where each line is replaced, deleted or
+    followed by a new line with probability mutation_rate.
+    
+    Args:
+        root_dir: Directory to write the files to
+        num_files: Number of files
+        mean_size: Median size of original files in characters
+        size_sigma: Spread of the log-normal size distribution
+        near_duplicate_rate: Share of files derived from another file
+        mutation_rate: Per-line mutation probability of derived files
+        seed: Random seed; the same parameters always give the same corpus
+    
+    Returns:
+        The corpus parameters, for the benchmark report
+    """
+    rng = random.Random(seed)
+    
+    def random_line() -> str:
+        return " ".join(f"{rng.choice(WORDS)}_{rng.randrange(1000)}" for _ in range(rng.randint(3, 12))) + "\n"
+    
+    originals: List[List[str]] = []
+    for number in range(num_files):
+        if originals and rng.random() < near_duplicate_rate:
+            lines = []
+            for line in rng.choice(originals):
+                roll = rng.random()
+                if roll < mutation_rate / 3:
+                    lines.append(random_line())  # Replace
+                elif roll < 2 * mutation_rate / 3:
+                    continue  # Delete
+                else:
+                    lines.append(line)
+                    if roll < mutation_rate:
+                        lines.append(random_line())  # Insert
+        else:
+            size = int(mean_size * math.exp(rng.gauss(0, size_sigma)))
+            lines, length = [], 0
+            while length < size:
+                lines.append(random_line())
+                length += len(lines[-1])
+            originals.append(lines)
+        
+        path = root_dir / f"dir{number % 10}" / f"file{number:05d}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(lines), encoding='utf-8')
+    
+    return {
+        'num_files': num_files,
+        'mean_size': mean_size,
+        'size_sigma': size_sigma,
+        'near_duplicate_rate': near_duplicate_rate,
+        'mutation_rate': mutation_rate,
+        'seed': seed,
+    }
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Return the peak resident set size of this process and its children in KB."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_mode(root_dir: Path, threshold: float, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run compare_files once and measure it.
+    
+    Returns:
+        Dict with 'seconds', 'comparisons', 'pairs' (sorted relative path
+        pairs) and 'peak_rss_kb'
+    """
+    stats: Dict[str, int] = {}
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        pairs = compare_files(root_dir, threshold, stats=stats, **options)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'comparisons': stats.get(STAGE_SEQUENCE_MATCHER, 0),
+        'pairs': sorted(tuple(sorted((p1.relative_to(root_dir).as_posix(), p2.relative_to(root_dir).as_posix())))
+                        for p1, p2, _ in pairs),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def _run_mode_in_child(queue: multiprocessing.Queue, root_dir: Path, threshold: float,
+                       options: Dict[str, Any]) -> None:
+    """Process entry point for run_mode, so that peak RSS is measured per mode."""
+    queue.put(run_mode(root_dir, threshold, options))
+
+
+def run_isolated(root_dir: Path, threshold: float, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a mode in a fresh process and return its measurements."""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_mode_in_child, args=(queue, root_dir, threshold, options))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def precision_recall(found: Set[Tuple[str, str]], truth: Set[Tuple[str, str]]) -> Tuple[float, float]:
+    """Return (precision, recall) of found pairs against the ground truth."""
+    correct = len(found & truth)
+    precision = correct / len(found) if found else 1.0
+    recall = correct / len(truth) if truth else 1.0
+    return precision, recall
+
+
+def run_benchmark(root_dir: Path, corpus: Dict[str, Any], modes: List[str], threshold: float = 0.90,
+                  repeat: int = 1, isolate: bool = True) -> Dict[str, Any]:
+    """
+    Benchmark each mode on a corpus.
+    
+    The reference mode (every pair of the exhaustive engine) always runs
+    first and provides the ground truth for precision and recall.
+    
+    Args:
+        root_dir: Directory holding the corpus
+        corpus: Corpus parameters, copied into the report
+        modes: Names of MODES to run
+        threshold: Similarity threshold
+        repeat: Runs per mode; the fastest one is reported
+        isolate: Run each mode in its own process so peak RSS is per mode
+    
+    Returns:
+        The benchmark report
+    """
+    num_files = corpus['num_files']
+    all_pairs = num_files * (num_files - 1) // 2
+    runner = run_isolated if isolate else run_mode
+    
+    results = []
+    truth: Set[Tuple[str, str]] = set()
+    for name in [REFERENCE_MODE] + [mode for mode in modes if mode != REFERENCE_MODE]:
+        runs = [runner(root_dir, threshold, MODES[name]) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['seconds'])
+        found = set(map(tuple, best['pairs']))
+        if name == REFERENCE_MODE:
+            truth = found
+        precision, recall = precision_recall(found, truth)
+        seconds = max(best['seconds'], 1e-9)
+        results.append({
+            'mode': name,
+            'options': MODES[name],
+            'seconds': round(best['seconds'], 4),
+            'files_per_sec': round(num_files / seconds, 1),
+            'pairs_per_sec': round(all_pairs / seconds, 1),
+            'comparisons': best['comparisons'],
+            'matches': len(found),
+            'precision': round(precision, 4),
+            'recall': round(recall, 4),
+            'peak_rss_kb': max((run['peak_rss_kb'] for run in runs if run['peak_rss_kb'] is not None),
+                               default=None),
+        })
+        print(f"{name:<12} {best['seconds']:>9.3f}s {results[-1]['pairs_per_sec']:>14,.0f} pairs/s "
+              f"{len(found):>7} matches  precision {precision:.3f}  recall {recall:.3f}", file=sys.stderr)
+    
+    return {
+        'version': BENCHMARK_FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'threshold': threshold,
+        'corpus': corpus,
+        'results': results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse command line arguments.
+    
+    Args:
+        argv: Argument list (defaults to sys.argv[1:])
+    
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the file similarity engine on a synthetic corpus.")
+    parser.add_argument('--files', type=int, default=100, help="Number of files (default: %(default)s)")
+    parser.add_argument('--mean-size', type=int, default=1500,
+                        help="Median size of original files in characters (default: %(default)s)")
+    parser.add_argument('--size-sigma', type=float, default=0.8,
+                        help="Spread of the log-normal size distribution (default: %(default)s)")
+    parser.add_argument('--near-duplicate-rate', type=float, default=0.3,
+                        help="Share of files derived from another file (default: %(default)s)")
+    parser.add_argument('--mutation-rate', type=float, default=0.02,
+                        help="Per-line mutation probability of derived files (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="Corpus random seed (default: %(default)s)")
+    parser.add_argument('--threshold', type=float, default=0.90,
+                        help="Similarity threshold (default: %(default)s)")
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=sorted(MODES),
+                        help="Modes to run; the reference mode always runs")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Runs per mode, reporting the fastest (default: %(default)s)")
+    parser.add_argument('--output', type=Path, default=None,
+                        help="Write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Generate a corpus, benchmark the selected modes and write the JSON report."""
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root_dir = Path(tmpdir)
+        corpus = generate_corpus(root_dir, args.files, args.mean_size, args.size_sigma,
+                                 args.near_duplicate_rate, args.mutation_rate, args.seed)
+        report = run_benchmark(root_dir, corpus, args.modes, args.threshold, args.repeat)
+    
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,31 @@ Compares all files in the current directory and subdirectories to identify
 files with 90% or more similar content.
 """
 
+import argparse
+import codecs
+import csv
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import os
+import sqlite3
 import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import redirect_stdout
+from collections import Counter, OrderedDict, defaultdict
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
 from pathlib import Path
-from typing import List, Tuple, Set
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Set, TextIO, Union
 from difflib import SequenceMatcher
+from fnmatch import fnmatchcase
 import mimetypes
 
 
@@ -17,218 +38,2588 @@ import mimetypes
 MAX_FILE_SIZE_MB = 10  # Maximum file size to compare (in MB)
 PROGRESS_UPDATE_INTERVAL = 100  # Update progress every N comparisons (interactive)
 NON_INTERACTIVE_PROGRESS_INTERVAL = 1000  # Update progress every N comparisons (non-interactive)
+DEFAULT_CACHE_SIZE_MB = 256  # Decoded file contents kept in memory during a scan
+BLOCKS_PER_WORKER = 16  # Pair-space blocks queued per worker process, for load balancing
+SCAN_THREADS = 8  # Threads sniffing files without a known text extension during the scan
+SNIFF_SIZE = 8192  # Leading bytes read to tell text from binary
+SNIFF_PREFIX_BUDGET_MB = 16  # Sniffed prefixes kept for the content loader during a scan
+
+# Directory names never descended into
+DEFAULT_EXCLUDE_DIRS = frozenset({
+    '.git',
+    '__pycache__',
+    'node_modules',
+    '.pytest_cache',
+    '.venv',
+    'venv',
+    'dist',
+    'build',
+    '.tox'
+})
+
+# Extensions treated as text without opening the file
+TEXT_EXTENSIONS = frozenset({
+    '.py', '.txt', '.md', '.json', '.yaml', '.yml', '.xml', '.html',
+    '.css', '.js', '.ts', '.java', '.c', '.cpp', '.h', '.hpp',
+    '.sh', '.bash', '.ps1', '.csv', '.sql', '.go', '.rs', '.rb',
+    '.php', '.pl', '.swift', '.kt', '.scala', '.r', '.m', '.lua',
+    '.vim', '.ini', '.cfg', '.conf', '.toml', '.feature'
+})
+
+# Streaming comparison of files above MAX_FILE_SIZE_MB
+STREAM_READ_SIZE = 64 * 1024  # Longest line read at once; longer lines are split
+STREAM_BOUNDARY_MASK = 0xF  # A chunk ends after a line whose hash has these bits clear (~16 lines)
+STREAM_SKETCH_SIZE = 256  # Smallest chunk hashes kept per file (bottom-k sketch)
+
+# Prefilter stages, cheapest first; each stage proves some pairs cannot reach the threshold
+STAGE_REAL_QUICK_RATIO = 'real_quick_ratio'  # Length bound: 2 * min(len) / total length
+STAGE_QUICK_RATIO = 'quick_ratio'  # Character multiset bound
+STAGE_SEQUENCE_MATCHER = 'sequence_matcher'  # Full SequenceMatcher.ratio(), no elimination
+PREFILTER_STAGES = (STAGE_REAL_QUICK_RATIO, STAGE_QUICK_RATIO)
+STAGE_SIZE_WINDOW = 'size_window'  # Pairs never generated because their lengths are too far apart
+STAGE_STREAM_SKETCH = 'stream_sketch'  # Pairs with a file above MAX_FILE_SIZE_MB, estimated from sketches
+STAGE_EXACT_DUPLICATE = 'exact_duplicate'  # Files collapsed into a byte-identical representative
+HASH_READ_SIZE = 1024 * 1024  # Bytes hashed at a time when looking for exact duplicates
+CHECKPOINT_INTERVAL = 10000  # Comparisons between checkpoints in a results stream
+RESULTS_FORMAT_VERSION = 1  # Bump when results stream records change incompatibly
+
+# Similarity metrics
+METRIC_CHAR = 'char'  # SequenceMatcher over the characters of each file
+METRIC_LINE = 'line'  # SequenceMatcher over per-line hashes
+METRICS = (METRIC_CHAR, METRIC_LINE)
+DEFAULT_METRIC = METRIC_CHAR
+COUNTS_ENTRY_BYTES = 64  # Estimated key and count objects per histogram entry, beyond the dict
+_LINE_HASH_MASK = (1 << 63) - 1  # Keep line hashes within a signed 64-bit array
+
+# Comparison engines
+ENGINE_EXHAUSTIVE = 'exhaustive'  # Compare every pair of files
+ENGINE_LSH = 'lsh'  # Only compare MinHash/LSH candidate pairs
+ENGINES = (ENGINE_EXHAUSTIVE, ENGINE_LSH)
+DEFAULT_ENGINE = ENGINE_EXHAUSTIVE
+
+# MinHash / LSH parameters
+SHINGLE_SIZE = 5  # Characters per shingle
+MINHASH_NUM_PERM = 128  # Signature length
+LSH_RECALL_MARGIN = 0.75  # Place the LSH S-curve below the expected Jaccard to favour recall
+_HASH_MASK = (1 << 64) - 1
+INDEX_SCHEMA_VERSION = 3  # Bump when the on-disk index layout or the meaning of its values changes
+DEFAULT_QUERY_RESULTS = 10  # Files returned by a nearest-neighbour query
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing constant used to spread crc32 values
+
+
+def has_text_name(file_path: Path) -> bool:
+    """Check if a file is text from its name alone, without opening it."""
+    # Check by extension first
+    mime_type, _ = mimetypes.guess_type(str(file_path))
+    if mime_type and mime_type.startswith('text'):
+        return True
+    
+    # Check common text extensions
+    return file_path.suffix.lower() in TEXT_EXTENSIONS
+
+
+def looks_like_text(data: bytes) -> bool:
+    """
+    Check if the leading bytes of a file look like text.
+    
+    Text has no NUL bytes and decodes as UTF-8. A multi-byte character cut
+    off at the end of the block is not counted against it.
+    """
+    if b'\0' in data:
+        return False
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def sniff_file(file_path: Path, sniff_size: int = SNIFF_SIZE) -> Tuple[bool, bytes]:
+    """
+    Read the first block of a file and classify it.
+    
+    Args:
+        file_path: Path to the file
+        sniff_size: Number of leading bytes to read
+        
+    Returns:
+        Tuple (is_text, prefix) where prefix holds the bytes read
+    """
+    with open(file_path, 'rb') as f:
+        prefix = f.read(sniff_size)
+    return looks_like_text(prefix), prefix
 
 
 def is_text_file(file_path: Path) -> bool:
     """
-    Check if a file is likely a text file.
+    Check if a file is likely a text file.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        True if the file appears to be text, False otherwise
+    """
+    if has_text_name(file_path):
+        return True
+    
+    # Try to read as text
+    try:
+        return sniff_file(file_path)[0]
+    except PermissionError:
+        return False
+
+
+class TextSniffer:
+    """
+    Text/binary classifier shared by the directory walker and the content loader.
+    
+    Files with a text name are accepted without being opened. Other files
+    are sniffed, and the bytes read are kept, up to max_prefix_bytes in
+    total, so the content loader does not read them again. Safe to call
+    from several threads.
+    """
+    
+    def __init__(self, sniff_size: int = SNIFF_SIZE,
+                 max_prefix_bytes: int = SNIFF_PREFIX_BUDGET_MB * 1024 * 1024):
+        self.sniff_size = sniff_size
+        self.max_prefix_bytes = max_prefix_bytes
+        self.prefix_bytes = 0
+        self.sniffed = 0
+        self._prefixes: Dict[Path, bytes] = {}
+        self._lock = threading.Lock()
+    
+    def is_text(self, file_path: Path) -> bool:
+        """
+        Check if a file is likely a text file.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            True if the file appears to be text, False otherwise
+        """
+        if has_text_name(file_path):
+            return True
+        
+        try:
+            verdict, prefix = sniff_file(file_path, self.sniff_size)
+        except OSError:
+            return False
+        
+        with self._lock:
+            self.sniffed += 1
+            if verdict and self.prefix_bytes + len(prefix) <= self.max_prefix_bytes:
+                self._prefixes[file_path] = prefix
+                self.prefix_bytes += len(prefix)
+        return verdict
+    
+    def take_prefix(self, file_path: Path) -> Optional[bytes]:
+        """Return and forget the bytes sniffed from a file, if they were kept."""
+        with self._lock:
+            prefix = self._prefixes.pop(file_path, None)
+            if prefix is not None:
+                self.prefix_bytes -= len(prefix)
+        return prefix
+
+
+def read_file_content(file_path: Path, max_size_mb: int = MAX_FILE_SIZE_MB,
+                      use_mmap: bool = False, prefix: Optional[bytes] = None) -> Optional[str]:
+    """
+    Read a file the same way calculate_similarity does.
+    
+    Args:
+        file_path: Path to the file
+        max_size_mb: Maximum file size in MB to read (default: 10MB)
+        use_mmap: Decode straight from a memory map instead of a read buffer
+        prefix: Leading bytes of the file already read while sniffing it;
+            only the rest of the file is read
+        
+    Returns:
+        The decoded content, or None if the file is too large or unreadable
+    """
+    try:
+        size = file_path.stat().st_size
+        if size / (1024 * 1024) > max_size_mb:
+            return None
+        
+        if prefix is not None and not use_mmap:
+            data = prefix
+            if len(prefix) < size:
+                with open(file_path, 'rb') as f:
+                    f.seek(len(prefix))
+                    data += f.read()
+            content = str(data, 'utf-8', 'ignore')
+            # Match the universal newline translation of text mode reads
+            return content.replace('\r\n', '\n').replace('\r', '\n')
+        
+        if use_mmap and size > 0:
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                content = str(mapped, 'utf-8', 'ignore')
+            # Match the universal newline translation of text mode reads
+            return content.replace('\r\n', '\n').replace('\r', '\n')
+        
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    except OSError as e:
+        print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        return None
+
+
+def compute_stream_sketch(stream: TextIO, sketch_size: int = STREAM_SKETCH_SIZE) -> Tuple[int, ...]:
+    """
+    Summarize a text stream as a bottom-k sketch of content-defined chunks.
+    
+    Lines are grouped into chunks that end after any line whose crc32 has
+    the STREAM_BOUNDARY_MASK bits clear, so boundaries depend only on local
+    content and an edit only changes the chunks around it. Only the
+    sketch_size smallest chunk hashes are kept, so memory stays flat
+    regardless of the stream length.
+    
+    Args:
+        stream: Text stream to read; lines longer than STREAM_READ_SIZE
+            characters are read in pieces
+        sketch_size: Number of chunk hashes to keep
+        
+    Returns:
+        Sorted tuple of at most sketch_size chunk hashes
+    """
+    heap: List[int] = []  # Negated hashes, so heap[0] is the largest kept hash
+    kept: Set[int] = set()
+    
+    def add_chunk(chunk_hash: int) -> None:
+        if chunk_hash in kept:
+            return
+        if len(heap) < sketch_size:
+            heapq.heappush(heap, -chunk_hash)
+            kept.add(chunk_hash)
+        elif chunk_hash < -heap[0]:
+            kept.discard(-heapq.heapreplace(heap, -chunk_hash))
+            kept.add(chunk_hash)
+    
+    digest = hashlib.blake2b(digest_size=8)
+    pending = False
+    for line in iter(lambda: stream.readline(STREAM_READ_SIZE), ''):
+        data = line.encode('utf-8')
+        digest.update(data)
+        pending = True
+        if zlib.crc32(data) & STREAM_BOUNDARY_MASK == 0:
+            add_chunk(int.from_bytes(digest.digest(), 'big'))
+            digest = hashlib.blake2b(digest_size=8)
+            pending = False
+    if pending:
+        add_chunk(int.from_bytes(digest.digest(), 'big'))
+    return tuple(sorted(kept))
+
+
+def compute_file_sketch(file_path: Path, sketch_size: int = STREAM_SKETCH_SIZE) -> Tuple[int, ...]:
+    """
+    Stream a file of any size into a bottom-k chunk sketch.
+    
+    Args:
+        file_path: Path to the file
+        sketch_size: Number of chunk hashes to keep
+        
+    Returns:
+        Sorted tuple of at most sketch_size chunk hashes
+    """
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return compute_stream_sketch(f, sketch_size)
+
+
+def compute_file_length(file_path: Path, metric: str = DEFAULT_METRIC) -> int:
+    """
+    Stream a file of any size and measure its length in the units of a metric.
+    
+    Args:
+        file_path: Path to the file
+        metric: 'char' counts decoded characters, 'line' counts lines the
+            way the line metric splits them
+    
+    Returns:
+        Number of characters or lines
+    """
+    length = 0
+    pending = ''  # Last character of the line still being read
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for chunk in iter(lambda: f.read(STREAM_READ_SIZE), ''):
+            if metric != METRIC_LINE:
+                length += len(chunk)
+                continue
+            lines = (pending + chunk).splitlines(keepends=True)
+            length += len(lines) - 1
+            pending = lines[-1][-1:]
+    return length + (1 if pending else 0)
+
+
+def sketch_similarity(sketch1: Tuple[int, ...], sketch2: Tuple[int, ...],
+                      sketch_size: int = STREAM_SKETCH_SIZE) -> float:
+    """
+    Estimate similarity from two bottom-k chunk sketches.
+    
+    The Jaccard similarity J of the chunk sets is estimated from the
+    sketch_size smallest hashes of their union, and reported as the Dice
+    coefficient 2J / (1 + J), the same 2 * matches / total form as
+    SequenceMatcher.ratio().
+    
+    Args:
+        sketch1: Sketch of the first file
+        sketch2: Sketch of the second file
+        sketch_size: Sketch size both sketches were computed with
+        
+    Returns:
+        Estimated similarity ratio (0.0 to 1.0)
+    """
+    if not sketch1 and not sketch2:
+        return 1.0
+    members1, members2 = set(sketch1), set(sketch2)
+    union = heapq.nsmallest(sketch_size, members1 | members2)
+    shared = sum(1 for chunk_hash in union if chunk_hash in members1 and chunk_hash in members2)
+    jaccard = shared / len(union)
+    return 2 * jaccard / (1 + jaccard)
+
+
+class FileContentCache:
+    """
+    Read-once cache of decoded file contents for a single scan.
+    
+    Contents are kept in least-recently-used order and evicted once their
+    combined size exceeds max_bytes. File sizes and the chunk sketches of
+    files above max_size_mb are small and cached separately, so repeated
+    size checks do not hit the filesystem and large files are streamed once.
+    With a sniffer, bytes already read while classifying a file are reused.
+    
+    The sequences and histograms content_similarity needs (see
+    content_features) are cached with the content they were computed from,
+    counted against max_bytes and evicted with it.
+    """
+    
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_SIZE_MB * 1024 * 1024,
+                 max_size_mb: int = MAX_FILE_SIZE_MB, use_mmap: bool = False,
+                 stream_large_files: bool = True, sizes: Optional[Dict[Path, int]] = None,
+                 sniffer: Optional[TextSniffer] = None):
+        self.max_bytes = max_bytes
+        self.max_size_mb = max_size_mb
+        self.use_mmap = use_mmap
+        self.stream_large_files = stream_large_files
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._contents: 'OrderedDict[Path, Tuple[Optional[str], int]]' = OrderedDict()
+        self._sizes: Dict[Path, int] = dict(sizes) if sizes else {}
+        self.sniffer = sniffer
+        self._sketches: Dict[Path, Tuple[int, ...]] = {}
+        self._features: Dict[Path, Tuple[str, ContentFeatures, int]] = {}  # path -> (metric, features, cost)
+    
+    def is_large(self, file_path: Path) -> bool:
+        """Return True if a file is above max_size_mb and can only be streamed."""
+        return self.get_size(file_path) / (1024 * 1024) > self.max_size_mb
+    
+    def get_sketch(self, file_path: Path) -> Tuple[int, ...]:
+        """Return the chunk sketch of a file, streaming it only once."""
+        sketch = self._sketches.get(file_path)
+        if sketch is None:
+            sketch = self._sketches[file_path] = compute_file_sketch(file_path)
+        return sketch
+    
+    def get_length(self, file_path: Path, metric: str = DEFAULT_METRIC) -> Optional[int]:
+        """
+        Return the length used to order a file against others.
+        
+        Args:
+            file_path: Path to the file
+            metric: Similarity metric the length is measured in
+        
+        Returns:
+            The decoded content length, in characters or in lines for the
+            line metric (files compared by streaming are measured the same
+            way), or None if the file cannot be compared
+        """
+        try:
+            if self.is_large(file_path):
+                return compute_file_length(file_path, metric) if self.stream_large_files else None
+        except OSError:
+            return None
+        if metric == METRIC_LINE:
+            features = self.get_features(file_path, metric)
+            return None if features is None else len(features[0])
+        content = self.get_content(file_path)
+        return None if content is None else len(content)
+    
+    def get_size(self, file_path: Path) -> int:
+        """Return the size of a file in bytes, calling stat() at most once."""
+        size = self._sizes.get(file_path)
+        if size is None:
+            size = self._sizes[file_path] = file_path.stat().st_size
+        return size
+    
+    def get_content(self, file_path: Path) -> Optional[str]:
+        """
+        Return the decoded content of a file, reading it only on a miss.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            The decoded content, or None if the file is too large or unreadable
+        """
+        entry = self._contents.get(file_path)
+        if entry is not None:
+            self.hits += 1
+            self._contents.move_to_end(file_path)
+            return entry[0]
+        
+        self.misses += 1
+        try:
+            too_large = self.is_large(file_path)
+        except OSError as e:
+            print(f"Error reading {file_path}: {e}", file=sys.stderr)
+            return None
+        prefix = self.sniffer.take_prefix(file_path) if self.sniffer is not None else None
+        content = None if too_large else read_file_content(file_path, self.max_size_mb, self.use_mmap, prefix)
+        
+        cost = sys.getsizeof(content)
+        if cost <= self.max_bytes:
+            self._contents[file_path] = (content, cost)
+            self.current_bytes += cost
+            self._evict()
+        return content
+    
+    def get_features(self, file_path: Path, metric: str = DEFAULT_METRIC) -> Optional['ContentFeatures']:
+        """
+        Return content_features() of a file, computing them once per cached content.
+        
+        Args:
+            file_path: Path to the file
+            metric: Similarity metric the features are for
+            
+        Returns:
+            The features, or None if the file is too large or unreadable
+        """
+        cached = self._features.get(file_path)
+        if cached is not None and cached[0] == metric:
+            self.hits += 1
+            self._contents.move_to_end(file_path)
+            return cached[1]
+        
+        entry = self._contents.get(file_path)
+        content = entry[0] if entry is not None else self.get_content(file_path)
+        if content is None:
+            return None
+        features = content_features(content, metric)
+        entry = self._contents.get(file_path)
+        if entry is not None:
+            sequence, counts = features
+            cost = sys.getsizeof(counts) + COUNTS_ENTRY_BYTES * len(counts)
+            if sequence is not content:
+                cost += sys.getsizeof(sequence)
+            if cached is not None:
+                # Features for another metric, replaced
+                self.current_bytes -= cached[2]
+                entry = (entry[0], entry[1] - cached[2])
+            self._features[file_path] = (metric, features, cost)
+            self._contents[file_path] = (entry[0], entry[1] + cost)
+            self._contents.move_to_end(file_path)
+            self.current_bytes += cost
+            self._evict()
+        return features
+    
+    def _evict(self) -> None:
+        """Drop least recently used contents, and their features, down to max_bytes."""
+        while self.current_bytes > self.max_bytes:
+            evicted_path, (_, evicted_cost) = self._contents.popitem(last=False)
+            self._features.pop(evicted_path, None)
+            self.current_bytes -= evicted_cost
+            self.evictions += 1
+
+
+# Sequence compared by SequenceMatcher for one content, and the histogram of its items
+ContentFeatures = Tuple[Union[str, array], Counter]
+
+
+def _line_hashes(content: str) -> array:
+    """
+    Hash each line of a file's content to a 63-bit integer.
+    
+    Trailing whitespace is ignored. The crc32 and adler32 of the line are
+    combined so that the hashes are stable across processes and runs.
+    """
+    hashes = array('q')
+    for line in content.splitlines():
+        data = line.rstrip().encode('utf-8')
+        hashes.append(((zlib.crc32(data) << 32) | zlib.adler32(data)) & _LINE_HASH_MASK)
+    return hashes
+
+
+def content_features(content: str, metric: str = DEFAULT_METRIC) -> ContentFeatures:
+    """
+    Return what content_similarity compares for a file's content.
+    
+    Returns:
+        Tuple (sequence, histogram): the content itself and its character
+        histogram for the 'char' metric, or the per-line hashes and their
+        multiset for the 'line' metric
+    """
+    sequence = _line_hashes(content) if metric == METRIC_LINE else content
+    return sequence, Counter(sequence)
+
+
+def content_similarity(content1: Optional[str], content2: Optional[str], threshold: Optional[float] = None,
+                       stats: Optional[Dict[str, int]] = None, metric: str = DEFAULT_METRIC,
+                       features: Optional[Tuple[ContentFeatures, ContentFeatures]] = None) -> float:
+    """
+    Calculate similarity between two decoded file contents.
+    
+    The 'char' metric runs SequenceMatcher over the characters of both
+    contents. The 'line' metric runs it over arrays of per-line hashes,
+    which is much faster on source code and is not thrown off by the
+    autojunk heuristic on long files with repeated characters.
+    
+    With a threshold, cheap upper bounds on SequenceMatcher.ratio() are
+    checked first and the pair is rejected as soon as one of them falls
+    below the threshold. Every bound is at least the exact ratio, so any
+    pair reaching the threshold still gets its exact ratio.
+    
+    Args:
+        content1: Content of the first file; unused when features are given
+        content2: Content of the second file; unused when features are given
+        threshold: Optional minimum ratio of interest; enables the prefilters
+        stats: Optional counters, incremented by the name of the stage that
+            settled the pair
+        metric: 'char' or 'line'
+        features: Optional content_features() of both contents for this
+            metric, e.g. from FileContentCache.get_features, so that they
+            are not recomputed for every pair
+        
+    Returns:
+        Similarity ratio (0.0 to 1.0), or an upper bound on it that is
+        below threshold if a prefilter rejected the pair
+    """
+    if features is not None:
+        (sequence1, counts1), (sequence2, counts2) = features
+    elif metric == METRIC_LINE:
+        sequence1, sequence2 = _line_hashes(content1), _line_hashes(content2)
+        counts1 = counts2 = None
+    else:
+        sequence1, sequence2 = content1, content2
+        counts1 = counts2 = None
+    
+    total_length = len(sequence1) + len(sequence2)
+    if threshold is not None and total_length:
+        # Same as SequenceMatcher.real_quick_ratio(), without building a matcher
+        bound = 2.0 * min(len(sequence1), len(sequence2)) / total_length
+        if bound < threshold:
+            return _count_stage(stats, STAGE_REAL_QUICK_RATIO, bound)
+        
+        # Same as SequenceMatcher.quick_ratio(), from per-file histograms of
+        # characters, or of lines for the line metric
+        if counts1 is None:
+            counts1, counts2 = Counter(sequence1), Counter(sequence2)
+        common = counts1 & counts2
+        bound = 2.0 * sum(common.values()) / total_length
+        if bound < threshold:
+            return _count_stage(stats, STAGE_QUICK_RATIO, bound)
+    
+    # Use SequenceMatcher to calculate similarity
+    matcher = SequenceMatcher(None, sequence1, sequence2, autojunk=metric != METRIC_LINE)
+    return _count_stage(stats, STAGE_SEQUENCE_MATCHER, matcher.ratio())
+
+
+def _count_stage(stats: Optional[Dict[str, int]], stage: str, similarity: float) -> float:
+    """Record which stage settled a pair and pass its similarity through."""
+    if stats is not None:
+        stats[stage] = stats.get(stage, 0) + 1
+    return similarity
+
+
+def calculate_similarity(file1_path: Path, file2_path: Path, max_size_mb: int = MAX_FILE_SIZE_MB,
+                         cache: Optional[FileContentCache] = None, threshold: Optional[float] = None,
+                         stats: Optional[Dict[str, int]] = None, stream_large_files: bool = True,
+                         metric: str = DEFAULT_METRIC) -> float:
+    """
+    Calculate similarity between two files.
+    
+    Files up to max_size_mb are compared exactly. If either file is larger,
+    both are streamed into chunk sketches and the similarity is estimated
+    from those with bounded memory (see sketch_similarity).
+    
+    Args:
+        file1_path: Path to first file
+        file2_path: Path to second file
+        max_size_mb: Maximum file size in MB to compare exactly (default: 10MB);
+            ignored when a cache is given, which applies its own limit
+        cache: Optional content cache shared across comparisons so that
+            each file is read and decoded once per scan
+        threshold: Optional minimum ratio of interest, see content_similarity
+        stats: Optional per-stage counters, see content_similarity
+        stream_large_files: Estimate the similarity of files above the limit
+            instead of returning 0.0; ignored when a cache is given
+        metric: 'char' (default) or 'line', see content_similarity
+        
+    Returns:
+        Similarity ratio (0.0 to 1.0); below threshold it may be an upper bound
+    """
+    try:
+        if cache is not None:
+            max_size_mb = cache.max_size_mb
+            stream_large_files = cache.stream_large_files
+            size1, size2 = cache.get_size(file1_path), cache.get_size(file2_path)
+        else:
+            size1, size2 = file1_path.stat().st_size, file2_path.stat().st_size
+        
+        # Check file sizes to avoid memory issues with very large files
+        if max(size1, size2) / (1024 * 1024) > max_size_mb:
+            if not stream_large_files:
+                # Skip very large files
+                return 0.0
+            if cache is not None:
+                sketch1, sketch2 = cache.get_sketch(file1_path), cache.get_sketch(file2_path)
+            else:
+                sketch1, sketch2 = compute_file_sketch(file1_path), compute_file_sketch(file2_path)
+            return _count_stage(stats, STAGE_STREAM_SKETCH, sketch_similarity(sketch1, sketch2))
+        
+        if cache is not None:
+            features1 = cache.get_features(file1_path, metric)
+            features2 = cache.get_features(file2_path, metric)
+            if features1 is None or features2 is None:
+                # Unreadable
+                return 0.0
+            return content_similarity(None, None, threshold, stats, metric, (features1, features2))
+        else:
+            with open(file1_path, 'r', encoding='utf-8', errors='ignore') as f1:
+                content1 = f1.read()
+            
+            with open(file2_path, 'r', encoding='utf-8', errors='ignore') as f2:
+                content2 = f2.read()
+        
+        return content_similarity(content1, content2, threshold, stats, metric)
+        
+    except Exception as e:
+        print(f"Error comparing {file1_path} and {file2_path}: {e}", file=sys.stderr)
+        return 0.0
+
+
+def get_shingles(content: str, shingle_size: int = SHINGLE_SIZE) -> Set[int]:
+    """
+    Split content into overlapping character shingles.
+    
+    Args:
+        content: Text to shingle
+        shingle_size: Number of characters per shingle
+        
+    Returns:
+        Set of crc32 hashes, one per distinct shingle
+    """
+    if len(content) <= shingle_size:
+        return {zlib.crc32(content.encode('utf-8'))} if content else set()
+    
+    return {
+        zlib.crc32(content[i:i + shingle_size].encode('utf-8'))
+        for i in range(len(content) - shingle_size + 1)
+    }
+
+
+def compute_minhash(shingles: Set[int], num_perm: int = MINHASH_NUM_PERM) -> Tuple[int, ...]:
+    """
+    Compute a MinHash signature for a set of shingle hashes.
+    
+    Uses one-permutation hashing: each shingle is mixed once and falls
+    into one of num_perm bins, keeping the minimum per bin. Empty bins
+    borrow the value of the next non-empty bin (rotation densification)
+    so that the signature stays comparable position by position.
+    
+    Args:
+        shingles: Set of shingle hashes
+        num_perm: Signature length
+        
+    Returns:
+        Tuple of num_perm integers
+    """
+    bins: List[Optional[int]] = [None] * num_perm
+    for shingle in shingles:
+        mixed = (shingle * _HASH_MULTIPLIER) & _HASH_MASK
+        index, value = mixed % num_perm, mixed // num_perm
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    
+    if not shingles:
+        return (0,) * num_perm
+    
+    # Densify empty bins by rotating to the right; the distance is folded in
+    # so that borrowed values never collide with genuine ones
+    offset = (_HASH_MASK // num_perm) + 1
+    signature = []
+    for i in range(num_perm):
+        distance = 0
+        while bins[(i + distance) % num_perm] is None:
+            distance += 1
+        signature.append(bins[(i + distance) % num_perm] + distance * offset)
+    return tuple(signature)
+
+
+def choose_lsh_bands(similarity_threshold: float, num_perm: int = MINHASH_NUM_PERM,
+                     shingle_size: int = SHINGLE_SIZE) -> Tuple[int, int]:
+    """
+    Choose the LSH band layout for a similarity threshold.
+    
+    A SequenceMatcher ratio r corresponds roughly to a shingle Jaccard of
+    r^k / (2 - r^k) when edits are spread out. The layout places the LSH
+    S-curve threshold (1/bands)^(1/rows) below that estimate so that pairs
+    likely to reach the threshold become candidates.
+    
+    Args:
+        similarity_threshold: Minimum similarity ratio to report
+        num_perm: Signature length
+        shingle_size: Number of characters per shingle
+        
+    Returns:
+        Tuple (bands, rows)
+    """
+    retained = similarity_threshold ** shingle_size
+    target = LSH_RECALL_MARGIN * retained / (2 - retained)
+    
+    bands, rows = num_perm, 1
+    for candidate_rows in range(1, num_perm + 1):
+        candidate_bands = num_perm // candidate_rows
+        if (1 / candidate_bands) ** (1 / candidate_rows) > target:
+            break
+        bands, rows = candidate_bands, candidate_rows
+    return bands, rows
+
+
+def lsh_band_buckets(signature: Tuple[int, ...], bands: int, rows: int) -> List[int]:
+    """
+    Hash each LSH band of a signature to a signed 64-bit bucket id.
+    
+    Args:
+        signature: MinHash signature
+        bands: Number of LSH bands
+        rows: Signature values per band
+        
+    Returns:
+        One bucket id per band, suitable for an SQLite INTEGER column
+    """
+    buckets = []
+    for band in range(bands):
+        digest = hashlib.blake2b(array('Q', signature[band * rows:(band + 1) * rows]).tobytes(), digest_size=8)
+        buckets.append(int.from_bytes(digest.digest(), 'big', signed=True))
+    return buckets
+
+
+def find_lsh_candidates(signatures: Dict[int, Tuple[int, ...]], bands: int, rows: int) -> List[Tuple[int, int]]:
+    """
+    Find candidate pairs whose signatures collide in at least one band.
+    
+    Args:
+        signatures: Mapping of file index to MinHash signature
+        bands: Number of LSH bands
+        rows: Signature values per band
+        
+    Returns:
+        Sorted list of index pairs (i, j) with i < j
+    """
+    candidates = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        start = band * rows
+        for index, signature in signatures.items():
+            buckets[signature[start:start + rows]].append(index)
+        
+        for members in buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    candidates.add((members[a], members[b]) if members[a] < members[b] else (members[b], members[a]))
+    
+    return sorted(candidates)
+
+
+def parse_gitignore(gitignore_path: Path) -> List[Tuple[str, bool, bool, bool]]:
+    """
+    Parse the patterns of a .gitignore file.
+    
+    Supports comments, negation ('!'), directory-only patterns (trailing
+    '/') and patterns anchored to the .gitignore directory (containing a
+    '/'). Patterns are matched with fnmatch, so '**' behaves like '*'.
+    
+    Args:
+        gitignore_path: Path to the .gitignore file
+        
+    Returns:
+        List of (pattern, negated, dir_only, anchored) tuples, in file order
+    """
+    rules = []
+    try:
+        with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+    
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if line:
+            rules.append((line, negated, dir_only, anchored))
+    
+    return rules
+
+
+def is_ignored(relative_path: str, is_dir: bool,
+               gitignores: List[Tuple[str, List[Tuple[str, bool, bool, bool]]]]) -> bool:
+    """
+    Check a path against the .gitignore files that apply to it.
+    
+    Args:
+        relative_path: POSIX path relative to the scan root
+        is_dir: Whether the path is a directory
+        gitignores: (directory, rules) pairs from the root down, where
+            directory is the POSIX path of the .gitignore's directory
+            relative to the scan root ('' for the root itself)
+        
+    Returns:
+        True if the last matching pattern ignores the path
+    """
+    name = relative_path.rsplit('/', 1)[-1]
+    ignored = False
+    for directory, rules in gitignores:
+        local_path = relative_path[len(directory) + 1:] if directory else relative_path
+        for pattern, negated, dir_only, anchored in rules:
+            if dir_only and not is_dir:
+                continue
+            if fnmatchcase(local_path if anchored else name, pattern):
+                ignored = not negated
+    return ignored
+
+
+def get_all_files(root_dir: Path, exclude_dirs: Optional[Set[str]] = None, respect_gitignore: bool = True,
+                  scan_threads: int = SCAN_THREADS, sizes: Optional[Dict[Path, int]] = None,
+                  sniffer: Optional[TextSniffer] = None) -> List[Path]:
+    """
+    Get all text files in the directory recursively.
+    
+    Directories are walked with os.scandir. Excluded and ignored
+    directories are pruned before they are entered, and files whose name
+    does not identify them as text are sniffed in a thread pool.
+    
+    Args:
+        root_dir: Root directory to search
+        exclude_dirs: Set of directory names to exclude
+        respect_gitignore: Skip paths ignored by .gitignore files in the tree
+        scan_threads: Threads used to sniff files without a known text extension
+        sizes: Optional dict filled with the size of every returned file,
+            taken from the directory entries
+        sniffer: Optional TextSniffer to classify files with, so the bytes
+            it reads can later be reused by a FileContentCache
+        
+    Returns:
+        List of file paths, in sorted walk order
+    """
+    if exclude_dirs is None:
+        exclude_dirs = DEFAULT_EXCLUDE_DIRS
+    if sniffer is None:
+        sniffer = TextSniffer(max_prefix_bytes=0)
+    
+    named: List[Tuple[Path, bool]] = []  # (file, has a text name)
+    stack = [(root_dir, '', [])]
+    
+    while stack:
+        directory, relative_dir, gitignores = stack.pop()
+        if respect_gitignore:
+            rules = parse_gitignore(directory / '.gitignore')
+            if rules:
+                gitignores = gitignores + [(relative_dir, rules)]
+        
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in exclude_dirs or (gitignores and is_ignored(relative_path, True, gitignores)):
+                        continue
+                    subdirs.append((Path(entry.path), relative_path, gitignores))
+                elif entry.is_file():
+                    if gitignores and is_ignored(relative_path, False, gitignores):
+                        continue
+                    file_path = Path(entry.path)
+                    if sizes is not None:
+                        sizes[file_path] = entry.stat().st_size
+                    named.append((file_path, has_text_name(file_path)))
+            except OSError:
+                continue
+        
+        # Pop subdirectories in name order
+        stack.extend(reversed(subdirs))
+    
+    # Only files without a text name need to be opened
+    unknown = [file_path for file_path, text_name in named if not text_name]
+    if unknown and scan_threads > 1:
+        with ThreadPoolExecutor(max_workers=scan_threads) as executor:
+            sniffed = dict(zip(unknown, executor.map(sniffer.is_text, unknown)))
+    else:
+        sniffed = {file_path: sniffer.is_text(file_path) for file_path in unknown}
+    
+    files = [file_path for file_path, text_name in named if text_name or sniffed[file_path]]
+    if sizes is not None:
+        for file_path in set(sizes).difference(files):
+            del sizes[file_path]
+    return files
+
+
+def hash_file(file_path: Path) -> str:
+    """Return the BLAKE2b digest of a file's bytes, read in blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_exact_duplicates(files: List[Path], cache: Optional[FileContentCache] = None) -> List[List[int]]:
+    """
+    Group byte-identical files.
+    
+    Files are bucketed by size first, so only files that share their size
+    with another file are read and hashed.
+    
+    Args:
+        files: Files to group
+        cache: Optional content cache whose known sizes are reused
+        
+    Returns:
+        Groups of two or more file indices, each sorted, in order of their
+        first index
+    """
+    by_size: Dict[int, List[int]] = defaultdict(list)
+    for index, file_path in enumerate(files):
+        try:
+            by_size[cache.get_size(file_path) if cache is not None else file_path.stat().st_size].append(index)
+        except OSError:
+            continue
+    
+    groups = []
+    for indices in by_size.values():
+        if len(indices) < 2:
+            continue
+        by_hash: Dict[str, List[int]] = defaultdict(list)
+        for index in indices:
+            try:
+                by_hash[hash_file(files[index])].append(index)
+            except OSError as e:
+                print(f"Error reading {files[index]}: {e}", file=sys.stderr)
+        groups.extend(group for group in by_hash.values() if len(group) > 1)
+    
+    groups.sort()
+    return groups
+
+
+def get_reverse_limits(representatives: List[int], groups: List[List[int]]) -> List[int]:
+    """
+    Find the pairs of representatives that copies compare the other way round.
+    
+    Pairs are scored with the lower file index first. When a duplicate
+    group's last copy sorts after a partner, that copy is compared with the
+    partner's content first, so the collapsed scan must score both orders.
+    
+    Args:
+        representatives: Sorted file indices that are compared, one per group
+        groups: Groups of byte-identical file indices
+        
+    Returns:
+        For each position p of representatives, the exclusive end of the
+        positions q > p whose pair is also scored as (q, p)
+    """
+    last_copy = {group[0]: group[-1] for group in groups}
+    return [bisect_left(representatives, last_copy.get(index, index)) for index in representatives]
+
+
+def expand_duplicate_matches(matches: List[Tuple[int, int, float]],
+                             groups: List[List[int]]) -> List[Tuple[int, int, float]]:
+    """
+    Extend matches found between representatives to every duplicate.
+    
+    Files in the same group are reported as identical (1.0), and a match
+    involving any member of a group is repeated for every other member
+    that sorts on the same side of the partner (see
+    collapse_duplicate_matches).
+    
+    Args:
+        matches: (i, j, similarity) matches between files
+        groups: Groups of byte-identical file indices
+        
+    Returns:
+        List of (i, j, similarity) with i < j, sorted by (i, j)
+    """
+    return sorted(iter_expanded_matches(matches, groups))
+
+
+def first_pair_between(first: List[int], second: List[int]) -> Tuple[int, int]:
+    """
+    Return the first pair (i, j) with i from first, j from second and i < j.
+    
+    Args:
+        first: Sorted file indices whose content is compared first
+        second: Sorted file indices whose content is compared second;
+            at least one must sort after first[0]
+    """
+    return first[0], second[bisect_right(second, first[0])]
+
+
+def collapse_duplicate_matches(matches: Iterable[Tuple[int, int, float]],
+                               groups: List[List[int]]) -> Dict[Tuple[int, int], float]:
+    """
+    Map matches onto one pair per ordered pair of duplicate groups.
+    
+    A pair (i, j) with i < j is scored with i's content first, and
+    SequenceMatcher.ratio() depends on that order. Copies of a file that
+    sort on either side of a partner can therefore score differently
+    against it, so matches are keyed by the group of their first file and
+    the group of their second file, in that order. Each key is written as
+    first_pair_between() the two groups.
+    
+    Returns:
+        Similarity by (i, j) with i < j, one entry per ordered pair of
+        groups; pairs inside a group are dropped
+    """
+    members = {index: group for group in groups for index in group}
+    collapsed: Dict[Tuple[int, int], float] = {}
+    for i, j, similarity in matches:
+        first, second = members.get(i, [i]), members.get(j, [j])
+        if first is not second:
+            collapsed.setdefault(first_pair_between(first, second), similarity)
+    return collapsed
+
+
+def iter_expanded_matches(matches: Iterable[Tuple[int, int, float]],
+                          groups: List[List[int]]) -> Iterator[Tuple[int, int, float]]:
+    """
+    Lazily yield matches extended to every duplicate, without building the full list.
+    
+    Yields:
+        (i, j, similarity) with i < j, each pair once, in no particular order
+    """
+    members = {index: group for group in groups for index in group}
+    for group in groups:
+        for position, i in enumerate(group):
+            for j in group[position + 1:]:
+                yield i, j, 1.0
+    for (a, b), similarity in collapse_duplicate_matches(matches, groups).items():
+        second = members.get(b, [b])
+        for i in members.get(a, [a]):
+            for j in second[bisect_right(second, i):]:
+                yield i, j, similarity
+
+
+def cluster_matches(num_files: int, matches: Iterable[Tuple[int, int, float]],
+                    groups: List[List[int]] = ()) -> List[Dict[str, Any]]:
+    """
+    Group transitively similar files into clusters with union-find.
+    
+    Matches are merged one at a time as they are read, and each cluster
+    root keeps its similarity range, so matches can be streamed in. Apart
+    from per-file state, only matches involving a duplicate group are
+    remembered, to count each ordered pair of groups once (see
+    collapse_duplicate_matches); duplicate groups are never expanded.
+    The representative of a cluster is the member similar to the most
+    other files (the lowest index on ties).
+    
+    Args:
+        num_files: Number of scanned files
+        matches: (i, j, similarity) matches between file indices
+        groups: Groups of byte-identical file indices
+        
+    Returns:
+        Clusters of two or more files, largest first, each a dict with
+        'id', 'size', 'representative', 'members' (sorted file indices),
+        'pairs' (number of similar pairs inside the cluster) and
+        'min_similarity'/'max_similarity' over those pairs
+    """
+    parent = list(range(num_files))
+    bounds: Dict[int, Tuple[float, float]] = {}  # Similarity range of each root's pairs
+    
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    def union(a: int, b: int, similarity: float) -> None:
+        root_a, root_b = find(a), find(b)
+        low, high = similarity, similarity
+        for root in {root_a, root_b}:
+            if root in bounds:
+                root_low, root_high = bounds.pop(root)
+                low, high = min(low, root_low), max(high, root_high)
+        parent[root_a] = root_b
+        bounds[root_b] = (low, high)
+    
+    members_of = {index: group for group in groups for index in group}
+    degree = [0] * num_files
+    shared = [0] * num_files  # Degree common to every member of a group, kept on its first file
+    for group in groups:
+        for index in group:
+            union(index, group[0], 1.0)
+            degree[index] += len(group) - 1
+    
+    seen: Set[Tuple[int, int]] = set()
+    for i, j, similarity in matches:
+        first, second = members_of.get(i, [i]), members_of.get(j, [j])
+        if first is second:
+            continue
+        if len(first) > 1 or len(second) > 1:
+            # Copies of one match may be listed too, e.g. by the index
+            key = first_pair_between(first, second)
+            if key in seen:
+                continue
+            seen.add(key)
+        union(first[0], second[0], similarity)
+        if first[-1] < second[0]:
+            shared[first[0]] += len(second)
+            shared[second[0]] += len(first)
+        else:
+            # Only the copies on the right side of each other form this pair
+            for index in first:
+                degree[index] += len(second) - bisect_right(second, index)
+            for index in second:
+                degree[index] += bisect_left(first, index)
+    for index in range(num_files):
+        degree[index] += shared[members_of.get(index, [index])[0]]
+    
+    members: Dict[int, List[int]] = defaultdict(list)
+    for index in range(num_files):
+        members[find(index)].append(index)
+    
+    clusters = []
+    for root, indices in sorted(members.items(), key=lambda item: (-len(item[1]), item[1][0])):
+        if len(indices) < 2:
+            continue
+        clusters.append({
+            'id': len(clusters) + 1,
+            'size': len(indices),
+            'representative': max(indices, key=lambda index: (degree[index], -index)),
+            'members': indices,
+            'pairs': sum(degree[index] for index in indices) // 2,
+            'min_similarity': bounds[root][0],
+            'max_similarity': bounds[root][1],
+        })
+    return clusters
+
+
+def _relative(file_path: Path, root_dir: Optional[Path]) -> str:
+    """Return a file path relative to root_dir when possible."""
+    if root_dir is not None:
+        try:
+            return str(file_path.relative_to(root_dir))
+        except ValueError:
+            pass
+    return str(file_path)
+
+
+def write_clusters_json(clusters: Iterable[Dict[str, Any]], files: List[Path], stream: TextIO,
+                        root_dir: Optional[Path] = None) -> None:
+    """
+    Write clusters as a JSON array, one cluster at a time.
+    
+    Args:
+        clusters: Clusters from cluster_matches
+        files: Files the cluster indices refer to
+        stream: Text stream to write to
+        root_dir: Optional root that paths are written relative to
+    """
+    stream.write('[')
+    for position, cluster in enumerate(clusters):
+        record = dict(cluster)
+        record['representative'] = _relative(files[cluster['representative']], root_dir)
+        record['members'] = [_relative(files[index], root_dir) for index in cluster['members']]
+        stream.write(',\n  ' if position else '\n  ')
+        stream.write(json.dumps(record))
+    stream.write('\n]\n')
+
+
+def write_clusters_csv(clusters: Iterable[Dict[str, Any]], files: List[Path], stream: TextIO,
+                       root_dir: Optional[Path] = None) -> None:
+    """
+    Write clusters as CSV, one row per member file, one cluster at a time.
+    
+    Args:
+        clusters: Clusters from cluster_matches
+        files: Files the cluster indices refer to
+        stream: Text stream to write to
+        root_dir: Optional root that paths are written relative to
+    """
+    writer = csv.writer(stream)
+    writer.writerow(['cluster', 'size', 'representative', 'path', 'min_similarity', 'max_similarity'])
+    for cluster in clusters:
+        representative = _relative(files[cluster['representative']], root_dir)
+        for index in cluster['members']:
+            writer.writerow([cluster['id'], cluster['size'], representative, _relative(files[index], root_dir),
+                             f"{cluster['min_similarity']:.6f}", f"{cluster['max_similarity']:.6f}"])
+
+
+def report_progress(comparisons_done: int, total_comparisons: int, previous_done: Optional[int] = None) -> None:
+    """
+    Report progress of file comparisons.
+    
+    Args:
+        comparisons_done: Number of comparisons completed
+        total_comparisons: Total number of comparisons to perform
+        previous_done: Count at the previous call, for callers that advance
+            by whole blocks (default: comparisons_done - 1)
+    """
+    if previous_done is None:
+        previous_done = comparisons_done - 1
+    
+    def crossed(interval: int) -> bool:
+        return comparisons_done // interval > previous_done // interval or comparisons_done == total_comparisons
+    
+    if crossed(PROGRESS_UPDATE_INTERVAL):
+        if sys.stdout.isatty():
+            print(f"Progress: {comparisons_done}/{total_comparisons} comparisons", end='\r')
+            sys.stdout.flush()
+        else:
+            # For non-interactive output, print periodic updates
+            if crossed(NON_INTERACTIVE_PROGRESS_INTERVAL):
+                print(f"Progress: {comparisons_done}/{total_comparisons} comparisons")
+
+
+def build_size_window(lengths: List[Optional[int]], similarity_threshold: float) -> Tuple[List[int], List[int]]:
+    """
+    Sort files by length and limit each one to partners within reach.
+    
+    SequenceMatcher.ratio() can never exceed 2 * shorter / (shorter + longer),
+    so a file of length L can only reach the threshold t with files no
+    longer than L * (2 - t) / t. Pairing each file only with the longer
+    files inside that window gives the same result as an all-pairs scan.
     
     Args:
-        file_path: Path to the file
+        lengths: Content length per file index, or None for files that
+            cannot be compared (too large or unreadable)
+        similarity_threshold: Minimum similarity ratio to report
         
     Returns:
-        True if the file appears to be text, False otherwise
+        Tuple (order, limits): file indices sorted by length, and for each
+        position p the exclusive end of the positions paired with order[p]
     """
-    # Check by extension first
-    mime_type, _ = mimetypes.guess_type(str(file_path))
-    if mime_type and mime_type.startswith('text'):
-        return True
+    order = sorted((i for i, length in enumerate(lengths) if length is not None),
+                   key=lambda i: (lengths[i], i))
+    sorted_lengths = [lengths[i] for i in order]
+    reach = (2 - similarity_threshold) / similarity_threshold
+    limits = [
+        bisect_right(sorted_lengths, length * reach + 1e-9, lo=position + 1)
+        for position, length in enumerate(sorted_lengths)
+    ]
+    return order, limits
+
+
+def iter_window_pairs(order: List[int], limits: List[int], start: int = 0,
+                      end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Iterate over the pairs covered by a window.
     
-    # Check common text extensions
-    text_extensions = {
-        '.py', '.txt', '.md', '.json', '.yaml', '.yml', '.xml', '.html',
-        '.css', '.js', '.ts', '.java', '.c', '.cpp', '.h', '.hpp',
-        '.sh', '.bash', '.ps1', '.csv', '.sql', '.go', '.rs', '.rb',
-        '.php', '.pl', '.swift', '.kt', '.scala', '.r', '.m', '.lua',
-        '.vim', '.ini', '.cfg', '.conf', '.toml', '.feature'
-    }
+    Args:
+        order: File indices in window order
+        limits: Exclusive end position of each position's partners
+        start: First position to pair
+        end: Exclusive last position to pair (default: all positions)
+        
+    Yields:
+        Index pairs (i, j) with i < j
+    """
+    for position in range(start, len(order) if end is None else end):
+        i = order[position]
+        for partner in range(position + 1, limits[position]):
+            j = order[partner]
+            yield (i, j) if i < j else (j, i)
+
+
+def split_window(limits: List[int], num_blocks: int) -> List[Tuple[int, int]]:
+    """
+    Split a window into position ranges holding a similar number of pairs.
     
-    if file_path.suffix.lower() in text_extensions:
-        return True
+    Args:
+        limits: Exclusive end position of each position's partners
+        num_blocks: Desired number of blocks
+        
+    Returns:
+        List of (start, end) position ranges covering every position
+    """
+    total = sum(limit - position - 1 for position, limit in enumerate(limits))
+    target = max(1, -(-total // max(1, num_blocks)))
+    blocks = []
+    start = pending = 0
+    for position, limit in enumerate(limits):
+        pending += limit - position - 1
+        if pending >= target:
+            blocks.append((start, position + 1))
+            start, pending = position + 1, 0
+    if start < len(limits):
+        blocks.append((start, len(limits)))
+    return blocks
+
+
+def get_incremental_pairs(lengths: List[Optional[int]], changed: Set[int], similarity_threshold: float,
+                          size_window: bool = True) -> List[Tuple[int, int]]:
+    """
+    List the pairs that involve at least one changed file.
     
-    # Try to read as text
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            f.read(1024)  # Try to read first 1KB
-        return True
-    except (UnicodeDecodeError, PermissionError):
-        return False
+    Args:
+        lengths: Content length per file index, or None for files that
+            cannot be compared (too large or unreadable)
+        changed: Indices of new or modified files
+        similarity_threshold: Minimum similarity ratio to report
+        size_window: Only pair files whose lengths allow the threshold to
+            be reached (see build_size_window)
+        
+    Returns:
+        Sorted list of index pairs (i, j) with i < j
+    """
+    comparable = [i for i, length in enumerate(lengths) if length is not None]
+    use_window = size_window and similarity_threshold > 0
+    if use_window:
+        comparable.sort(key=lambda i: (lengths[i], i))
+        sorted_lengths = [lengths[i] for i in comparable]
+        reach = (2 - similarity_threshold) / similarity_threshold
+    
+    pairs = set()
+    for i in changed:
+        if lengths[i] is None:
+            continue
+        partners = comparable
+        if use_window:
+            start = bisect_left(sorted_lengths, lengths[i] / reach - 1e-9)
+            end = bisect_right(sorted_lengths, lengths[i] * reach + 1e-9)
+            partners = comparable[start:end]
+        for j in partners:
+            if j != i:
+                pairs.add((i, j) if i < j else (j, i))
+    return sorted(pairs)
+
+
+# Worker process state, set up once per process by _init_worker
+_worker_memory: Optional[shared_memory.SharedMemory] = None
+_worker_offsets: List[Optional[Tuple[int, int]]] = []
+_worker_window: Optional[Tuple[List[int], List[int]]] = None
+_worker_reverse_limits: Optional[List[int]] = None
+_worker_contents: Dict[int, str] = {}
+_worker_features: Dict[int, ContentFeatures] = {}
+_worker_sketches: Dict[int, Tuple[int, ...]] = {}
+_worker_threshold = 0.0
+_worker_prefilter = True
+_worker_metric = DEFAULT_METRIC
+
+
+def _init_worker(memory_name: str, offsets: List[Optional[Tuple[int, int]]],
+                 window: Optional[Tuple[List[int], List[int]]], sketches: Dict[int, Tuple[int, ...]],
+                 similarity_threshold: float, prefilter: bool, metric: str,
+                 reverse_limits: Optional[List[int]] = None) -> None:
+    """Attach a worker process to the shared content buffer."""
+    global _worker_memory, _worker_offsets, _worker_window, _worker_threshold, _worker_prefilter, _worker_metric
+    global _worker_reverse_limits
+    # The parent creates and unlinks the segment; workers only attach to it
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_offsets = offsets
+    _worker_window = window
+    _worker_threshold = similarity_threshold
+    _worker_prefilter = prefilter
+    _worker_metric = metric
+    _worker_reverse_limits = reverse_limits
+    _worker_contents.clear()
+    _worker_features.clear()
+    _worker_sketches.clear()
+    # Sketches of files too large for shared memory, streamed by the parent
+    _worker_sketches.update(sketches)
+
+
+def _worker_content(index: int) -> Optional[str]:
+    """Decode a file's content from shared memory, once per worker."""
+    content = _worker_contents.get(index)
+    if content is None and _worker_offsets[index] is not None:
+        start, end = _worker_offsets[index]
+        content = _worker_contents[index] = str(_worker_memory.buf[start:end], 'utf-8')
+    return content
+
 
+def _worker_content_features(index: int) -> ContentFeatures:
+    """Return content_features() of a decoded file, computed once per worker."""
+    features = _worker_features.get(index)
+    if features is None:
+        features = _worker_features[index] = content_features(_worker_content(index), _worker_metric)
+    return features
 
-def calculate_similarity(file1_path: Path, file2_path: Path, max_size_mb: int = MAX_FILE_SIZE_MB) -> float:
+
+def _worker_sketch(index: int) -> Optional[Tuple[int, ...]]:
+    """Return a file's chunk sketch, computing it from shared memory if needed."""
+    sketch = _worker_sketches.get(index)
+    if sketch is None:
+        content = _worker_content(index)
+        if content is not None:
+            sketch = _worker_sketches[index] = compute_stream_sketch(io.StringIO(content))
+    return sketch
+
+
+def _compare_block(block: Tuple[str, object]) -> Tuple[int, List[Tuple[int, int, float]], Dict[str, int]]:
     """
-    Calculate similarity between two files.
+    Compare one block of the pair space inside a worker process.
     
     Args:
-        file1_path: Path to first file
-        file2_path: Path to second file
-        max_size_mb: Maximum file size in MB to compare (default: 10MB)
+        block: ('window', (start, end)) for the window pairs of positions
+            start <= p < end, or ('pairs', [(i, j), ...]) for an explicit pair list
+        
+    Returns:
+        Tuple (comparisons performed, [(i, j, similarity), ...] above threshold,
+        per-stage counters); see compare_pairs_parallel for i > j
+    """
+    kind, payload = block
+    if kind == 'window':
+        order, limits = _worker_window
+        pairs = iter_window_pairs(order, limits, *payload)
+    else:
+        pairs = payload
+    
+    comparisons = 0
+    matches = []
+    stats: Dict[str, int] = {}
+    threshold = _worker_threshold if _worker_prefilter else None
+    for i, j in pairs:
+        comparisons += 1
+        content1 = _worker_content(i)
+        content2 = _worker_content(j)
+        if content1 is not None and content2 is not None:
+            features = (_worker_content_features(i), _worker_content_features(j))
+            similarity = content_similarity(content1, content2, threshold, stats, _worker_metric, features)
+            if _worker_reverse_limits is not None and j < _worker_reverse_limits[i]:
+                reverse = content_similarity(content2, content1, threshold, stats, _worker_metric, features[::-1])
+                if reverse >= _worker_threshold:
+                    matches.append((j, i, reverse))
+        elif i in _worker_sketches or j in _worker_sketches:
+            # At least one file is too large to compare exactly; sketches are order-independent
+            sketch1, sketch2 = _worker_sketch(i), _worker_sketch(j)
+            if sketch1 is None or sketch2 is None:
+                continue
+            similarity = _count_stage(stats, STAGE_STREAM_SKETCH, sketch_similarity(sketch1, sketch2))
+            if (similarity >= _worker_threshold and _worker_reverse_limits is not None
+                    and j < _worker_reverse_limits[i]):
+                matches.append((j, i, similarity))
+        else:
+            continue
+        if similarity >= _worker_threshold:
+            matches.append((i, j, similarity))
+    return comparisons, matches, stats
+
+
+def compare_pairs_parallel(files: List[Path], similarity_threshold: float, workers: int,
+                           cache: FileContentCache, pairs: Optional[List[Tuple[int, int]]] = None,
+                           window: Optional[Tuple[List[int], List[int]]] = None,
+                           prefilter: bool = True, stats: Optional[Dict[str, int]] = None,
+                           metric: str = DEFAULT_METRIC,
+                           on_matches: Optional[Callable[[List[Tuple[int, int, float]]], None]] = None,
+                           reverse_limits: Optional[List[int]] = None) -> List[Tuple[int, int, float]]:
+    """
+    Compare pairs of files in a pool of worker processes.
+    
+    File contents are copied once into a shared memory segment that every
+    worker attaches to, so tasks only carry index ranges.
+    
+    Args:
+        files: Files being compared
+        similarity_threshold: Minimum similarity ratio to report
+        workers: Number of worker processes
+        cache: Content cache used to load each file once
+        pairs: Explicit pairs (i, j) to compare
+        window: (order, limits) window to compare, when pairs is not given
+        prefilter: Reject pairs with the cheap upper bounds first
+        stats: Optional per-stage counters, merged from every worker
+        metric: 'char' or 'line', see content_similarity
+        on_matches: Optional callback receiving the matches of each block
+            as soon as the block completes
+        reverse_limits: Optional limits from get_reverse_limits; a pair
+            (i, j) with j < reverse_limits[i] is also compared with j's
+            content first, and reported as (j, i) if it matches that way
         
     Returns:
-        Similarity ratio (0.0 to 1.0)
+        List of (i, j, similarity) above threshold, sorted by (i, j)
     """
+    needed = None if pairs is None else {index for pair in pairs for index in pair}
+    offsets: List[Optional[Tuple[int, int]]] = []
+    encoded = []
+    sketches = {}
+    position = 0
+    for index, file_path in enumerate(files):
+        if needed is not None and index not in needed:
+            offsets.append(None)
+            continue
+        try:
+            if cache.stream_large_files and cache.is_large(file_path):
+                sketches[index] = cache.get_sketch(file_path)
+                offsets.append(None)
+                continue
+        except OSError:
+            pass
+        content = cache.get_content(file_path)
+        if content is None:
+            offsets.append(None)
+            continue
+        data = content.encode('utf-8')
+        offsets.append((position, position + len(data)))
+        encoded.append(data)
+        position += len(data)
+    
+    num_blocks = workers * BLOCKS_PER_WORKER
+    if pairs is None:
+        _order, limits = window
+        blocks = [('window', positions) for positions in split_window(limits, num_blocks)]
+        total_comparisons = sum(limit - p - 1 for p, limit in enumerate(limits))
+    else:
+        size = max(1, -(-len(pairs) // num_blocks))
+        blocks = [('pairs', pairs[k:k + size]) for k in range(0, len(pairs), size)]
+        total_comparisons = len(pairs)
+    
+    memory = shared_memory.SharedMemory(create=True, size=max(1, position))
     try:
-        # Check file sizes to avoid memory issues with very large files
-        size1_mb = file1_path.stat().st_size / (1024 * 1024)
-        size2_mb = file2_path.stat().st_size / (1024 * 1024)
+        memory.buf[:position] = b''.join(encoded)
+        del encoded
         
-        if size1_mb > max_size_mb or size2_mb > max_size_mb:
-            # Skip very large files
-            return 0.0
+        matches = []
+        comparisons_done = 0
+        initargs = (memory.name, offsets, window if pairs is None else None, sketches,
+                    similarity_threshold, prefilter, metric, reverse_limits)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            futures = [executor.submit(_compare_block, block) for block in blocks]
+            for future in as_completed(futures):
+                comparisons, block_matches, block_stats = future.result()
+                if stats is not None:
+                    for stage, count in block_stats.items():
+                        stats[stage] = stats.get(stage, 0) + count
+                previous_done = comparisons_done
+                comparisons_done += comparisons
+                report_progress(comparisons_done, total_comparisons, previous_done)
+                matches.extend(block_matches)
+                if on_matches is not None and block_matches:
+                    on_matches(block_matches)
+    finally:
+        memory.close()
+        memory.unlink()
+    
+    # Blocks finish in any order; sort to match the serial scan
+    matches.sort(key=lambda match: (match[0], match[1]))
+    return matches
+
+
+def get_lsh_candidate_pairs(files: List[Path], similarity_threshold: float,
+                            cache: Optional[FileContentCache] = None,
+                            signatures: Optional[Dict[int, Tuple[int, ...]]] = None) -> List[Tuple[int, int]]:
+    """
+    Build MinHash signatures for files and return LSH candidate pairs.
+    
+    Args:
+        files: Files to index
+        similarity_threshold: Minimum similarity ratio to report
+        cache: Optional content cache to read files through
+        signatures: Optional signatures already known by file index; the
+            ones computed here are added to it
         
-        with open(file1_path, 'r', encoding='utf-8', errors='ignore') as f1:
-            content1 = f1.read()
+    Returns:
+        Sorted list of index pairs (i, j) into files with i < j
+    """
+    if signatures is None:
+        signatures = {}
+    for index, file_path in enumerate(files):
+        if index in signatures:
+            continue
+        content = cache.get_content(file_path) if cache is not None else read_file_content(file_path)
+        if content is not None:
+            signatures[index] = compute_minhash(get_shingles(content))
+    
+    bands, rows = choose_lsh_bands(similarity_threshold)
+    return find_lsh_candidates(signatures, bands, rows)
+
+
+class SimilarityIndex:
+    """
+    Persistent SQLite record of scanned files and the similar pairs among them.
+    
+    Each file is remembered by its path relative to the scanned root, with
+    its size, mtime, content hash, length and MinHash signature. Files whose
+    size and mtime (or, failing that, content hash) still match are known
+    to be unchanged, so a rerun only compares new and modified files and
+    keeps the stored pairs between unchanged files.
+    
+    The LSH band buckets of every signature are stored too, laid out for
+    the index threshold, so that find_similar can look up the neighbours of
+    a single file without scanning the index.
+    
+    Stored pairs are only those that passed the threshold with the engine
+    and size limits of the run that found them. When any of these change,
+    the files are forgotten along with the pairs, so every file is
+    compared again rather than unchanged pairs being lost.
+    """
+    
+    def __init__(self, index_path: Path, root_dir: Path, similarity_threshold: float,
+                 metric: str = DEFAULT_METRIC, engine: str = DEFAULT_ENGINE,
+                 max_size_mb: int = MAX_FILE_SIZE_MB, stream_large_files: bool = True):
+        self.root_dir = root_dir
+        self.connection = sqlite3.connect(str(index_path))
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+                content_hash TEXT, length INTEGER, signature BLOB
+            );
+            CREATE TABLE IF NOT EXISTS pairs (
+                path1 TEXT NOT NULL, path2 TEXT NOT NULL, similarity REAL NOT NULL,
+                PRIMARY KEY (path1, path2)
+            );
+            CREATE INDEX IF NOT EXISTS pairs_path2 ON pairs (path2);
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL, bucket INTEGER NOT NULL, path TEXT NOT NULL,
+                PRIMARY KEY (band, bucket, path)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS bands_path ON bands (path);
+        """)
         
-        with open(file2_path, 'r', encoding='utf-8', errors='ignore') as f2:
-            content2 = f2.read()
+        self.bands, self.rows = choose_lsh_bands(similarity_threshold)
+        self._rebuild_bands = False
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if meta.get('schema_version', str(INDEX_SCHEMA_VERSION)) != str(INDEX_SCHEMA_VERSION) or \
+                meta.get('metric', metric) != metric:
+            # Stored lengths and pairs were measured differently
+            self.connection.executescript("DELETE FROM files; DELETE FROM pairs; DELETE FROM bands;")
+        pair_filter = f"{similarity_threshold!r}/{engine}/{max_size_mb}/{int(stream_large_files)}"
+        if meta.get('pair_filter') != pair_filter:
+            # Stored pairs were filtered differently, and pairs between unchanged
+            # files are never compared again, so start over
+            self.connection.executescript("DELETE FROM files; DELETE FROM pairs; DELETE FROM bands;")
+        if meta.get('signature') != f"{SHINGLE_SIZE}/{MINHASH_NUM_PERM}":
+            self.connection.executescript("UPDATE files SET signature = NULL; DELETE FROM bands;")
+        if meta.get('bands') != f"{self.bands}/{self.rows}":
+            self.connection.execute("DELETE FROM bands")
+            self._rebuild_bands = True
+        self.connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ('schema_version', str(INDEX_SCHEMA_VERSION)),
+            ('threshold', repr(similarity_threshold)),
+            ('pair_filter', pair_filter),
+            ('metric', metric),
+            ('signature', f"{SHINGLE_SIZE}/{MINHASH_NUM_PERM}"),
+            ('bands', f"{self.bands}/{self.rows}"),
+            ('root', str(root_dir)),
+        ])
         
-        # Use SequenceMatcher to calculate similarity
-        similarity = SequenceMatcher(None, content1, content2).ratio()
-        return similarity
+        self.entries: Dict[str, Dict[str, object]] = {}
+        for path, size, mtime_ns, content_hash, length, signature in self.connection.execute(
+                "SELECT path, size, mtime_ns, content_hash, length, signature FROM files"):
+            self.entries[path] = {
+                'size': size, 'mtime_ns': mtime_ns, 'content_hash': content_hash,
+                'length': length, 'signature': signature,
+            }
+        self.metric = metric
+        self._updated: Set[str] = set()
+    
+    def key(self, file_path: Path) -> str:
+        """Return the index key of a file: its POSIX path relative to the root."""
+        try:
+            return file_path.relative_to(self.root_dir).as_posix()
+        except ValueError:
+            return file_path.as_posix()
+    
+    def refresh(self, files: List[Path], cache: FileContentCache) -> Tuple[Set[int], int]:
+        """
+        Bring the index up to date with the files on disk.
         
-    except Exception as e:
-        print(f"Error comparing {file1_path} and {file2_path}: {e}", file=sys.stderr)
-        return 0.0
+        Unchanged files are detected from size and mtime without reading
+        them. Entries of removed files are dropped, and stored pairs that
+        involve a changed or removed file are discarded.
+        
+        Args:
+            files: Files found by the current scan
+            cache: Content cache used to read changed files
+            
+        Returns:
+            Tuple (indices of new or changed files, number of removed files)
+        """
+        changed = set()
+        seen = set()
+        for index, file_path in enumerate(files):
+            key = self.key(file_path)
+            seen.add(key)
+            try:
+                stat = file_path.stat()
+            except OSError:
+                stat = None
+            entry = self.entries.get(key)
+            if entry is not None and stat is not None and \
+                    (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            
+            content = None if cache.is_large(file_path) else cache.get_content(file_path)
+            content_hash = None if content is None else \
+                hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+            if entry is not None and content_hash is not None and entry['content_hash'] == content_hash:
+                # Touched but not modified
+                entry['mtime_ns'] = stat.st_mtime_ns
+                self._updated.add(key)
+                continue
+            
+            self.entries[key] = {
+                'size': stat.st_size if stat is not None else None,
+                'mtime_ns': stat.st_mtime_ns if stat is not None else None,
+                'content_hash': content_hash,
+                'length': cache.get_length(file_path, self.metric),
+                'signature': None if content is None else
+                array('Q', compute_minhash(get_shingles(content))).tobytes(),
+            }
+            self._updated.add(key)
+            changed.add(index)
+        
+        removed = [key for key in self.entries if key not in seen]
+        for key in removed:
+            del self.entries[key]
+        self.connection.executemany("DELETE FROM files WHERE path = ?", [(key,) for key in removed])
+        
+        stale = removed + [self.key(files[index]) for index in changed]
+        self.connection.executemany("DELETE FROM pairs WHERE path1 = ? OR path2 = ?",
+                                    [(key, key) for key in stale])
+        self.connection.executemany("DELETE FROM bands WHERE path = ?", [(key,) for key in stale])
+        return changed, len(removed)
+    
+    def get_lengths(self, files: List[Path]) -> List[Optional[int]]:
+        """Return the stored content length of each file (None if not comparable)."""
+        return [self.entries[self.key(file_path)]['length'] for file_path in files]
+    
+    def get_signatures(self, files: List[Path]) -> Dict[int, Tuple[int, ...]]:
+        """Return the stored MinHash signatures by file index."""
+        signatures = {}
+        for index, file_path in enumerate(files):
+            signature = self.entries[self.key(file_path)]['signature']
+            if signature is not None:
+                signatures[index] = tuple(array('Q', signature))
+        return signatures
+    
+    def set_signatures(self, files: List[Path], signatures: Dict[int, Tuple[int, ...]]) -> None:
+        """Store MinHash signatures for files that do not have one yet."""
+        for index, signature in signatures.items():
+            key = self.key(files[index])
+            if self.entries[key]['signature'] is None:
+                self.entries[key]['signature'] = array('Q', signature).tobytes()
+                self._updated.add(key)
+    
+    def add_pairs(self, files: List[Path], matches: Iterable[Tuple[int, int, float]]) -> None:
+        """Store newly found similar pairs, consuming matches lazily."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO pairs (path1, path2, similarity) VALUES (?, ?, ?)",
+            ((self.key(files[i]), self.key(files[j]), similarity) for i, j, similarity in matches))
+    
+    def get_matches(self, files: List[Path]) -> List[Tuple[int, int, float]]:
+        """
+        Return every stored similar pair between files of the current scan.
+        
+        Returns:
+            List of (i, j, similarity) with i < j, sorted by (i, j)
+        """
+        positions = {self.key(file_path): index for index, file_path in enumerate(files)}
+        matches = []
+        for path1, path2, similarity in self.connection.execute("SELECT path1, path2, similarity FROM pairs"):
+            i, j = positions.get(path1), positions.get(path2)
+            if i is not None and j is not None:
+                matches.append((min(i, j), max(i, j), similarity))
+        matches.sort(key=lambda match: (match[0], match[1]))
+        return matches
+    
+    def save(self) -> None:
+        """Write updated file entries and their LSH band buckets, and commit."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, length, signature) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, entry['size'], entry['mtime_ns'], entry['content_hash'], entry['length'], entry['signature'])
+             for key, entry in ((key, self.entries[key]) for key in self._updated)])
+        
+        banded = self.entries if self._rebuild_bands else self._updated
+        self.connection.executemany("DELETE FROM bands WHERE path = ?", [(key,) for key in banded])
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO bands (band, bucket, path) VALUES (?, ?, ?)",
+            ((band, bucket, key)
+             for key in banded if self.entries[key]['signature'] is not None
+             for band, bucket in enumerate(lsh_band_buckets(
+                 tuple(array('Q', self.entries[key]['signature'])), self.bands, self.rows))))
+        self._rebuild_bands = False
+        self._updated.clear()
+        self.connection.commit()
+    
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self.connection.close()
 
 
-def get_all_files(root_dir: Path, exclude_dirs: Set[str] = None) -> List[Path]:
+def find_similar(file_path: Path, index_path: Path, k: int = DEFAULT_QUERY_RESULTS,
+                 threshold: Optional[float] = None, root_dir: Optional[Path] = None,
+                 max_size_mb: int = MAX_FILE_SIZE_MB) -> List[Tuple[Path, float]]:
     """
-    Get all text files in the directory recursively.
+    Find the indexed files that look most like one file.
+    
+    The MinHash signature of the file is looked up in the LSH band buckets
+    stored by SimilarityIndex, and only files sharing a bucket with it are
+    compared, so a query does not get slower as the index grows. The
+    candidates are ranked by their exact similarity under the index metric.
     
     Args:
-        root_dir: Root directory to search
-        exclude_dirs: Set of directory names to exclude
+        file_path: File to find neighbours of; it does not need to be indexed
+        index_path: SQLite index written by a scan with an index
+        k: Maximum number of files to return
+        threshold: Minimum similarity ratio (default: the index threshold).
+            The LSH bands are laid out for the index threshold, so a lower
+            threshold can miss files
+        root_dir: Root the indexed paths are relative to (default: the
+            root of the last scan)
+        max_size_mb: Files above this size are not compared
         
     Returns:
-        List of file paths
+        Up to k (path, similarity) tuples, most similar first
+        
+    Raises:
+        FileNotFoundError: If the index does not exist
     """
-    if exclude_dirs is None:
-        exclude_dirs = {
-            '.git',
-            '__pycache__',
-            'node_modules',
-            '.pytest_cache',
-            '.venv',
-            'venv',
-            'dist',
-            'build',
-            '.tox'
-        }
-    
-    files = []
-    
-    for item in root_dir.rglob('*'):
-        # Skip if in excluded directory
-        if any(excluded in item.parts for excluded in exclude_dirs):
+    if not index_path.exists():
+        raise FileNotFoundError(f"Index not found: {index_path}")
+    
+    connection = sqlite3.connect(f"{index_path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        meta = dict(connection.execute("SELECT key, value FROM meta"))
+        bands, rows = map(int, meta['bands'].split('/'))
+        metric = meta.get('metric', DEFAULT_METRIC)
+        if threshold is None:
+            threshold = float(meta['threshold'])
+        if root_dir is None:
+            root_dir = Path(meta['root'])
+        
+        content = read_file_content(file_path, max_size_mb)
+        if content is None:
+            return []
+        
+        candidates = set()
+        for band, bucket in enumerate(lsh_band_buckets(compute_minhash(get_shingles(content)), bands, rows)):
+            candidates.update(path for (path,) in connection.execute(
+                "SELECT path FROM bands WHERE band = ? AND bucket = ?", (band, bucket)))
+    finally:
+        connection.close()
+    
+    try:
+        candidates.discard(file_path.resolve().relative_to(root_dir.resolve()).as_posix())
+    except ValueError:
+        pass  # Not inside the indexed tree
+    
+    results = []
+    query_features = content_features(content, metric)
+    for candidate in sorted(candidates):
+        candidate_content = read_file_content(root_dir / candidate, max_size_mb)
+        if candidate_content is None:
             continue
+        features = (query_features, content_features(candidate_content, metric))
+        similarity = content_similarity(content, candidate_content, threshold, metric=metric, features=features)
+        if similarity >= threshold:
+            results.append((root_dir / candidate, similarity))
+    
+    results.sort(key=lambda result: result[1], reverse=True)
+    return results[:k]
+
+
+class ResultsWriter:
+    """
+    JSON Lines stream of scan results, written as they are found.
+    
+    The stream holds one record per line, each with a 'type':
+    
+    - header: scan settings and a digest of the scanned file list
+    - duplicates: a group of byte-identical files
+    - pair: a similar pair, between the first files of duplicate groups
+    - checkpoint: number of comparisons done so far in a serial scan
+    - cluster: a cluster of similar files, when clusters are reported
+    - done: written by finish() once the caller has recorded everything
+    
+    Paths are relative to the scanned root. Opening an existing stream with
+    resume=True drops everything after its last checkpoint, so the scan can
+    carry on from there without repeating records.
+    """
+    
+    def __init__(self, stream: TextIO, root_dir: Path, resumed: Optional[List[Dict[str, Any]]] = None):
+        self.stream = stream
+        self.root_dir = root_dir
+        self.resumed = resumed or []
+        self.pairs_written = 0
+    
+    @classmethod
+    def open(cls, results_path: Path, root_dir: Path, resume: bool = False) -> 'ResultsWriter':
+        """
+        Open a results file for writing.
         
-        # Only process files
-        if item.is_file():
-            # Check if it's a text file
-            if is_text_file(item):
-                files.append(item)
+        Args:
+            results_path: JSON Lines file to write
+            root_dir: Root directory the paths are relative to
+            resume: Keep the records up to the last checkpoint of an
+                existing file and append after them
+        """
+        resumed = []
+        if resume and results_path.exists():
+            keep = 0
+            records = []
+            with open(results_path, 'r', encoding='utf-8') as f:
+                for line in iter(f.readline, ''):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Torn final line
+                    records.append(record)
+                    if record.get('type') == 'checkpoint':
+                        keep, resumed = f.tell(), list(records)
+            with open(results_path, 'r+', encoding='utf-8') as f:
+                f.truncate(keep)
+        stream = open(results_path, 'a' if resumed else 'w', encoding='utf-8')
+        return cls(stream, root_dir, resumed)
     
-    return files
+    def close(self) -> None:
+        """Flush and close the underlying stream, unless it is a standard stream."""
+        if self.stream in (sys.stdout, sys.stderr):
+            self.stream.flush()
+        else:
+            self.stream.close()
+    
+    def relative(self, file_path: Path) -> str:
+        """Return the POSIX path of a file relative to the scanned root."""
+        try:
+            return file_path.relative_to(self.root_dir).as_posix()
+        except ValueError:
+            return file_path.as_posix()
+    
+    def write(self, record: Dict[str, Any]) -> None:
+        """Write one record."""
+        self.stream.write(json.dumps(record) + '\n')
+    
+    def start(self, header: Dict[str, Any]) -> int:
+        """
+        Write the header, or check it against the resumed stream.
+        
+        Returns:
+            Number of comparisons already done by the resumed stream
+            
+        Raises:
+            ValueError: If the resumed stream was written by a scan with
+                other settings or another file list
+        """
+        header = dict(type='header', version=RESULTS_FORMAT_VERSION, **header)
+        if not self.resumed:
+            self.write(header)
+            return 0
+        if self.resumed[0] != header:
+            raise ValueError("Results file was written by a different scan; cannot resume it")
+        self.pairs_written = sum(1 for record in self.resumed if record['type'] == 'pair')
+        return self.resumed[-1]['done']
+    
+    def resumed_pairs(self) -> List[Tuple[str, str, float]]:
+        """Return the pairs recorded by the resumed stream."""
+        return [(record['file1'], record['file2'], record['similarity'])
+                for record in self.resumed if record['type'] == 'pair']
+    
+    def duplicates(self, files: List[Path], groups: List[List[int]]) -> None:
+        """Record groups of byte-identical files."""
+        for group in groups:
+            self.write({'type': 'duplicates', 'files': [self.relative(files[index]) for index in group]})
+    
+    def pair(self, file1: Path, file2: Path, similarity: float) -> None:
+        """Record a similar pair."""
+        self.write({'type': 'pair', 'file1': self.relative(file1), 'file2': self.relative(file2),
+                    'similarity': similarity})
+        self.pairs_written += 1
+    
+    def checkpoint(self, done: int, total: int) -> None:
+        """Record scan progress and flush everything written so far."""
+        self.write({'type': 'checkpoint', 'done': done, 'total': total})
+        self.stream.flush()
+    
+    def cluster(self, cluster: Dict[str, Any], files: List[Path]) -> None:
+        """Record a cluster from cluster_matches."""
+        record = dict(cluster, type='cluster')
+        record['representative'] = self.relative(files[cluster['representative']])
+        record['members'] = [self.relative(files[index]) for index in cluster['members']]
+        self.write(record)
+    
+    def finish(self, stats: Optional[Dict[str, int]] = None) -> None:
+        """Record the end of the scan."""
+        self.write({'type': 'done', 'pairs': self.pairs_written, 'stats': stats or {}})
+        self.stream.flush()
 
 
-def report_progress(comparisons_done: int, total_comparisons: int) -> None:
+def load_results(results_path: Path) -> Tuple[Dict[str, Any], List[Path], List[Tuple[int, int, float]],
+                                              List[List[int]]]:
     """
-    Report progress of file comparisons.
+    Read a results stream written by ResultsWriter.
     
     Args:
-        comparisons_done: Number of comparisons completed
-        total_comparisons: Total number of comparisons to perform
+        results_path: JSON Lines results file
+        
+    Returns:
+        Tuple (header, files, matches, duplicate_groups) in the same form
+        as scan_similarity, for the files that appear in the stream
     """
-    if comparisons_done % PROGRESS_UPDATE_INTERVAL == 0 or comparisons_done == total_comparisons:
-        if sys.stdout.isatty():
-            print(f"Progress: {comparisons_done}/{total_comparisons} comparisons", end='\r')
-            sys.stdout.flush()
-        else:
-            # For non-interactive output, print periodic updates
-            if comparisons_done % NON_INTERACTIVE_PROGRESS_INTERVAL == 0 or comparisons_done == total_comparisons:
-                print(f"Progress: {comparisons_done}/{total_comparisons} comparisons")
+    header: Dict[str, Any] = {}
+    files: List[Path] = []
+    positions: Dict[str, int] = {}
+    matches: List[Tuple[int, int, float]] = []
+    groups: List[List[int]] = []
+    
+    def position(relative_path: str) -> int:
+        if relative_path not in positions:
+            positions[relative_path] = len(files)
+            files.append(Path(header.get('root', '.')) / relative_path)
+        return positions[relative_path]
+    
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # Torn final line of an interrupted scan
+            if record['type'] == 'header':
+                header = record
+            elif record['type'] == 'duplicates':
+                groups.append(sorted(position(relative_path) for relative_path in record['files']))
+            elif record['type'] == 'pair':
+                i, j = position(record['file1']), position(record['file2'])
+                matches.append((min(i, j), max(i, j), record['similarity']))
+    
+    return header, files, matches, groups
 
 
-def compare_files(root_dir: Path, similarity_threshold: float = 0.90) -> List[Tuple[Path, Path, float]]:
+def scan_similarity(root_dir: Path, similarity_threshold: float = 0.90,
+                    engine: str = DEFAULT_ENGINE, cache_size_mb: int = DEFAULT_CACHE_SIZE_MB,
+                    use_mmap: bool = False, workers: int = 1, prefilter: bool = True,
+                    size_window: bool = True, stats: Optional[Dict[str, int]] = None,
+                    index_path: Optional[Path] = None, max_size_mb: int = MAX_FILE_SIZE_MB,
+                    stream_large_files: bool = True, metric: str = DEFAULT_METRIC,
+                    respect_gitignore: bool = True, exact_duplicates: bool = True,
+                    results: Optional[ResultsWriter] = None
+                    ) -> Tuple[List[Path], List[Tuple[int, int, float]], List[List[int]]]:
     """
     Compare all files in the directory and find similar pairs.
     
+    Matches involving exact duplicates are not expanded to every copy; see
+    compare_files for the full pair list, and cluster_matches or
+    iter_expanded_matches to consume the result without expanding it.
+    
     Args:
         root_dir: Root directory to search
         similarity_threshold: Minimum similarity ratio to report
+        engine: 'exhaustive' compares every pair; 'lsh' only verifies
+            candidate pairs produced by MinHash/LSH
+        cache_size_mb: Memory budget for decoded file contents; each file
+            is read once per scan as long as the tree fits in the budget
+        use_mmap: Read files through memory maps
+        workers: Number of worker processes to compare pairs in; 1 keeps
+            the comparison in this process
+        prefilter: Reject pairs with cheap upper bounds before running
+            SequenceMatcher; the reported pairs are the same either way
+        size_window: With the exhaustive engine, sort files by length and
+            only pair files whose lengths allow the threshold to be reached
+        stats: Optional dict that receives, per prefilter stage, the number
+            of pairs it eliminated, plus the number of full comparisons and
+            the number of pairs skipped by the size window
+        index_path: Optional SQLite index file. Files unchanged since the
+            previous run with the same index are not compared again with
+            each other; their stored pairs are reused
+        max_size_mb: Files up to this size are compared exactly
+        stream_large_files: Estimate the similarity of larger files from
+            streamed chunk sketches instead of skipping them
+        metric: 'char' compares characters, 'line' compares per-line hashes
+        respect_gitignore: Skip files ignored by .gitignore files in the tree
+        exact_duplicates: Group byte-identical files first, report them as
+            identical and only compare one file of each group
+        results: Optional ResultsWriter that receives each similar pair as
+            soon as it is found, with periodic checkpoints. A writer opened
+            with resume=True skips the comparisons its stream already covers
+            (serial scans only)
         
     Returns:
-        List of tuples (file1, file2, similarity_ratio) for similar files
+        Tuple (files, matches, duplicate_groups): the scanned files,
+        (i, j, similarity) matches between their indices sorted by (i, j),
+        and the groups of byte-identical file indices
     """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine} (expected one of {', '.join(ENGINES)})")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric} (expected one of {', '.join(METRICS)})")
+    
     print(f"Scanning files in {root_dir}...")
-    files = get_all_files(root_dir)
+    sizes: Dict[Path, int] = {}
+    sniffer = TextSniffer()
+    files = get_all_files(root_dir, respect_gitignore=respect_gitignore, sizes=sizes, sniffer=sniffer)
     print(f"Found {len(files)} text files to compare")
     
-    similar_pairs = []
-    total_comparisons = len(files) * (len(files) - 1) // 2
+    cache = FileContentCache(max_bytes=cache_size_mb * 1024 * 1024, max_size_mb=max_size_mb,
+                             use_mmap=use_mmap, stream_large_files=stream_large_files, sizes=sizes,
+                             sniffer=sniffer)
+    
+    index = changed = None
+    if index_path is not None:
+        index = SimilarityIndex(index_path, root_dir, similarity_threshold, metric, engine,
+                                max_size_mb, stream_large_files)
+        changed, removed = index.refresh(files, cache)
+        print(f"Index: {len(files) - len(changed)} unchanged, {len(changed)} new or changed, "
+              f"{removed} removed")
+    
+    # Only the first file of each group of exact duplicates is compared
+    all_files = files
+    duplicate_groups = find_exact_duplicates(all_files, cache) if exact_duplicates else []
+    if duplicate_groups:
+        collapsed = {index for group in duplicate_groups for index in group[1:]}
+        representatives = [index for index in range(len(all_files)) if index not in collapsed]
+        files = [all_files[index] for index in representatives]
+        if changed is not None:
+            changed = {position for position, index in enumerate(representatives) if index in changed}
+        if stats is not None:
+            stats[STAGE_EXACT_DUPLICATE] = stats.get(STAGE_EXACT_DUPLICATE, 0) + len(collapsed)
+        print(f"Exact duplicates: {len(collapsed) + len(duplicate_groups)} files in "
+              f"{len(duplicate_groups)} group(s), comparing one file of each")
+        # Copies on the far side of a partner are compared in their own order too
+        reverse_limits: Optional[List[int]] = get_reverse_limits(representatives, duplicate_groups)
+    else:
+        representatives = list(range(len(all_files)))
+        reverse_limits = None
+    members = {index: group for group in duplicate_groups for index in group}
+    
+    def original_pair(i: int, j: int) -> Tuple[int, int]:
+        """Map a pair of compared positions, i's content first, to a pair of all_files."""
+        a, b = representatives[i], representatives[j]
+        return first_pair_between(members.get(a, [a]), members.get(b, [b]))
+    
+    candidates = window = None
+    if engine == ENGINE_LSH:
+        print("Building MinHash signatures...")
+        signatures = index.get_signatures(files) if index is not None else {}
+        candidates = get_lsh_candidate_pairs(files, similarity_threshold, cache, signatures)
+        if cache.stream_large_files:
+            # Streamed files have no MinHash signature; pair them with each other
+            large = [i for i, file_path in enumerate(files)
+                     if cache.get_length(file_path) is not None and cache.is_large(file_path)]
+            candidates = sorted(set(candidates).union(
+                (i, j) for position, i in enumerate(large) for j in large[position + 1:]))
+        if index is not None:
+            index.set_signatures(files, signatures)
+            candidates = [(i, j) for i, j in candidates if i in changed or j in changed]
+        pairs = iter(candidates)
+        total_comparisons = len(candidates)
+    elif index is not None:
+        candidates = get_incremental_pairs(index.get_lengths(files), changed, similarity_threshold, size_window)
+        pairs = iter(candidates)
+        total_comparisons = len(candidates)
+        
+        unchanged = len(files) - len(changed)
+        skipped = len(changed) * unchanged + len(changed) * (len(changed) - 1) // 2 - total_comparisons
+        if stats is not None:
+            stats[STAGE_SIZE_WINDOW] = stats.get(STAGE_SIZE_WINDOW, 0) + skipped
+    else:
+        all_pairs = len(files) * (len(files) - 1) // 2
+        if size_window and similarity_threshold > 0:
+            lengths = [cache.get_length(file_path, metric) for file_path in files]
+            window = build_size_window(lengths, similarity_threshold)
+        else:
+            window = (list(range(len(files))), [len(files)] * len(files))
+        pairs = iter_window_pairs(*window)
+        total_comparisons = sum(limit - p - 1 for p, limit in enumerate(window[1]))
+        
+        skipped = all_pairs - total_comparisons
+        if stats is not None:
+            stats[STAGE_SIZE_WINDOW] = stats.get(STAGE_SIZE_WINDOW, 0) + skipped
+        if skipped:
+            print(f"Size window skipped {skipped} of {all_pairs} pairs")
+    
     comparisons_done = 0
+    previous_matches = []
+    if results is not None:
+        file_list = hashlib.blake2b('\n'.join(map(results.relative, all_files)).encode('utf-8'), digest_size=16)
+        comparisons_done = results.start({
+            'root': str(root_dir), 'threshold': similarity_threshold, 'engine': engine, 'metric': metric,
+            'max_size_mb': max_size_mb, 'stream_large_files': stream_large_files,
+            'exact_duplicates': exact_duplicates, 'index': index_path is not None,
+            'files': len(all_files), 'file_list': file_list.hexdigest(),
+        })
+        if results.resumed:
+            # The duplicate groups and every record up to the checkpoint are already on disk
+            if comparisons_done and workers > 1:
+                raise ValueError("Resuming a results file requires a serial scan (workers=1)")
+            position_of = {index: position for position, index in enumerate(representatives)}
+            positions = {results.relative(file_path): position_of[members.get(index, [index])[0]]
+                         for index, file_path in enumerate(all_files)}
+            previous_matches = [(positions[file1], positions[file2], similarity)
+                                for file1, file2, similarity in results.resumed_pairs()]
+            pairs = islice(pairs, comparisons_done, None)
+            print(f"Resuming after {comparisons_done} comparisons")
+        else:
+            results.duplicates(all_files, duplicate_groups)
+            results.checkpoint(0, total_comparisons)
     
     print(f"\nComparing files (total comparisons: {total_comparisons})...")
     
-    # Compare each pair of files
-    for i in range(len(files)):
-        for j in range(i + 1, len(files)):
+    if workers > 1:
+        on_matches = None
+        if results is not None:
+            def on_matches(block_matches: List[Tuple[int, int, float]]) -> None:
+                for i, j, similarity in block_matches:
+                    i, j = original_pair(i, j)
+                    results.pair(all_files[i], all_files[j], similarity)
+        matches = compare_pairs_parallel(files, similarity_threshold, workers, cache, candidates, window,
+                                         prefilter, stats, metric, on_matches, reverse_limits)
+    else:
+        matches = previous_matches
+        
+        # Compare each pair of files
+        for i, j in pairs:
             comparisons_done += 1
             
             # Report progress
             report_progress(comparisons_done, total_comparisons)
             
-            file1 = files[i]
-            file2 = files[j]
-            
-            similarity = calculate_similarity(file1, file2)
+            orders = [(i, j), (j, i)] if reverse_limits is not None and j < reverse_limits[i] else [(i, j)]
+            for first, second in orders:
+                similarity = calculate_similarity(files[first], files[second], cache=cache,
+                                                  threshold=similarity_threshold if prefilter else None,
+                                                  stats=stats, metric=metric)
+                
+                if similarity >= similarity_threshold:
+                    matches.append((first, second, similarity))
+                    if results is not None:
+                        file1, file2 = original_pair(first, second)
+                        results.pair(all_files[file1], all_files[file2], similarity)
             
-            if similarity >= similarity_threshold:
-                similar_pairs.append((file1, file2, similarity))
+            if results is not None and comparisons_done % CHECKPOINT_INTERVAL == 0:
+                results.checkpoint(comparisons_done, total_comparisons)
+        
+        # The size window visits pairs by length; report them in file order
+        matches.sort(key=lambda match: (match[0], match[1]))
     
     print()  # New line after progress
-    return similar_pairs
+    
+    if results is not None:
+        results.checkpoint(total_comparisons, total_comparisons)
+    
+    matches = sorted((*original_pair(i, j), similarity) for i, j, similarity in matches)
+    if index is not None:
+        found = {(min(i, j), max(i, j)) for i, j, _ in matches}
+        index.add_pairs(all_files, matches)
+        matches = index.get_matches(all_files)
+        if duplicate_groups:
+            # Store every copy's pairs, in case a group's first file changes later
+            index.add_pairs(all_files, iter_expanded_matches(matches, duplicate_groups))
+        index.save()
+        index.close()
+        if results is not None:
+            # Pairs reused from the index were not streamed during the scan
+            for (i, j), similarity in collapse_duplicate_matches(matches, duplicate_groups).items():
+                if (i, j) not in found:
+                    results.pair(all_files[i], all_files[j], similarity)
+    
+    return all_files, matches, duplicate_groups
+
+
+def compare_files(root_dir: Path, similarity_threshold: float = 0.90,
+                  **options: Any) -> List[Tuple[Path, Path, float]]:
+    """
+    Compare all files in the directory and find similar pairs.
+    
+    Args:
+        root_dir: Root directory to search
+        similarity_threshold: Minimum similarity ratio to report
+        **options: Passed to scan_similarity
+        
+    Returns:
+        List of tuples (file1, file2, similarity_ratio) for similar files,
+        including every pair of exact duplicates
+    """
+    files, matches, duplicate_groups = scan_similarity(root_dir, similarity_threshold, **options)
+    if duplicate_groups:
+        matches = expand_duplicate_matches(matches, duplicate_groups)
+    return [(files[i], files[j], similarity) for i, j, similarity in matches]
+
+
+def iter_similar_pairs(root_dir: Path, similarity_threshold: float = 0.90,
+                       **options: Any) -> Iterator[Tuple[Path, Path, float]]:
+    """
+    Like compare_files, but yield pairs without building the full list.
+    
+    Pairs are not sorted; pairs of exact duplicates are expanded lazily.
+    """
+    files, matches, duplicate_groups = scan_similarity(root_dir, similarity_threshold, **options)
+    for i, j, similarity in iter_expanded_matches(matches, duplicate_groups):
+        yield files[i], files[j], similarity
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse command line arguments.
+    
+    Args:
+        argv: Argument list (defaults to sys.argv[1:])
+        
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Find files with similar content.")
+    parser.add_argument('root', nargs='?', type=Path, default=Path(__file__).parent,
+                        help="Directory to scan (default: the script's directory)")
+    parser.add_argument('--threshold', type=float, default=0.90,
+                        help="Minimum similarity ratio to report (default: 0.90)")
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                        help="'exhaustive' compares every pair, 'lsh' only compares "
+                             "MinHash/LSH candidates (default: %(default)s)")
+    parser.add_argument('--metric', choices=METRICS, default=DEFAULT_METRIC,
+                        help="'char' compares characters, 'line' compares per-line hashes, "
+                             "which is much faster on source code (default: %(default)s)")
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help="Memory budget for cached file contents (default: %(default)s)")
+    parser.add_argument('--mmap', action='store_true',
+                        help="Read files through memory maps")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes to compare pairs in (default: %(default)s)")
+    parser.add_argument('--no-prefilter', dest='prefilter', action='store_false',
+                        help="Run SequenceMatcher on every pair instead of rejecting "
+                             "pairs with cheap upper bounds first")
+    parser.add_argument('--no-size-window', dest='size_window', action='store_false',
+                        help="Generate every pair instead of only pairs whose lengths "
+                             "allow the threshold to be reached")
+    parser.add_argument('--max-size-mb', type=int, default=MAX_FILE_SIZE_MB,
+                        help="Files up to this size are compared exactly (default: %(default)s)")
+    parser.add_argument('--skip-large-files', dest='stream_large_files', action='store_false',
+                        help="Skip files above --max-size-mb instead of estimating their "
+                             "similarity from streamed chunk sketches")
+    parser.add_argument('--no-exact-duplicates', dest='exact_duplicates', action='store_false',
+                        help="Compare byte-identical files like any other pair instead of "
+                             "grouping them by content hash first")
+    parser.add_argument('--no-gitignore', dest='respect_gitignore', action='store_false',
+                        help="Also compare files ignored by .gitignore files in the tree")
+    parser.add_argument('--clusters', action='store_true',
+                        help="Print clusters of transitively similar files instead of every pair")
+    parser.add_argument('--output', type=Path, default=None,
+                        help="Write the cluster report to this file, as CSV if it ends in .csv "
+                             "and as JSON otherwise")
+    parser.add_argument('--results', default=None, metavar='FILE',
+                        help="Stream similar pairs to this JSON Lines file as they are found, "
+                             "with periodic checkpoints ('-' for NDJSON on stdout)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted scan from the last checkpoint in --results")
+    parser.add_argument('--render', type=Path, default=None, metavar='FILE',
+                        help="Print the text report of a --results file instead of scanning")
+    parser.add_argument('--index', type=Path, default=None,
+                        help="SQLite index file; files unchanged since the last run with "
+                             "this index are not compared again")
+    args = parser.parse_args(argv)
+    if args.resume and args.results in (None, '-'):
+        parser.error("--resume requires a --results file")
+    return args
+
+
+def print_pairs(similar_pairs: List[Tuple[Path, Path, float]], root_dir: Path, threshold_pct: str) -> None:
+    """Print every similar pair, most similar first."""
+    if not similar_pairs:
+        print(f"\nNo files with {threshold_pct} or more similarity found.")
+        return
+    
+    print(f"\nFound {len(similar_pairs)} pair(s) of files with {threshold_pct} or more similarity:\n")
+    
+    for file1, file2, similarity in sorted(similar_pairs, key=lambda x: x[2], reverse=True):
+        # Get relative paths from root
+        try:
+            rel_path1 = file1.relative_to(root_dir)
+            rel_path2 = file2.relative_to(root_dir)
+        except ValueError:
+            rel_path1 = file1
+            rel_path2 = file2
+        
+        print(f"Similarity: {similarity * 100:.2f}%")
+        print(f"  File 1: {rel_path1}")
+        print(f"  File 2: {rel_path2}")
+        print()
+
+
+def print_clusters(clusters: List[Dict[str, Any]], files: List[Path], root_dir: Path, threshold_pct: str) -> None:
+    """Print one block per cluster, listing its representative first."""
+    if not clusters:
+        print(f"\nNo files with {threshold_pct} or more similarity found.")
+        return
+    
+    print(f"\nFound {len(clusters)} cluster(s) of files with {threshold_pct} or more similarity:\n")
+    
+    for cluster in clusters:
+        print(f"Cluster {cluster['id']}: {cluster['size']} files, {cluster['pairs']} similar pair(s), "
+              f"similarity {cluster['min_similarity'] * 100:.2f}%-{cluster['max_similarity'] * 100:.2f}%")
+        print(f"  Representative: {_relative(files[cluster['representative']], root_dir)}")
+        for index in cluster['members']:
+            if index != cluster['representative']:
+                print(f"  {_relative(files[index], root_dir)}")
+        print()
+
+
+def parse_query_args(argv: List[str]) -> argparse.Namespace:
+    """
+    Parse the arguments of the query subcommand.
+    
+    Args:
+        argv: Argument list after 'query'
+        
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(prog="compare_file_similarity.py query",
+                                     description="Find the indexed files most similar to one file.")
+    parser.add_argument('file', type=Path, help="File to find similar files for")
+    parser.add_argument('--index', type=Path, required=True,
+                        help="SQLite index written by a scan with --index")
+    parser.add_argument('-k', '--top', type=int, default=DEFAULT_QUERY_RESULTS,
+                        help="Maximum number of files to list (default: %(default)s)")
+    parser.add_argument('--threshold', type=float, default=None,
+                        help="Minimum similarity ratio (default: the threshold the index was built with)")
+    parser.add_argument('--root', type=Path, default=None,
+                        help="Root the indexed paths are relative to (default: the scanned root)")
+    return parser.parse_args(argv)
+
+
+def run_query(args: argparse.Namespace) -> None:
+    """Print the indexed files most similar to args.file."""
+    start = time.perf_counter()
+    results = find_similar(args.file, args.index, k=args.top, threshold=args.threshold, root_dir=args.root)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    if not results:
+        print(f"No similar files found for {args.file} ({elapsed_ms:.1f} ms)")
+        return
+    
+    print(f"Files most similar to {args.file} ({elapsed_ms:.1f} ms):")
+    for file_path, similarity in results:
+        print(f"  {similarity * 100:6.2f}%  {file_path}")
+
+
+def render_results(results_path: Path) -> None:
+    """Print the text report of a results stream written by a previous scan."""
+    header, files, matches, duplicate_groups = load_results(results_path)
+    root_dir = Path(header.get('root', '.'))
+    threshold_pct = f"{header.get('threshold', 0.90) * 100:g}%"
+    
+    print("=" * 80)
+    print("RESULTS")
+    print("=" * 80)
+    
+    if duplicate_groups:
+        matches = expand_duplicate_matches(matches, duplicate_groups)
+    print_pairs([(files[i], files[j], similarity) for i, j, similarity in matches], root_dir, threshold_pct)
+    
+    print("=" * 80)
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main function to run the file similarity comparison."""
-    # Get the directory to scan (current directory by default)
-    root_dir = Path(__file__).parent.resolve()
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['query']:
+        run_query(parse_query_args(argv[1:]))
+        return
+    
+    args = parse_args(argv)
+    if args.render is not None:
+        render_results(args.render)
+        return
+    
+    # Get the directory to scan (script directory by default)
+    root_dir = args.root.resolve()
+    
+    results = None
+    if args.results == '-':
+        results = ResultsWriter(sys.stdout, root_dir)
+    elif args.results is not None:
+        results = ResultsWriter.open(Path(args.results), root_dir, resume=args.resume)
+    
+    try:
+        if args.results == '-':
+            # Keep stdout for the NDJSON stream
+            with redirect_stdout(sys.stderr):
+                run_scan(args, root_dir, results)
+        else:
+            run_scan(args, root_dir, results)
+    finally:
+        if results is not None:
+            results.close()
+
+
+def run_scan(args: argparse.Namespace, root_dir: Path, results: Optional[ResultsWriter] = None) -> None:
+    """Scan root_dir with the parsed command line options and print the report."""
+    threshold_pct = f"{args.threshold * 100:g}%"
     
     print("=" * 80)
     print("File Similarity Comparator")
     print("=" * 80)
-    print(f"Searching for files with 90% or more similar content")
+    print(f"Searching for files with {threshold_pct} or more similar content")
     print(f"Root directory: {root_dir}")
+    print(f"Engine: {args.engine}, metric: {args.metric}")
     print("=" * 80)
     print()
     
     # Find similar files
-    similar_pairs = compare_files(root_dir, similarity_threshold=0.90)
+    stats: Dict[str, int] = {}
+    files, matches, duplicate_groups = scan_similarity(
+        root_dir, similarity_threshold=args.threshold, engine=args.engine,
+        cache_size_mb=args.cache_size_mb, use_mmap=args.mmap, workers=args.workers,
+        prefilter=args.prefilter, size_window=args.size_window, stats=stats, index_path=args.index,
+        max_size_mb=args.max_size_mb, stream_large_files=args.stream_large_files,
+        metric=args.metric, respect_gitignore=args.respect_gitignore,
+        exact_duplicates=args.exact_duplicates, results=results)
+    
+    if stats.get(STAGE_EXACT_DUPLICATE):
+        print(f"Exact duplicates not compared: {stats[STAGE_EXACT_DUPLICATE]}")
+    if STAGE_SIZE_WINDOW in stats:
+        print(f"Pairs skipped by size window: {stats[STAGE_SIZE_WINDOW]}")
+    if args.prefilter:
+        print("Pairs eliminated by prefilter stage:")
+        for stage in PREFILTER_STAGES:
+            print(f"  {stage}: {stats.get(stage, 0)}")
+        print(f"Full comparisons: {stats.get(STAGE_SEQUENCE_MATCHER, 0)}")
+    if stats.get(STAGE_STREAM_SKETCH):
+        print(f"Large file pairs estimated from chunk sketches: {stats[STAGE_STREAM_SKETCH]}")
+    
+    clusters = None
+    if args.clusters or args.output is not None:
+        clusters = cluster_matches(len(files), matches, duplicate_groups)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            if args.output.suffix.lower() == '.csv':
+                write_clusters_csv(clusters, files, f, root_dir)
+            else:
+                write_clusters_json(clusters, files, f, root_dir)
+        print(f"Wrote {len(clusters)} cluster(s) to {args.output}")
+    if results is not None:
+        for cluster in clusters or ():
+            results.cluster(cluster, files)
+        results.finish(stats)
     
     # Display results
     print("\n" + "=" * 80)
     print("RESULTS")
     print("=" * 80)
     
-    if not similar_pairs:
-        print("\nNo files with 90% or more similarity found.")
+    if args.clusters:
+        print_clusters(clusters, files, root_dir, threshold_pct)
     else:
-        print(f"\nFound {len(similar_pairs)} pair(s) of files with 90% or more similarity:\n")
-        
-        for file1, file2, similarity in sorted(similar_pairs, key=lambda x: x[2], reverse=True):
-            # Get relative paths from root
-            try:
-                rel_path1 = file1.relative_to(root_dir)
-                rel_path2 = file2.relative_to(root_dir)
-            except ValueError:
-                rel_path1 = file1
-                rel_path2 = file2
-            
-            print(f"Similarity: {similarity * 100:.2f}%")
-            print(f"  File 1: {rel_path1}")
-            print(f"  File 2: {rel_path2}")
-            print()
+        if duplicate_groups:
+            matches = expand_duplicate_matches(matches, duplicate_groups)
+        print_pairs([(files[i], files[j], similarity) for i, j, similarity in matches], root_dir, threshold_pct)
     
     print("=" * 80)
     print("Comparison complete!")
@@ -129,6 +129,8 @@ def generate_readme(spec: Dict, plugin_dir: Path) -> None:
 - **Timeout**: {spec['timeout_seconds']} seconds
 - **Risk Level**: {spec['risk_level']}
 - **Rollback Supported**: {'Yes' if spec['rollback_supported'] else 'No'}
+- **Execution Mode**: {spec.get('execution_mode', 'thread')}
+- **Depends On**: {', '.join(spec.get('depends_on', [])) or 'None'}
 
 ## Usage
 
@@ -153,6 +155,25 @@ pytest plugins/{spec['plugin_name']}/tests/ -v
         f.write(readme)
 
 
+def worker_healthcheck(spec: Dict) -> str:
+    """Return the healthcheck section for plugins that run as a worker."""
+    if not spec.get("worker_mode"):
+        return ""
+    return f"""
+### Worker Mode
+
+The runner keeps one `--serve` worker per plugin and sends it one JSON
+request per line, so the plugin's state stays loaded between files.
+Check a worker and its state with a ping:
+
+```bash
+echo '{{"command": "ping"}}' | python plugins/{spec['plugin_name']}/{spec['entry_point']} --serve
+```
+
+Expected output: `{{"status": "success", "command": "ping", "pid": ..., ...}}`
+"""
+
+
 def generate_healthcheck(spec: Dict, plugin_dir: Path) -> None:
     """Generate ``healthcheck.md`` to aid monitoring the plugin."""
     healthcheck = f"""# Healthcheck: {spec['plugin_name']}
@@ -194,7 +215,7 @@ EOF
 ```
 
 Expected output: `{{"status": "success", ...}}`
-
+{worker_healthcheck(spec)}
 ### Common Issues
 
 1. **Timeout Errors**
@@ -6,15 +6,58 @@ and that OpenTelemetry spans are created around each lifecycle event.
 Each plugin executed by the pipeline receives the same trace ID so that
 operations can be correlated end‑to‑end.  A helper function
 ``execute_lifecycle_plugins`` is provided to iterate over plugins for
-a given event; in a real implementation ``get_plugins_for_event`` would
-discover and load the appropriate plugin handlers.
+a given event; ``get_plugins_for_event`` finds them through a
+``PluginRegistry`` built from the ``plugin.spec.json`` files under
+``plugins/``.
+
+Plugins that support a worker mode are run through ``PluginWorker``: the
+plugin process is started once and reused for every file and lifecycle
+event instead of paying interpreter startup per invocation.
+
+Within an event, plugins run concurrently as a dependency graph: a plugin
+starts as soon as the plugins named in its ``depends_on`` have finished,
+on a thread, in a worker process or on an event loop depending on its
+``execution_mode``.
 """
 
+import asyncio
+import atexit
+import contextvars
+import heapq
+import importlib.util
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
 import uuid
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import ExitStack
+from pathlib import Path
+from types import ModuleType
+from typing import IO
 from opentelemetry import trace
 
 
 tracer = trace.get_tracer(__name__)
+logger = logging.getLogger(__name__)
+
+PLUGINS_DIR = Path(__file__).resolve().parent.parent / "plugins"
+SPEC_FILENAME = "plugin.spec.json"
+INDEX_FILENAME = ".plugin_index.json"
+INDEX_VERSION = 3  # Bump when the cached index layout or spec validation changes
+REQUIRED_SPEC_FIELDS = ("plugin_name", "lifecycle_event", "entry_point")
+EXECUTION_MODES = ("thread", "process", "async")
 
 
 def run_pipeline(file_path: str, trace_id: str | None = None) -> None:
@@ -64,33 +107,578 @@ def run_pipeline(file_path: str, trace_id: str | None = None) -> None:
         root_span.set_status(trace.Status(trace.StatusCode.OK))
 
 
-def execute_lifecycle_plugins(event: str, input_data: dict) -> list:
+def execute_lifecycle_plugins(
+    event: str, input_data: dict, max_workers: int | None = None
+) -> list:
     """Execute all plugins registered for a lifecycle event.
 
+    Independent plugins run concurrently; see ``run_plugin_graph``.
+
     Args:
         event: Name of the lifecycle event.
         input_data: Input payload passed to each plugin.  Must include
             ``trace_id`` so that plugins can attach spans to the correct
             trace.
+        max_workers: Threads for ``thread`` mode plugins; defaults to one
+            per plugin.
+
+    Returns:
+        A list of plugin execution results, in the order of
+        ``get_plugins_for_event``.
+    """
+    return run_plugin_graph(get_plugins_for_event(event), input_data, max_workers)
+
+
+def _error_result(message: str, trace_id: str) -> dict:
+    return {"status": "error", "error_message": message, "trace_id": trace_id}
+
+
+def run_plugin_graph(
+    plugins: list, input_data: dict, max_workers: int | None = None
+) -> list:
+    """Run plugins as a dependency graph and return their results.
+
+    A plugin is started once every plugin in its ``depends_on`` has
+    finished, so independent plugins overlap.  ``execution_mode`` selects
+    where it runs: ``thread`` (default, for I/O-bound plugins) on a thread
+    pool, ``process`` (CPU-bound) on the shared process pool, and ``async``
+    on an event loop shared by the async plugins of the run.  Each plugin
+    gets its own copy of ``input_data``, with the same ``trace_id``, and
+    thread plugins inherit the caller's context (and so its current span).
+
+    A plugin that raises or returns an error status fails; plugins that
+    depend on it are not run and get an error result instead.
+
+    Args:
+        plugins: Plugins in dependency order, as returned by
+            ``get_plugins_for_event``.
+        input_data: Input payload passed to each plugin.
+        max_workers: Threads for ``thread`` mode plugins; defaults to one
+            per plugin.
 
     Returns:
-        A list of plugin execution results.  This stub uses
-        ``get_plugins_for_event`` to find handlers; in an actual system
-        this would load plugins from disk or a registry.
+        One result per plugin, in the order of ``plugins`` regardless of
+        completion order.
     """
-    results: list = []
-    for plugin in get_plugins_for_event(event):
-        # Each plugin gets the same trace_id
-        result = plugin.execute(input_data)
-        results.append(result)
-    return results
+    trace_id = input_data.get("trace_id", "unknown")
+    results: dict[str, dict] = {}
+    failed: set[str] = set()
+    pending = list(plugins)
+    running: dict[Future, Plugin] = {}
+
+    with ExitStack() as stack:
+        threads = stack.enter_context(
+            ThreadPoolExecutor(max_workers=max_workers or max(len(plugins), 1))
+        )
+        loop: asyncio.AbstractEventLoop | None = None
+
+        def submit(plugin: Plugin) -> Future:
+            nonlocal loop
+            mode = plugin.spec.get("execution_mode", "thread")
+            data = dict(input_data)
+            if mode == "process":
+                return get_process_pool().submit(
+                    _execute_in_process, plugin.spec, str(plugin.plugin_dir), data
+                )
+            if mode == "async":
+                if loop is None:
+                    loop = asyncio.new_event_loop()
+                    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+                    loop_thread.start()
+                    stack.callback(loop.close)
+                    stack.callback(loop_thread.join)
+                    stack.callback(loop.call_soon_threadsafe, loop.stop)
+                return asyncio.run_coroutine_threadsafe(
+                    plugin.execute_async(data), loop
+                )
+            return threads.submit(contextvars.copy_context().run, plugin.execute, data)
+
+        while pending or running:
+            for plugin in list(pending):
+                dependencies = plugin.spec.get("depends_on", [])
+                failed_dependencies = [name for name in dependencies if name in failed]
+                if failed_dependencies:
+                    pending.remove(plugin)
+                    failed.add(plugin.name)
+                    results[plugin.name] = _error_result(
+                        f"Skipped: dependency {failed_dependencies[0]} failed", trace_id
+                    )
+                elif all(name in results for name in dependencies):
+                    pending.remove(plugin)
+                    running[submit(plugin)] = plugin
+            if not running:
+                # Only reachable for plugins whose dependencies are not in the list
+                for plugin in pending:
+                    results[plugin.name] = _error_result(
+                        "Skipped: unresolved dependencies", trace_id
+                    )
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                plugin = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"[{trace_id}] Plugin {plugin.name} failed: {e}")
+                    result = _error_result(str(e), trace_id)
+                if not isinstance(result, dict) or result.get("status") == "error":
+                    failed.add(plugin.name)
+                results[plugin.name] = result
+
+    return [results[plugin.name] for plugin in plugins]
 
 
 def get_plugins_for_event(event: str) -> list:
-    """Placeholder for plugin discovery.
+    """Return the enabled plugins registered for a lifecycle event.
+
+    Plugins come from the shared ``PluginRegistry`` over ``PLUGINS_DIR``
+    and are ordered so that dependencies come first, otherwise by name.
+    """
+    return get_registry().plugins_for_event(event)
+
+
+class PluginWorker:
+    """Long-lived plugin process speaking newline-delimited JSON.
 
-    In a real implementation this would inspect the ``plugins`` directory
-    for modules whose ``plugin.spec.json`` declares the given lifecycle
-    event.  Here we return an empty list to keep the example runnable.
+    The plugin is started once with ``--serve``.  Each call to ``execute``
+    writes one JSON request line to its stdin and reads one JSON response
+    line from its stdout, so the interpreter and the plugin's in-memory
+    state are reused across files and lifecycle events.  A worker that
+    has exited, or was killed for missing a deadline, is restarted on the
+    next request.
+
+    Args:
+        entry_point: Path to the plugin script.
+        python: Interpreter used to run it; defaults to the current one.
     """
-    return []
\ No newline at end of file
+
+    def __init__(self, entry_point: str, python: str | None = None) -> None:
+        self.entry_point = entry_point
+        self.python = python or sys.executable
+        self._process: subprocess.Popen | None = None
+        self._responses: queue.Queue[str] = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            process = subprocess.Popen(
+                [self.python, self.entry_point, "--serve"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+            )
+            # Responses are read on a thread so that execute can wait with a
+            # deadline; each process gets its own queue, so a late answer
+            # from a killed worker is never taken for a new request's
+            self._responses = queue.Queue()
+            threading.Thread(
+                target=self._read_responses,
+                args=(process.stdout, self._responses),
+                name=f"plugin-worker-reader-{process.pid}",
+                daemon=True,
+            ).start()
+            self._process = process
+        return self._process
+
+    @staticmethod
+    def _read_responses(stdout: IO[str], responses: queue.Queue[str]) -> None:
+        try:
+            for line in iter(stdout.readline, ""):
+                responses.put(line)
+        finally:
+            responses.put("")  # End of output
+
+    def _stop(self, process: subprocess.Popen) -> None:
+        process.kill()
+        process.wait()
+        self._process = None
+
+    def execute(self, input_data: dict, timeout: float | None = None) -> dict:
+        """Send one request to the worker and return its response.
+
+        Args:
+            input_data: The request.
+            timeout: Seconds to wait for the response; ``None`` waits
+                forever.  A worker that misses the deadline is killed.
+
+        Raises:
+            RuntimeError: If the worker exits without answering.
+            subprocess.TimeoutExpired: If the worker does not answer
+                within ``timeout`` seconds.
+        """
+        with self._lock:
+            process = self._ensure_started()
+            stdin = process.stdin
+            if stdin is None:
+                raise RuntimeError(f"Plugin worker {self.entry_point} has no stdin")
+            try:
+                stdin.write(json.dumps(input_data) + "\n")
+                stdin.flush()
+                line = self._responses.get(timeout=timeout)
+            except BrokenPipeError:
+                line = ""
+            except queue.Empty:
+                self._stop(process)
+                raise subprocess.TimeoutExpired(process.args, timeout or 0) from None
+            if not line:
+                self._process = None
+                raise RuntimeError(
+                    f"Plugin worker {self.entry_point} exited "
+                    f"with code {process.wait()}"
+                )
+            return json.loads(line)
+
+    def close(self) -> None:
+        """Stop the worker by closing its stdin and waiting for it."""
+        with self._lock:
+            process = self._process
+            if process is not None:
+                if process.stdin is not None:
+                    process.stdin.close()
+                try:
+                    process.wait(timeout=10)
+                    self._process = None
+                except subprocess.TimeoutExpired:
+                    self._stop(process)
+
+
+_workers: dict[str, PluginWorker] = {}
+_workers_lock = threading.Lock()
+
+
+def get_plugin_worker(entry_point: str) -> PluginWorker:
+    """Return the shared worker for a plugin, creating it on first use."""
+    with _workers_lock:
+        worker = _workers.get(entry_point)
+        if worker is None:
+            worker = _workers[entry_point] = PluginWorker(entry_point)
+        return worker
+
+
+@atexit.register
+def shutdown_plugin_workers() -> None:
+    """Stop all shared plugin workers."""
+    with _workers_lock:
+        for worker in _workers.values():
+            worker.close()
+        _workers.clear()
+
+
+_plugin_import_lock = threading.Lock()
+
+
+class Plugin:
+    """A plugin declared by a ``plugin.spec.json``.
+
+    The plugin runs in one of three ways, chosen from its spec (a spec
+    sets at most one of ``handler`` and ``worker_mode``):
+
+    - ``handler`` names a function of the entry point module; the module is
+      imported on the first ``execute`` and the function is called
+      in-process.
+    - ``worker_mode`` runs the entry point as a shared ``PluginWorker``.
+    - Otherwise the entry point is run once per call with the input JSON
+      on stdin, as the generated scaffold expects.
+
+    Args:
+        spec: The parsed specification.
+        plugin_dir: Directory holding the spec and the entry point.
+    """
+
+    def __init__(self, spec: dict, plugin_dir: Path) -> None:
+        self.spec = spec
+        self.plugin_dir = plugin_dir
+        self.name = spec["plugin_name"]
+        self.event = spec["lifecycle_event"]
+        self.entry_point = plugin_dir / spec["entry_point"]
+        self._module: ModuleType | None = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Plugin({self.name!r}, {self.event!r})"
+
+    def load(self) -> ModuleType:
+        """Import the entry point module, once."""
+        with self._lock:
+            if self._module is None:
+                module_name = f"r_pipeline_plugins.{self.name.replace('-', '_')}"
+                module_spec = importlib.util.spec_from_file_location(
+                    module_name, self.entry_point
+                )
+                if module_spec is None or module_spec.loader is None:
+                    raise ImportError(f"Cannot import plugin {self.entry_point}")
+                module = importlib.util.module_from_spec(module_spec)
+                # Plugins import their sibling modules as top-level modules;
+                # loads of different plugins must not see each other's path
+                with _plugin_import_lock:
+                    sys.path.insert(0, str(self.plugin_dir))
+                    try:
+                        module_spec.loader.exec_module(module)
+                    finally:
+                        sys.path.remove(str(self.plugin_dir))
+                sys.modules[module_name] = module
+                self._module = module
+            return self._module
+
+    async def execute_async(self, input_data: dict) -> dict:
+        """Run the plugin's handler, awaiting it if it is a coroutine."""
+        result = getattr(self.load(), self.spec["handler"])(input_data)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def execute(self, input_data: dict) -> dict:
+        """Run the plugin on one input and return its output."""
+        handler = self.spec.get("handler")
+        if handler:
+            return getattr(self.load(), handler)(input_data)
+        if self.spec.get("worker_mode"):
+            return get_plugin_worker(str(self.entry_point)).execute(
+                input_data, timeout=self.spec.get("timeout_seconds")
+            )
+        completed = subprocess.run(
+            [sys.executable, str(self.entry_point)],
+            input=json.dumps(input_data),
+            capture_output=True,
+            text=True,
+            timeout=self.spec.get("timeout_seconds"),
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(
+                f"Plugin {self.name} exited with code {completed.returncode}: "
+                f"{completed.stderr.strip()}"
+            )
+        return json.loads(completed.stdout)
+
+
+def validate_spec(spec: object) -> list[str]:
+    """Return the problems that keep a parsed spec from being registered."""
+    if not isinstance(spec, dict):
+        return ["spec is not a JSON object"]
+    problems = [
+        f"missing {field}"
+        for field in REQUIRED_SPEC_FIELDS
+        if not isinstance(spec.get(field), str) or not spec.get(field)
+    ]
+    if "handler" in spec and not isinstance(spec["handler"], str):
+        problems.append("handler is not a string")
+    if spec.get("handler") and spec.get("worker_mode"):
+        problems.append("handler and worker_mode are mutually exclusive")
+    depends_on = spec.get("depends_on", [])
+    if not isinstance(depends_on, list) or not all(
+        isinstance(name, str) for name in depends_on
+    ):
+        problems.append("depends_on is not a list of plugin names")
+    mode = spec.get("execution_mode", "thread")
+    if mode not in EXECUTION_MODES:
+        problems.append(f"execution_mode is not one of {', '.join(EXECUTION_MODES)}")
+    elif mode == "async" and not spec.get("handler"):
+        problems.append("async plugins need a handler")
+    return problems
+
+
+def order_plugins(plugins: list) -> tuple[list, dict[str, list[str]]]:
+    """Order the plugins of one event so that dependencies come first.
+
+    Ties are broken by name, so the order is deterministic.  Plugins that
+    depend on a plugin missing from the event, directly or through
+    another plugin, or that are part of a dependency cycle are left out.
+
+    Returns:
+        The ordered plugins and the problems of the plugins left out.
+    """
+    by_name = {plugin.name: plugin for plugin in plugins}
+    errors: dict[str, list[str]] = {}
+    removed = True
+    while removed:
+        removed = False
+        for name, plugin in list(by_name.items()):
+            missing = [
+                dep for dep in plugin.spec.get("depends_on", []) if dep not in by_name
+            ]
+            if missing:
+                errors[name] = [f"depends on unavailable plugin {missing[0]}"]
+                del by_name[name]
+                removed = True
+
+    waiting = {
+        name: set(plugin.spec.get("depends_on", [])) for name, plugin in by_name.items()
+    }
+    ready = [name for name, dependencies in waiting.items() if not dependencies]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        name = heapq.heappop(ready)
+        ordered.append(by_name[name])
+        del waiting[name]
+        for other, dependencies in waiting.items():
+            if name in dependencies:
+                dependencies.discard(name)
+                if not dependencies:
+                    heapq.heappush(ready, other)
+    for name in sorted(waiting):
+        errors[name] = ["part of a dependency cycle"]
+    return ordered, errors
+
+
+class PluginRegistry:
+    """Index of the plugins under a directory, by lifecycle event.
+
+    Specs are read from ``<plugins_dir>/*/plugin.spec.json``.  The parsed
+    and validated specs are cached in ``index_path`` together with each
+    spec's mtime and size, so a later process only stats the spec files
+    and re-parses the ones that changed.  Entry point modules are not
+    imported until a plugin is executed.
+
+    Args:
+        plugins_dir: Directory with one subdirectory per plugin.
+        index_path: Cache file; defaults to ``.plugin_index.json`` inside
+            ``plugins_dir``.
+        use_index: Set to False to parse every spec and write no cache.
+    """
+
+    def __init__(
+        self,
+        plugins_dir: Path = PLUGINS_DIR,
+        index_path: Path | None = None,
+        use_index: bool = True,
+    ) -> None:
+        self.plugins_dir = Path(plugins_dir)
+        self.index_path = None
+        if use_index:
+            self.index_path = Path(index_path or self.plugins_dir / INDEX_FILENAME)
+        self.errors: dict[str, list[str]] = {}
+        self.parsed = 0
+        self._by_event: dict[str, list[Plugin]] = {}
+        self.refresh()
+
+    def _load_index(self) -> dict:
+        if self.index_path is None:
+            return {}
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("specs", {})
+
+    def _save_index(self, entries: dict) -> None:
+        if self.index_path is None:
+            return
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "specs": entries}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Failed to write plugin index {self.index_path}: {e}")
+
+    def refresh(self) -> None:
+        """Rescan the plugin directory, re-reading only changed specs."""
+        cached = self._load_index()
+        entries: dict = {}
+        self.errors = {}
+        self.parsed = 0
+        try:
+            plugin_dirs = sorted(
+                entry.path for entry in os.scandir(self.plugins_dir) if entry.is_dir()
+            )
+        except OSError:
+            plugin_dirs = []
+
+        for plugin_dir in plugin_dirs:
+            spec_path = os.path.join(plugin_dir, SPEC_FILENAME)
+            try:
+                stat = os.stat(spec_path)
+            except OSError:
+                continue
+            key = os.path.basename(plugin_dir)
+            entry = cached.get(key)
+            if entry is None or (entry["mtime_ns"], entry["size"]) != (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+                self.parsed += 1
+                try:
+                    with open(spec_path, encoding="utf-8") as f:
+                        entry["spec"] = json.load(f)
+                    entry["errors"] = validate_spec(entry["spec"])
+                except (OSError, ValueError) as e:
+                    entry["spec"], entry["errors"] = None, [f"unreadable spec: {e}"]
+            entries[key] = entry
+
+        self._by_event = {}
+        for key, entry in entries.items():
+            if entry["errors"]:
+                self.errors[key] = entry["errors"]
+                logger.warning(f"Skipping plugin {key}: {'; '.join(entry['errors'])}")
+            elif entry["spec"].get("enabled", True):
+                plugin = Plugin(entry["spec"], self.plugins_dir / key)
+                self._by_event.setdefault(plugin.event, []).append(plugin)
+        for event, plugins in self._by_event.items():
+            self._by_event[event], errors = order_plugins(plugins)
+            for name, problems in errors.items():
+                self.errors[name] = problems
+                logger.warning(f"Skipping plugin {name}: {'; '.join(problems)}")
+
+        if entries != cached:
+            self._save_index(entries)
+
+    def plugins_for_event(self, event: str) -> list[Plugin]:
+        """Return the enabled plugins for an event in dependency order."""
+        return list(self._by_event.get(event, []))
+
+    def events(self) -> list[str]:
+        """Return the lifecycle events that have plugins."""
+        return sorted(self._by_event)
+
+
+_registry: PluginRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> PluginRegistry:
+    """Return the shared registry over ``PLUGINS_DIR``, building it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PluginRegistry(PLUGINS_DIR)
+        return _registry
+
+
+_process_pool: ProcessPoolExecutor | None = None
+_process_plugins: dict[str, Plugin] = {}
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process pool shared by ``process`` mode plugins."""
+    global _process_pool
+    with _registry_lock:
+        if _process_pool is None:
+            # Spawned rather than forked: the runner has threads running
+            _process_pool = ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def _execute_in_process(spec: dict, plugin_dir: str, input_data: dict) -> dict:
+    """Run a plugin in a pool process, keeping its module loaded for later calls."""
+    plugin = _process_plugins.get(plugin_dir)
+    if plugin is None:
+        plugin = _process_plugins[plugin_dir] = Plugin(spec, Path(plugin_dir))
+    return plugin.execute(input_data)
+
+
+@atexit.register
+def shutdown_process_pool() -> None:
+    """Stop the shared process pool."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown()
+        _process_pool = None
@@ -1,3 +1,5 @@
+import hashlib
+
 from behave import given, when, then
 from deduplicator import detect_duplicate
 
@@ -6,7 +8,7 @@ from deduplicator import detect_duplicate
 def step_new_file(context, filename: str, content: str):
     context.file = {
         "file_path": filename,
-        "file_hash": hash(content),
+        "file_hash": hashlib.sha256(content.encode("utf-8")).hexdigest(),
         "trace_id": "bdd-test-001"
     }
 
@@ -15,59 +15,647 @@ from typing import Dict, Any
 _hash_database = {}
 
 # BEGIN AUTO SECTION - You can edit below this line
+import argparse
+import hashlib
+import os
+import re
+import signal
+import socket
+import socketserver
+import stat
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Iterable, List, Optional, Tuple
+
+from hash_index import ShardedHashIndex
+
+# Batch mode
+BATCH_SIZE = 1000  # JSON Lines records processed per batch in --jsonl mode
+
+# Server-side hashing, used when the input has no file_hash
+HASH_ALGORITHM = "sha256"
+HASH_CHUNK_SIZE = 1024 * 1024  # Read size when hashlib.file_digest is unavailable
+HASH_WORKERS = min(8, os.cpu_count() or 1)  # Threads hashing the files of a batch
+DIGEST_CACHE_SIZE = 100000  # Digests remembered by (device, inode, size, mtime)
+
+# Near-duplicate detection
+NEAR_DUPLICATE_THRESHOLD = 0.9  # Lowest similarity the fingerprint index can answer for
+FINGERPRINT_CHUNK_CHARS = 1024 * 1024  # Characters of a file read per fingerprinting step
+FINGERPRINT_BLOCK_WORDS = 65536  # Words whose shingles are hashed and counted together
+SHINGLE_WORDS = 3  # Words per shingle
+FINGERPRINT_BITS = 64
+
+# A shingle hashes to the XOR of its words' crc32s times one odd 32-bit
+# multiplier per position, which stays within 64 bits
+_SHINGLE_MULTIPLIERS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F, 0x165667B1)[:SHINGLE_WORDS]
+# _BIT_TABLES[bit] maps each byte to 1 if the bit is set in it, else 0, so that
+# bytes.translate() and bytes.count() count a bit across many bytes at C speed
+_BIT_TABLES = [bytes((byte >> bit) & 1 for byte in range(256)) for bit in range(8)]
+_WORD_PATTERN = re.compile(r"\w+")
+_LEADING_WORD_PATTERN = re.compile(r"\w*")
+
+
+def _shingle_bit_counts(words: List[str], counts: List[int]) -> int:
+    """
+    Add the set bits of the shingles of a run of words to counts.
+    
+    counts[i] is the number of shingles seen so far with bit i set. A run
+    shorter than a shingle is one shingle. Returns the number of shingles.
+    """
+    hashes = list(map(zlib.crc32, map(str.encode, words)))
+    
+    # One hash per shingle
+    multiplier = _SHINGLE_MULTIPLIERS[0]
+    shingles = [value * multiplier for value in hashes[:max(len(hashes) - SHINGLE_WORDS + 1, 1)]]
+    for position in range(1, min(SHINGLE_WORDS, len(hashes))):
+        multiplier = _SHINGLE_MULTIPLIERS[position]
+        shingles = [value ^ word * multiplier for value, word in zip(shingles, hashes[position:])]
+    
+    # Count each bit over all shingles, one byte column of the packed hashes at a time
+    packed = array("Q", shingles)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    data = packed.tobytes()
+    for byte_index in range(FINGERPRINT_BITS // 8):
+        column = data[byte_index::8]
+        for bit, table in enumerate(_BIT_TABLES):
+            counts[8 * byte_index + bit] += column.translate(table).count(1)
+    return len(shingles)
+
+
+def _fingerprint_chunks(chunks: Iterable[str]) -> int:
+    """
+    Compute the SimHash of a text given as consecutive chunks.
+    
+    Words are shingled FINGERPRINT_BLOCK_WORDS at a time; each block
+    carries the last SHINGLE_WORDS - 1 words of the previous one, so every
+    shingle of the text is counted exactly once whatever the chunking.
+    """
+    counts = [0] * FINGERPRINT_BITS
+    total = 0
+    block: List[str] = []
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk.lower()
+        # A word cut at the end of the chunk is finished by the next one;
+        # matching it at the start of the reversed text stops at its first letter
+        match = _LEADING_WORD_PATTERN.match(text[::-1])
+        carry = match.group()[::-1] if match else ""
+        block.extend(_WORD_PATTERN.findall(text, 0, len(text) - len(carry)))
+        while len(block) >= FINGERPRINT_BLOCK_WORDS:
+            total += _shingle_bit_counts(block[:FINGERPRINT_BLOCK_WORDS], counts)
+            block = block[FINGERPRINT_BLOCK_WORDS - SHINGLE_WORDS + 1:]
+    if carry:
+        block.append(carry)
+    if len(block) >= SHINGLE_WORDS or not total:
+        total += _shingle_bit_counts(block, counts)
+    
+    fingerprint = 0
+    for bit, count in enumerate(counts):
+        if count * 2 > total:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def compute_fingerprint(content: str) -> int:
+    """
+    Compute a 64-bit SimHash of the word shingles of a text.
+    
+    Similar texts get fingerprints that differ in few bits; whitespace
+    and punctuation changes do not change the fingerprint at all. Every
+    shingle of the text counts, so texts that only share a header are
+    not near-duplicates; the cost grows linearly with the text.
+    """
+    return _fingerprint_chunks(
+        content[start:start + FINGERPRINT_CHUNK_CHARS]
+        for start in range(0, max(len(content), 1), FINGERPRINT_CHUNK_CHARS)
+    )
+
+
+def compute_file_fingerprint(file_path: str) -> int:
+    """Compute the fingerprint of a text file, reading it in chunks."""
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        return _fingerprint_chunks(iter(lambda: f.read(FINGERPRINT_CHUNK_CHARS), ""))
+
+
+if hasattr(int, "bit_count"):  # Python 3.10+
+    def _popcount(value: int) -> int:
+        return value.bit_count()
+else:
+    def _popcount(value: int) -> int:
+        return bin(value).count("1")
+
+
+def fingerprint_similarity(fingerprint1: int, fingerprint2: int) -> float:
+    """Return the share of fingerprint bits two fingerprints agree on."""
+    return 1.0 - _popcount(fingerprint1 ^ fingerprint2) / FINGERPRINT_BITS
+
+
+class FingerprintIndex:
+    """
+    Finds the closest stored fingerprint within a Hamming distance.
+    
+    Fingerprints are split into max_distance + 1 bands. Two fingerprints
+    that differ in at most max_distance bits agree on at least one whole
+    band, so a lookup only checks the fingerprints sharing a band value
+    with the query instead of the whole index.
+    """
+    
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.max_distance = int((1.0 - threshold) * FINGERPRINT_BITS)
+        num_bands = self.max_distance + 1
+        edges = [FINGERPRINT_BITS * band // num_bands for band in range(num_bands + 1)]
+        self._bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._paths: Dict[int, str] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._paths)
+    
+    def add(self, fingerprint: int, file_path: str) -> None:
+        """Store a fingerprint; the first file registered with it is kept."""
+        with self._lock:
+            if fingerprint in self._paths:
+                return
+            self._paths[fingerprint] = file_path
+            for (start, mask), buckets in zip(self._bands, self._buckets):
+                buckets.setdefault((fingerprint >> start) & mask, []).append(fingerprint)
+    
+    def nearest(self, fingerprint: int) -> Optional[Tuple[str, float]]:
+        """
+        Find the closest stored fingerprint.
+        
+        Returns:
+            (file_path, similarity) of the closest fingerprint within
+            max_distance bits, or None
+        """
+        best = None
+        best_distance = self.max_distance + 1
+        for (start, mask), buckets in zip(self._bands, self._buckets):
+            for candidate in buckets.get((fingerprint >> start) & mask, ()):
+                distance = _popcount(fingerprint ^ candidate)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        if best is None:
+            return None
+        return self._paths[best], 1.0 - best_distance / FINGERPRINT_BITS
+
+
+# Thread-safe, compact replacement for the generated _hash_database dict
+_hash_index: ShardedHashIndex = ShardedHashIndex()
+_fingerprint_index = FingerprintIndex()
+_digest_cache: "OrderedDict[Tuple[int, int, int, int], str]" = OrderedDict()
+_digest_cache_lock = threading.Lock()
+
+
+def _digest_file(f) -> str:
+    """Hash an open binary file in large chunks"""
+    if hasattr(hashlib, "file_digest"):  # Python 3.11+
+        return hashlib.file_digest(f, HASH_ALGORITHM).hexdigest()
+    digest = hashlib.new(HASH_ALGORITHM)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    while True:
+        size = f.readinto(buffer)
+        if not size:
+            return digest.hexdigest()
+        digest.update(view[:size])
+
+
+def compute_file_hash(file_path: str) -> str:
+    """
+    Compute the canonical digest of a file (hex SHA-256).
+    
+    Digests are cached by (device, inode, size, mtime), so a file that has
+    not changed is never read again.
+    
+    Raises:
+        OSError: The file cannot be read
+    """
+    stat = os.stat(file_path)
+    key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _digest_cache_lock:
+        digest = _digest_cache.get(key)
+        if digest is not None:
+            _digest_cache.move_to_end(key)
+            return digest
+    
+    with open(file_path, "rb", buffering=0) as f:
+        digest = _digest_file(f)
+        after = os.fstat(f.fileno())
+    if (after.st_size, after.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+        # Only cache digests of files that did not change while being read
+        with _digest_cache_lock:
+            _digest_cache[key] = digest
+            if len(_digest_cache) > DIGEST_CACHE_SIZE:
+                _digest_cache.popitem(last=False)
+    return digest
+
+
+def hash_files(file_paths: Iterable[str]) -> Dict[str, Any]:
+    """
+    Hash many files at once in a thread pool.
+    
+    Returns:
+        Dictionary mapping each path to its digest, or to the OSError
+        raised while reading it
+    """
+    def hash_one(file_path: str) -> Any:
+        try:
+            return compute_file_hash(file_path)
+        except OSError as e:
+            return e
+    
+    unique_paths = list(dict.fromkeys(file_paths))
+    if len(unique_paths) <= 1:
+        return {file_path: hash_one(file_path) for file_path in unique_paths}
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        return dict(zip(unique_paths, executor.map(hash_one, unique_paths)))
+
+
+def _content_fingerprint(input_data: Dict[str, Any]) -> Optional[int]:
+    """Fingerprint file_content from the input, or the file at file_path."""
+    if "file_content" in input_data:
+        return compute_fingerprint(input_data["file_content"])
+    try:
+        return compute_file_fingerprint(input_data["file_path"])
+    except OSError:
+        return None
+
+
+def _validate_input(input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the error result for an input that cannot be processed, or None"""
+    # Validate required fields
+    required_fields = ["file_path", "trace_id"]
+    for field in required_fields:
+        if field not in input_data:
+            return {
+                "status": "error",
+                "error_message": f"Missing required field: {field}",
+                "trace_id": input_data.get("trace_id", "unknown")
+            }
+    
+    if not isinstance(input_data["file_path"], str):
+        return {
+            "status": "error",
+            "error_message": f"file_path must be a string, got {type(input_data['file_path']).__name__}",
+            "trace_id": input_data["trace_id"]
+        }
+    
+    threshold = float(input_data.get("similarity_threshold", NEAR_DUPLICATE_THRESHOLD))
+    if input_data.get("near_duplicate") and not NEAR_DUPLICATE_THRESHOLD <= threshold <= 1.0:
+        # The fingerprint index cannot answer for lower thresholds
+        return {
+            "status": "error",
+            "error_message": f"similarity_threshold must be between {NEAR_DUPLICATE_THRESHOLD} and 1.0, "
+                             f"got {threshold}",
+            "trace_id": input_data["trace_id"]
+        }
+    return None
+
+
+def _error_result(input_data: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "error_message": str(error),
+        "trace_id": input_data.get("trace_id", "unknown")
+    }
+
+
+def _build_result(input_data: Dict[str, Any], file_hash: Any, duplicate_of: Optional[str]) -> Dict[str, Any]:
+    """Result for a registered input; runs the near-duplicate lookup for new files"""
+    file_path = input_data["file_path"]
+    trace_id = input_data["trace_id"]
+    if duplicate_of is not None:
+        return {
+            "status": "success",
+            "is_duplicate": True,
+            "duplicate_of": duplicate_of,
+            "recommended_action": "quarantine",
+            "file_hash": file_hash,
+            "trace_id": trace_id
+        }
+    
+    result = {
+        "status": "success",
+        "is_duplicate": False,
+        "duplicate_of": "",
+        "recommended_action": "proceed",
+        "file_hash": file_hash,
+        "trace_id": trace_id
+    }
+    
+    if input_data.get("near_duplicate"):
+        threshold = float(input_data.get("similarity_threshold", NEAR_DUPLICATE_THRESHOLD))
+        result["near_duplicate_of"] = ""
+        result["similarity"] = 0.0
+        fingerprint = _content_fingerprint(input_data)
+        if fingerprint is not None:
+            nearest = _fingerprint_index.nearest(fingerprint)
+            if nearest is not None and nearest[1] >= threshold:
+                result["near_duplicate_of"], result["similarity"] = nearest
+                result["recommended_action"] = "review"
+            _fingerprint_index.add(fingerprint, file_path)
+    
+    return result
+
 
 def detect_duplicate(input_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Detect if a file is a duplicate based on hash.
     
+    Without file_hash, the plugin hashes the file at file_path itself
+    (see compute_file_hash); the digest is returned as file_hash.
+    
+    With near_duplicate set, files that are not exact duplicates are also
+    fingerprinted and looked up in the fingerprint index; the closest file
+    at or above similarity_threshold is returned as near_duplicate_of.
+    
     Args:
-        input_data: Dictionary with file_path, file_hash, trace_id
+        input_data: Dictionary with file_path, trace_id, and optionally
+            file_hash, near_duplicate, similarity_threshold, file_content
         
     Returns:
         Dictionary with status, is_duplicate, and other fields
     """
     try:
-        # Validate required fields
-        required_fields = ["file_path", "file_hash", "trace_id"]
-        for field in required_fields:
-            if field not in input_data:
-                return {
-                    "status": "error",
-                    "error_message": f"Missing required field: {field}",
-                    "trace_id": input_data.get("trace_id", "unknown")
-                }
+        error = _validate_input(input_data)
+        if error is not None:
+            return error
         
-        file_path = input_data["file_path"]
-        file_hash = input_data["file_hash"]
-        trace_id = input_data["trace_id"]
+        file_hash = input_data.get("file_hash")
+        if file_hash is None:
+            file_hash = compute_file_hash(input_data["file_path"])
         
-        # Check if hash exists in database
-        if file_hash in _hash_database:
-            return {
-                "status": "success",
-                "is_duplicate": True,
-                "duplicate_of": _hash_database[file_hash],
-                "recommended_action": "quarantine",
-                "trace_id": trace_id
-            }
-        
-        # Not a duplicate - add to database
-        _hash_database[file_hash] = file_path
+        # Check if hash exists in database, and add it if not
+        duplicate_of = _hash_index.check_and_register(str(file_hash), input_data["file_path"])
+        return _build_result(input_data, file_hash, duplicate_of)
         
-        return {
-            "status": "success",
-            "is_duplicate": False,
-            "duplicate_of": "",
-            "recommended_action": "proceed",
-            "trace_id": trace_id
-        }
+    except Exception as e:
+        return _error_result(input_data, e)
+
+
+def detect_duplicates_batch(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Detect duplicates for many files in one call.
+    
+    Items are processed in order, so a file can be a duplicate of an
+    earlier item of the same batch. A bad item gets an error result and
+    does not stop the batch. Files without file_hash are hashed up front
+    in a thread pool, and the hashes of the whole batch are looked up and
+    registered in one pass over the hash index.
+    
+    Args:
+        items: Inputs as accepted by detect_duplicate
         
+    Returns:
+        One detect_duplicate result per item, in the same order
+    """
+    digests = hash_files(item["file_path"] for item in items
+                         if isinstance(item, dict) and isinstance(item.get("file_path"), str)
+                         and item.get("file_hash") is None)
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    registrations = []  # (position, item, file_hash) of the items that passed validation
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[position] = {
+                "status": "error",
+                "error_message": f"Expected a JSON object, got {type(item).__name__}",
+                "trace_id": "unknown"
+            }
+            continue
+        try:
+            results[position] = _validate_input(item)
+            if results[position] is not None:
+                continue
+            file_hash = item.get("file_hash")
+            if file_hash is None:
+                file_hash = digests[item["file_path"]]
+                if isinstance(file_hash, Exception):
+                    raise file_hash
+            registrations.append((position, item, file_hash))
+        except Exception as e:
+            results[position] = _error_result(item, e)
+    
+    registered = _hash_index.check_and_register_many(
+        [(str(file_hash), item["file_path"]) for _, item, file_hash in registrations])
+    for (position, item, file_hash), duplicate_of in zip(registrations, registered):
+        try:
+            results[position] = _build_result(item, file_hash, duplicate_of)
+        except Exception as e:
+            results[position] = _error_result(item, e)
+    # Every position has been filled by one of the branches above
+    return [result for result in results if result is not None]
+
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _invalid_json_result(error: ValueError) -> Dict[str, Any]:
+    return {"status": "error", "error_message": f"Invalid JSON: {error}", "trace_id": "unknown"}
+
+
+def _request_error_result(request: Any, error: Exception) -> Dict[str, Any]:
+    """Result for a request that failed outside detect_duplicate's own error handling"""
+    trace_id = request.get("trace_id", "unknown") if isinstance(request, dict) else "unknown"
+    return {"status": "error", "error_message": f"{type(error).__name__}: {error}", "trace_id": trace_id}
+
+
+def _detect_each(items: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Run detect_duplicates_batch, falling back to one item at a time if the
+    batch fails, so that a bad item only fails its own result.
+    """
+    try:
+        return detect_duplicates_batch(items)
+    except Exception:
+        results = []
+        for item in items:
+            try:
+                results.append(detect_duplicates_batch([item])[0])
+            except Exception as e:
+                results.append(_request_error_result(item, e))
+        return results
+
+
+def run_jsonl(input_stream: IO[str], output_stream: IO[str], batch_size: int = BATCH_SIZE) -> int:
+    """
+    Process JSON Lines input: one input object per line, one result per line.
+    
+    Lines are handled in batches of batch_size, and each batch's results
+    are written and flushed together. Lines that are not valid JSON get
+    an error result; blank lines are skipped.
+    
+    Returns:
+        The number of records processed
+    """
+    count = 0
+    batch: List[Any] = []
+    
+    def flush_batch():
+        results = []
+        parsed = [item for item in batch if not isinstance(item, ValueError)]
+        detected = iter(_detect_each(parsed))
+        for item in batch:
+            if isinstance(item, ValueError):
+                results.append(_invalid_json_result(item))
+            else:
+                results.append(next(detected))
+        output_stream.write("".join(_encode(result) + "\n" for result in results))
+        output_stream.flush()
+        batch.clear()
+    
+    for line in input_stream:
+        if not line.strip():
+            continue
+        try:
+            batch.append(json.loads(line))
+        except ValueError as e:
+            batch.append(e)
+        count += 1
+        if len(batch) >= batch_size:
+            flush_batch()
+    if batch:
+        flush_batch()
+    return count
+
+
+def handle_request(line: str) -> Dict[str, Any]:
+    """
+    Answer one worker request line.
+    
+    A request is a detect_duplicate input, or {"command": "ping"}, which
+    reports the worker's pid and the number of hashes it holds. Never
+    raises: a request that fails gets an error result, so one bad request
+    cannot take down the worker and the hashes it holds.
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return _invalid_json_result(e)
+    try:
+        if isinstance(request, dict) and request.get("command") == "ping":
+            return {"status": "success", "command": "ping", "pid": os.getpid(), "hashes": len(_hash_index),
+                    "trace_id": request.get("trace_id", "unknown")}
+        return detect_duplicates_batch([request])[0]
     except Exception as e:
-        return {
-            "status": "error",
-            "error_message": str(e),
-            "trace_id": input_data.get("trace_id", "unknown")
-        }
+        return _request_error_result(request, e)
+
+
+def serve(input_stream: IO[str], output_stream: IO[str]) -> int:
+    """
+    Run as a long-lived worker: answer one request line at a time.
+    
+    Each response is written and flushed before the next request is read,
+    so a client can send a request and wait for its response. The hash
+    database stays in memory between requests; the worker exits at the
+    end of input.
+    
+    Returns:
+        The number of requests answered
+    """
+    count = 0
+    for line in iter(input_stream.readline, ""):
+        if not line.strip():
+            continue
+        output_stream.write(_encode(handle_request(line)) + "\n")
+        output_stream.flush()
+        count += 1
+    return count
+
+
+class _WorkerRequestHandler(socketserver.StreamRequestHandler):
+    """Serves the worker protocol on one socket connection"""
+    
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write((_encode(handle_request(line.decode("utf-8"))) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove a socket left behind by a worker that is gone.
+    
+    Raises:
+        FileExistsError: If the path is not a socket, or a running worker
+            still accepts connections on it
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+            return
+    raise FileExistsError(f"Another worker is already serving {socket_path}")
+
+
+def serve_socket(socket_path: str) -> None:
+    """
+    Run as a long-lived worker on a Unix socket, one thread per connection.
+    
+    Connections share the hash database and speak the same newline
+    delimited protocol as serve(). Runs until interrupted or terminated.
+    A socket left by a worker that died is replaced; one that a running
+    worker still answers on is not.
+    
+    Raises:
+        FileExistsError: If socket_path is in use or is not a socket
+    """
+    _remove_stale_socket(socket_path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with socketserver.ThreadingUnixStreamServer(socket_path, _WorkerRequestHandler) as server:
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parse the command line modes; without one, a single JSON object is read from stdin"""
+    parser = argparse.ArgumentParser(description="Deduplicator plugin")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--jsonl", action="store_true",
+                      help="Read JSON Lines inputs from stdin and write one result line each")
+    mode.add_argument("--serve", action="store_true",
+                      help="Run as a long-lived worker answering one request line at a time")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="With --serve, listen on this Unix socket instead of stdin/stdout")
+    args = parser.parse_args(argv)
+    if args.socket and not args.serve:
+        parser.error("--socket requires --serve")
+    return args
+
+
+# JSON Lines mode:  python deduplicator.py --jsonl < inputs.jsonl > results.jsonl
+# Worker mode:      python deduplicator.py --serve [--socket PATH]
+if __name__ == "__main__" and sys.argv[1:]:
+    _args = parse_args(sys.argv[1:])
+    if _args.serve and _args.socket:
+        try:
+            serve_socket(_args.socket)
+        except FileExistsError as e:
+            sys.exit(f"Cannot serve on socket: {e}")
+    elif _args.serve:
+        serve(sys.stdin, sys.stdout)
+    elif _args.jsonl:
+        run_jsonl(sys.stdin, sys.stdout)
+    sys.exit(0)
 
 # END AUTO SECTION - You can edit above this line
 
@@ -2,40 +2,623 @@
 
 # BEGIN AUTO SECTION
 
+import abc
+import atexit
+import hashlib
+import json
+import math
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Any, Set
+from typing import Dict, Any, Iterator, Optional, TextIO
 import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+class BloomFilter:
+    """
+    Bloom filter over hash strings.
+    
+    Sized for capacity items at error_rate false positives. A negative
+    answer is always right; a positive one is wrong with about the rate
+    reported by false_positive_rate() for the current fill.
+    
+    generation records the HashStore.generation() the filter was built
+    from, so that a saved filter is only reused for the same store state.
+    """
+    
+    MAGIC = b"BLM2"
+    HEADER = struct.Struct("<4sIQQQH")  # magic, hashes, bits, count, capacity, generation length
+    
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.01):
+        self.capacity = max(capacity, 1)
+        self.num_bits = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.num_hashes = max(round(self.num_bits / self.capacity * math.log(2)), 1)
+        self.count = 0
+        self.generation: Optional[str] = None
+        self._bits = bytearray((self.num_bits + 7) // 8)
+    
+    def _positions(self, key: str) -> Iterator[int]:
+        """Bit positions of a key, by double hashing one 128-bit digest"""
+        digest = hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+    
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+    
+    def false_positive_rate(self) -> float:
+        """Expected false positive rate at the current number of items"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "count": self.count,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "size_bytes": len(self._bits),
+            "false_positive_rate": self.false_positive_rate(),
+        }
+    
+    def save(self, path: Path) -> None:
+        """Write the filter to a file, atomically"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        generation = (self.generation or "").encode("utf-8")
+        with open(tmp_path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.num_hashes, self.num_bits, self.count, self.capacity,
+                                     len(generation)))
+            f.write(generation)
+            f.write(self._bits)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: Path) -> Optional["BloomFilter"]:
+        """Read a filter written by save(), or return None if it is missing or damaged"""
+        try:
+            with open(path, "rb") as f:
+                magic, num_hashes, num_bits, count, capacity, generation_length = cls.HEADER.unpack(
+                    f.read(cls.HEADER.size))
+                generation = f.read(generation_length).decode("utf-8")
+                bits = bytearray(f.read())
+        except (OSError, struct.error, UnicodeDecodeError):
+            return None
+        if magic != cls.MAGIC or len(bits) != (num_bits + 7) // 8:
+            return None
+        bloom = cls.__new__(cls)
+        bloom.capacity, bloom.num_bits, bloom.num_hashes, bloom.count = capacity, num_bits, num_hashes, count
+        bloom.generation = generation or None
+        bloom._bits = bits
+        return bloom
+
+
+class HashStore(abc.ABC):
+    """
+    Base class for hash -> path storage backends.
+    
+    register() is the only write operation: it checks and registers a hash
+    in one atomic step, so two callers registering the same hash at the
+    same time never both see it as new. A backend must implement the
+    abstract methods; one that does not cannot be instantiated.
+    """
+    
+    # Whether other processes write to the store too; a per-process filter
+    # in front of a shared store would miss their hashes
+    shared = False
+    
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of registered hashes"""
+    
+    @abc.abstractmethod
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the registered hashes"""
+    
+    @abc.abstractmethod
+    def get(self, file_hash: str) -> Optional[str]:
+        """Return the path registered for a hash, or None"""
+    
+    @abc.abstractmethod
+    def register(self, file_hash: str, file_path: str) -> Optional[str]:
+        """
+        Register a hash unless it is already known.
+        
+        Returns:
+            The path registered earlier for the hash, or None if file_path
+            has now been registered
+        """
+    
+    def insert(self, file_hash: str, file_path: str) -> None:
+        """Register a hash the caller knows to be new"""
+        self.register(file_hash, file_path)
+    
+    def generation(self) -> Optional[str]:
+        """
+        Return a token that changes whenever the persisted hashes change.
+        
+        A saved Bloom filter is only reused while the store reports the same
+        token it was saved with. None, the default, means the store cannot
+        tell, and the filter is always rebuilt.
+        """
+        return None
+    
+    def close(self) -> None:
+        """Persist pending registrations and release resources"""
+
+
+class InMemoryHashStore(HashStore):
+    """Hash store kept in a dict; nothing survives the process"""
+    
+    def __init__(self):
+        self._hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._hashes)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._hashes))
+    
+    def get(self, file_hash: str) -> Optional[str]:
+        return self._hashes.get(file_hash)
+    
+    def register(self, file_hash: str, file_path: str) -> Optional[str]:
+        with self._lock:
+            existing = self._hashes.get(file_hash)
+            if existing is None:
+                self._hashes[file_hash] = file_path
+            return existing
+    
+    def insert(self, file_hash: str, file_path: str) -> None:
+        with self._lock:
+            self._hashes[file_hash] = file_path
+
+
+class LogStructuredHashStore(HashStore):
+    """
+    Append-only hash -> path store: a snapshot plus a write-ahead log.
+    
+    Both files hold one JSON [hash, path] record per line, so they are
+    read one record at a time. Each new hash is appended to the log, so
+    registering a file costs O(1) I/O regardless of how many hashes are
+    stored. Appends are fsynced in batches: after sync_every records, or
+    at most sync_interval seconds after the first unsynced one, which a
+    timer enforces even when no further hashes arrive.
+    
+    When the log grows larger than the snapshot it is compacted in a
+    background thread: the log is set aside and a fresh one started, then
+    the old snapshot and the set-aside log are copied into a new snapshot
+    while registrations continue. Startup is a snapshot load plus a short
+    log replay.
+    
+    A snapshot that cannot be read is moved aside to <snapshot>.corrupt
+    rather than overwritten, so its hashes can still be recovered.
+    Snapshots in the older single JSON object format are still read.
+    
+    The store is owned by one process; use SQLiteHashStore to share hashes
+    between processes.
+    """
+    
+    def __init__(self, snapshot_path: str, sync_every: int = 100, sync_interval: float = 1.0,
+                 compact_min_records: int = 10000):
+        self.snapshot_path = Path(snapshot_path)
+        self.log_path = self.snapshot_path.with_name(self.snapshot_path.name + ".log")
+        self._compacting_path = self.snapshot_path.with_name(self.snapshot_path.name + ".log.compacting")
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_min_records = compact_min_records
+        self._hashes: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        self._log: Optional[TextIO] = None
+        self._sync_timer: Optional[threading.Timer] = None
+        self._log_records = 0
+        self._compacting_records = 0  # Log records set aside for a compaction that has not finished
+        self._snapshot_records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._load()
+    
+    def __len__(self) -> int:
+        return len(self._hashes)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._hashes))
+    
+    def __contains__(self, file_hash: str) -> bool:
+        return file_hash in self._hashes
+    
+    def get(self, file_hash: str) -> Optional[str]:
+        """Return the path registered for a hash, or None"""
+        return self._hashes.get(file_hash)
+    
+    def register(self, file_hash: str, file_path: str) -> Optional[str]:
+        with self._lock:
+            existing = self._hashes.get(file_hash)
+            if existing is None:
+                self.add(file_hash, file_path)
+            return existing
+    
+    def insert(self, file_hash: str, file_path: str) -> None:
+        self.add(file_hash, file_path)
+    
+    def add(self, file_hash: str, file_path: str) -> None:
+        """Register a hash; the first path registered for a hash is kept"""
+        with self._lock:
+            if file_hash in self._hashes:
+                return
+            self._hashes[file_hash] = file_path
+            if self._log is None:
+                self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+                self._log = open(self.log_path, "a", encoding="utf-8")
+            self._log.write(json.dumps([file_hash, file_path]) + "\n")
+            self._log.flush()
+            self._log_records += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self.sync()
+            elif self._sync_timer is None:
+                self._sync_timer = threading.Timer(self.sync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+            if (self._log_records >= max(self.compact_min_records, self._snapshot_records)
+                    and (self._compactor is None or not self._compactor.is_alive())):
+                self._compactor = threading.Thread(target=self._compact_in_background,
+                                                   name="hash-store-compactor", daemon=True)
+                self._compactor.start()
+    
+    def sync(self) -> None:
+        """Flush pending log records to disk"""
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            if self._log is not None and self._unsynced:
+                os.fsync(self._log.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+    
+    def compact(self) -> None:
+        """
+        Fold the log into a new snapshot.
+        
+        Only setting the log aside holds the store lock; the new snapshot is
+        written while other threads keep registering hashes into a new log.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self._log is not None:
+                    self.sync()
+                    self._log.close()
+                    self._log = None
+                if self.log_path.exists():
+                    if self._compacting_path.exists():
+                        # Left over from a compaction that failed; keep its records
+                        with open(self._compacting_path, "ab") as dst, open(self.log_path, "rb") as src:
+                            shutil.copyfileobj(src, dst)
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                        os.unlink(self.log_path)
+                    else:
+                        os.replace(self.log_path, self._compacting_path)
+                    self._compacting_records += self._log_records
+                    self._log_records = 0
+                if not self._compacting_path.exists():
+                    return
+            
+            # The log only holds hashes missing from the snapshot, so the new
+            # snapshot is the old one followed by the log
+            tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                if not self._snapshot_is_lines():
+                    for record in self._read_legacy_snapshot():
+                        f.write(json.dumps(record) + "\n")
+                elif self.snapshot_path.exists():
+                    with open(self.snapshot_path, "r", encoding="utf-8") as snapshot:
+                        shutil.copyfileobj(snapshot, f)
+                with open(self._compacting_path, "r", encoding="utf-8") as log:
+                    shutil.copyfileobj(log, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            os.unlink(self._compacting_path)
+            with self._lock:
+                self._snapshot_records += self._compacting_records
+                self._compacting_records = 0
+    
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except Exception as e:
+            # The set-aside log is kept and folded in by the next compaction
+            logger.error(f"Failed to compact hash log: {e}")
+    
+    def generation(self) -> Optional[str]:
+        """Size and modification time of the snapshot and the logs, which every write changes"""
+        parts = []
+        with self._lock:
+            for path in (self.snapshot_path, self._compacting_path, self.log_path):
+                try:
+                    info = path.stat()
+                except FileNotFoundError:
+                    parts.append("-")
+                else:
+                    parts.append(f"{info.st_size}:{info.st_mtime_ns}")
+        return "/".join(parts)
+    
+    def close(self) -> None:
+        """Wait for a running compaction, then sync and close the log"""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            if self._log is not None:
+                self.sync()
+                self._log.close()
+                self._log = None
+    
+    def _snapshot_is_lines(self) -> bool:
+        """Whether the snapshot is in the line format (or missing), rather than one JSON object"""
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                return f.read(1) != b"{"
+        except FileNotFoundError:
+            return True
+    
+    def _read_legacy_snapshot(self) -> Iterator[list]:
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            for file_hash, file_path in json.load(f).items():
+                yield [file_hash, file_path]
+    
+    def _read_snapshot(self) -> Iterator[list]:
+        """Yield the snapshot's records; ValueError if it is damaged"""
+        if not self._snapshot_is_lines():
+            yield from self._read_legacy_snapshot()
+            return
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                record = json.loads(line)
+                if not (isinstance(record, list) and len(record) == 2):
+                    raise ValueError(f"line {number} is not a [hash, path] record")
+                yield record
+    
+    def _replay_log(self, log_path: Path) -> int:
+        """Apply a log's records; a torn tail is truncated away. Returns the records applied"""
+        records = 0
+        valid_bytes = 0
+        with open(log_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    file_hash, file_path = json.loads(line)
+                except ValueError:
+                    # A torn write from a crash; drop it and everything after it
+                    logger.warning(f"Ignoring damaged hash log tail at byte {valid_bytes}")
+                    break
+                self._hashes.setdefault(file_hash, file_path)
+                records += 1
+                valid_bytes += len(line)
+        if valid_bytes != log_path.stat().st_size:
+            os.truncate(log_path, valid_bytes)
+        return records
+    
+    def _load(self):
+        """Load the snapshot and replay the log on top of it"""
+        if self.snapshot_path.exists():
+            try:
+                for file_hash, file_path in self._read_snapshot():
+                    self._hashes.setdefault(file_hash, file_path)
+            except (ValueError, UnicodeDecodeError) as e:
+                corrupt_path = self.snapshot_path.with_name(self.snapshot_path.name + ".corrupt")
+                logger.error(f"Hash snapshot {self.snapshot_path} is damaged ({e}); "
+                             f"moved to {corrupt_path} and not loaded")
+                os.replace(self.snapshot_path, corrupt_path)
+                self._hashes = {}
+            self._snapshot_records = len(self._hashes)
+        
+        interrupted = self._compacting_path.exists()
+        if interrupted:
+            # A compaction stopped before it finished; its log may or may not be
+            # in the snapshot already
+            self._replay_log(self._compacting_path)
+        if self.log_path.exists():
+            self._log_records = self._replay_log(self.log_path)
+        if interrupted:
+            self._rewrite_snapshot()
+    
+    def _rewrite_snapshot(self) -> None:
+        """Write a snapshot of every loaded hash and start an empty log"""
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self._hashes.items():
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # A crash before these removals only replays records the snapshot already holds
+        for path in (self._compacting_path, self.log_path):
+            if path.exists():
+                os.unlink(path)
+        self._snapshot_records = len(self._hashes)
+        self._log_records = 0
+
+
+class SQLiteHashStore(HashStore):
+    """
+    Hash store in an SQLite database, shared by concurrent processes.
+    
+    The database runs in WAL mode, so readers never block. Registrations
+    are batched: the first one opens a write transaction (BEGIN IMMEDIATE,
+    which takes the database write lock), and it is committed after
+    commit_every registrations or commit_interval seconds. Because every
+    registration runs inside a write transaction, a process always sees
+    the hashes other processes committed before it got the lock, and no
+    registration is lost. Other processes wait at most commit_interval for
+    the lock (up to busy_timeout).
+    """
+    
+    shared = True
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS hashes (
+            file_hash TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL
+        ) WITHOUT ROWID
+    """
+    
+    def __init__(self, db_path: str, commit_every: int = 500, commit_interval: float = 0.05,
+                 busy_timeout: float = 30.0):
+        self.db_path = Path(db_path)
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are managed explicitly; the connection is shared with the commit timer
+        self.connection = sqlite3.connect(str(self.db_path), timeout=busy_timeout,
+                                          isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(self.SCHEMA)
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._timer: Optional[threading.Timer] = None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+    
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter([row[0] for row in self.connection.execute("SELECT file_hash FROM hashes")])
+    
+    def get(self, file_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT file_path FROM hashes WHERE file_hash = ?", (file_hash,)).fetchone()
+        return row[0] if row else None
+    
+    def register(self, file_hash: str, file_path: str) -> Optional[str]:
+        with self._lock:
+            if not self.connection.in_transaction:
+                self.connection.execute("BEGIN IMMEDIATE")
+                self._timer = threading.Timer(self.commit_interval, self.commit)
+                self._timer.daemon = True
+                self._timer.start()
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO hashes (file_hash, file_path) VALUES (?, ?)", (file_hash, file_path))
+            if cursor.rowcount:
+                self._pending += 1
+                if self._pending >= self.commit_every:
+                    self.commit()
+                return None
+            return self.connection.execute(
+                "SELECT file_path FROM hashes WHERE file_hash = ?", (file_hash,)).fetchone()[0]
+    
+    def commit(self) -> None:
+        """Commit the open batch of registrations"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.connection.in_transaction:
+                self.connection.execute("COMMIT")
+            self._pending = 0
+    
+    def close(self) -> None:
+        with self._lock:
+            self.commit()
+            self.connection.close()
+
+
+def open_hash_store(storage_path: str) -> HashStore:
+    """Open the store for a path: SQLite for .db/.sqlite files, otherwise a log-structured store"""
+    if Path(storage_path).suffix in (".db", ".sqlite", ".sqlite3"):
+        return SQLiteHashStore(storage_path)
+    return LogStructuredHashStore(storage_path)
+
+
 class DuplicateDetector:
-    """Manages duplicate file detection with persistent storage"""
+    """
+    Manages duplicate file detection with persistent storage.
+    
+    Unless the store is shared with other processes, a Bloom filter of all
+    registered hashes sits in front of it: hashes the filter has not seen
+    are new without a store lookup. The filter is saved next to the store
+    on close(), with the store's generation(), and rebuilt from the store
+    when that file is missing or the store has changed since.
+    """
     
-    def __init__(self, storage_path: str = "/opt/r_pipeline/data/hashes.json"):
+    def __init__(self, storage_path: str = "/opt/r_pipeline/data/hashes.json",
+                 store: Optional[HashStore] = None, bloom_capacity: int = 1000000,
+                 bloom_error_rate: float = 0.01):
         self.storage_path = Path(storage_path)
-        self._hash_database: Dict[str, str] = {}
-        self._load_database()
+        self._store = store if store is not None else open_hash_store(storage_path)
+        # Only a store opened from storage_path has a place to keep the filter
+        self._bloom_path = None if store is not None else self.storage_path.with_name(
+            self.storage_path.name + ".bloom")
+        self._bloom: Optional[BloomFilter] = None
+        self._bloom_saved_generation: Optional[str] = None  # Store state the filter file was saved for
+        self._bloom_lock = threading.Lock()
+        self._bloom_negatives = 0
+        self._bloom_positives = 0
+        self._bloom_false_positives = 0
+        if not self._store.shared and bloom_capacity > 0:
+            self._bloom = self._load_bloom(bloom_capacity, bloom_error_rate)
     
-    def _load_database(self):
-        """Load hash database from persistent storage"""
-        if self.storage_path.exists():
+    def _load_bloom(self, capacity: int, error_rate: float) -> BloomFilter:
+        """Load the saved filter if it was saved for the store's current state, otherwise rebuild it"""
+        generation = self._store.generation()
+        if self._bloom_path is not None and generation is not None:
+            bloom = BloomFilter.load(self._bloom_path)
+            if (bloom is not None and bloom.generation == generation and bloom.count == len(self._store)
+                    and bloom.capacity >= max(capacity, bloom.count)):
+                self._bloom_saved_generation = generation
+                return bloom
+        bloom = BloomFilter(max(capacity, 2 * len(self._store)), error_rate)
+        for file_hash in self._store:
+            bloom.add(file_hash)
+        bloom.generation = generation
+        return bloom
+    
+    def stats(self) -> Dict[str, Any]:
+        """Bloom filter size, expected false positive rate and hit counters"""
+        if self._bloom is None:
+            return {"bloom": None}
+        return {
+            "bloom": self._bloom.stats(),
+            "bloom_negatives": self._bloom_negatives,
+            "bloom_positives": self._bloom_positives,
+            "bloom_false_positives": self._bloom_false_positives,
+        }
+    
+    def close(self):
+        """Flush pending registrations and the Bloom filter to disk"""
+        self._store.close()
+        if self._bloom is None or self._bloom_path is None:
+            return
+        generation = self._store.generation()
+        if generation is not None and generation != self._bloom_saved_generation:
+            self._bloom.generation = generation
             try:
-                import json
-                with open(self.storage_path, 'r') as f:
-                    self._hash_database = json.load(f)
-            except Exception as e:
-                logger.warning(f"Failed to load hash database: {e}")
-    
-    def _save_database(self):
-        """Save hash database to persistent storage"""
-        try:
-            import json
-            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.storage_path, 'w') as f:
-                json.dump(self._hash_database, f, indent=2)
-        except Exception as e:
-            logger.error(f"Failed to save hash database: {e}")
+                self._bloom_path.parent.mkdir(parents=True, exist_ok=True)
+                self._bloom.save(self._bloom_path)
+                self._bloom_saved_generation = generation
+            except OSError as e:
+                logger.warning(f"Failed to save Bloom filter: {e}")
     
     def check_duplicate(self, file_path: str, file_hash: str) -> tuple[bool, str]:
         """
@@ -44,16 +627,29 @@ class DuplicateDetector:
         Returns:
             (is_duplicate, duplicate_of_path)
         """
-        if file_hash in self._hash_database:
-            return (True, self._hash_database[file_hash])
+        if self._bloom is None:
+            # Registers the hash unless another file already has it
+            duplicate_of = self._store.register(file_hash, file_path)
+            return (duplicate_of is not None, duplicate_of or "")
         
-        # Not a duplicate - register it
-        self._hash_database[file_hash] = file_path
-        self._save_database()
-        return (False, "")
+        with self._bloom_lock:
+            if file_hash not in self._bloom:
+                # Definitely new
+                self._bloom_negatives += 1
+                self._bloom.add(file_hash)
+                self._store.insert(file_hash, file_path)
+                return (False, "")
+            self._bloom_positives += 1
+            duplicate_of = self._store.register(file_hash, file_path)
+            if duplicate_of is not None:
+                return (True, duplicate_of)
+            self._bloom_false_positives += 1
+            self._bloom.add(file_hash)
+            return (False, "")
 
 # Singleton instance
 _detector = DuplicateDetector()
+atexit.register(_detector.close)
 
 def detect_duplicate(input_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -0,0 +1,183 @@
+# plugins/deduplicator/hash_index.py
+"""
+Sharded in-memory hash index for the deduplicator.
+
+File hashes are reduced to 16-byte BLAKE2b keys and kept in open-addressing
+tables made of flat byte arrays, and paths are stored UTF-8 encoded in one
+arena per shard. An entry costs about 45 bytes plus its path, against about
+200 bytes for a hex SHA-256 digest and a short path string in a dict. Lone
+surrogates, which JSON input can carry, are kept as they are.
+
+Each shard has its own lock, so check_and_register() is atomic and threads
+working on different shards do not wait for each other.
+"""
+
+import hashlib
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+KEY_SIZE = 16  # Bytes of BLAKE2b kept per hash; collisions are negligible below 2**50 entries
+MAX_LOAD = 0.7  # Fill ratio at which a shard doubles its table
+EMPTY = -1
+
+
+def hash_key(file_hash: str) -> bytes:
+    """Return the fixed-width key of a file hash"""
+    return hashlib.blake2b(file_hash.encode("utf-8", "surrogatepass"), digest_size=KEY_SIZE).digest()
+
+
+class _Shard:
+    """Open-addressing table (linear probing) of keys to path entries"""
+    
+    def __init__(self, capacity: int):
+        self.lock = threading.Lock()
+        self.count = 0
+        self._capacity = capacity
+        self._keys = bytearray(capacity * KEY_SIZE)
+        self._slots = array("l", [EMPTY]) * capacity  # Entry number per slot
+        self._path_offsets = array("Q", [0])  # Entry i's path is _paths[offsets[i]:offsets[i + 1]]
+        self._paths = bytearray()
+    
+    def _find(self, key: bytes, start: int) -> Tuple[int, int]:
+        """Return (slot, entry) for a key; entry is EMPTY if the key is absent"""
+        keys, slots, capacity = self._keys, self._slots, self._capacity
+        slot = start % capacity
+        while True:
+            entry = slots[slot]
+            if entry == EMPTY or keys[slot * KEY_SIZE:(slot + 1) * KEY_SIZE] == key:
+                return slot, entry
+            slot = (slot + 1) % capacity
+    
+    def path(self, entry: int) -> str:
+        data = self._paths[self._path_offsets[entry]:self._path_offsets[entry + 1]]
+        return data.decode("utf-8", "surrogatepass")
+    
+    def get(self, key: bytes, start: int) -> Optional[str]:
+        _, entry = self._find(key, start)
+        return None if entry == EMPTY else self.path(entry)
+    
+    def check_and_register(self, key: bytes, start: int, file_path: str) -> Optional[str]:
+        slot, entry = self._find(key, start)
+        if entry != EMPTY:
+            return self.path(entry)
+        self._keys[slot * KEY_SIZE:(slot + 1) * KEY_SIZE] = key
+        self._slots[slot] = self.count
+        self._paths += file_path.encode("utf-8", "surrogatepass")
+        self._path_offsets.append(len(self._paths))
+        self.count += 1
+        if self.count > self._capacity * MAX_LOAD:
+            self._grow()
+        return None
+    
+    def _grow(self):
+        """Double the table and reinsert every key"""
+        old_keys, old_slots = self._keys, self._slots
+        self._capacity *= 2
+        self._keys = bytearray(self._capacity * KEY_SIZE)
+        self._slots = array("l", [EMPTY]) * self._capacity
+        for old_slot, entry in enumerate(old_slots):
+            if entry != EMPTY:
+                key = bytes(old_keys[old_slot * KEY_SIZE:(old_slot + 1) * KEY_SIZE])
+                slot, _ = self._find(key, int.from_bytes(key[:8], "little"))
+                self._keys[slot * KEY_SIZE:(slot + 1) * KEY_SIZE] = key
+                self._slots[slot] = entry
+    
+    def memory_usage(self) -> int:
+        return (len(self._keys) + self._slots.itemsize * len(self._slots)
+                + self._path_offsets.itemsize * len(self._path_offsets) + len(self._paths))
+
+
+class ShardedHashIndex:
+    """
+    Concurrent map of file hash -> first path registered with it.
+    
+    Args:
+        num_shards: Number of independently locked shards
+        initial_capacity: Table slots per shard to start with
+    """
+    
+    def __init__(self, num_shards: int = 64, initial_capacity: int = 1024):
+        self.num_shards = num_shards
+        self._shards = [_Shard(initial_capacity) for _ in range(num_shards)]
+    
+    def _locate(self, file_hash: str) -> Tuple[_Shard, bytes, int]:
+        key = hash_key(file_hash)
+        shard = self._shards[int.from_bytes(key[8:12], "little") % self.num_shards]
+        return shard, key, int.from_bytes(key[:8], "little")
+    
+    def __len__(self) -> int:
+        return sum(shard.count for shard in self._shards)
+    
+    def __contains__(self, file_hash: str) -> bool:
+        return self.get(file_hash) is not None
+    
+    def get(self, file_hash: str) -> Optional[str]:
+        """Return the path registered for a hash, or None"""
+        shard, key, start = self._locate(file_hash)
+        with shard.lock:
+            return shard.get(key, start)
+    
+    def check_and_register(self, file_hash: str, file_path: str) -> Optional[str]:
+        """
+        Register a hash unless it is already known, atomically.
+        
+        Returns:
+            The path registered earlier for the hash, or None if file_path
+            has now been registered
+        """
+        shard, key, start = self._locate(file_hash)
+        with shard.lock:
+            return shard.check_and_register(key, start, file_path)
+    
+    def check_and_register_many(self, entries: Sequence[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        check_and_register() for many (file_hash, file_path) entries at once.
+        
+        Each distinct hash is looked up once, and each shard is locked once
+        for all of its hashes. The results are the same as registering the
+        entries one by one, in order.
+        
+        Returns:
+            One check_and_register() result per entry, in the same order
+        """
+        first_paths: Dict[str, str] = {}
+        for file_hash, file_path in entries:
+            first_paths.setdefault(file_hash, file_path)
+        
+        by_shard: Dict[int, List[Tuple[str, bytes]]] = {}
+        num_shards = self.num_shards
+        for file_hash in first_paths:
+            key = hash_key(file_hash)
+            by_shard.setdefault(int.from_bytes(key[8:12], "little") % num_shards, []).append((file_hash, key))
+        
+        earlier: Dict[str, Optional[str]] = {}  # Path registered before the batch, or None
+        for shard_index, shard_hashes in by_shard.items():
+            shard = self._shards[shard_index]
+            with shard.lock:
+                for file_hash, key in shard_hashes:
+                    earlier[file_hash] = shard.check_and_register(
+                        key, int.from_bytes(key[:8], "little"), first_paths[file_hash])
+        
+        # Later entries of a hash are duplicates of whichever path came first
+        results: List[Optional[str]] = []
+        seen = set()
+        for file_hash, _ in entries:
+            if file_hash in seen:
+                existing = earlier[file_hash]
+                results.append(first_paths[file_hash] if existing is None else existing)
+            else:
+                seen.add(file_hash)
+                results.append(earlier[file_hash])
+        return results
+    
+    def paths(self) -> Iterator[str]:
+        """Iterate over the registered paths, shard by shard"""
+        for shard in self._shards:
+            with shard.lock:
+                paths = [shard.path(entry) for entry in range(shard.count)]
+            yield from paths
+    
+    def memory_usage(self) -> int:
+        """Bytes held by the tables and path arenas"""
+        return sum(shard.memory_usage() for shard in self._shards)
@@ -1,7 +1,17 @@
 # plugins/deduplicator/tests/test_deduplicator.py
 import pytest
+import hashlib
+import io
 import json
-from deduplicator import detect_duplicate
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+import deduplicator
+from deduplicator import (FingerprintIndex, compute_file_hash, compute_fingerprint, detect_duplicate,
+                          detect_duplicates_batch, run_jsonl)
 
 def test_detect_new_file():
     """Test that new files are not marked as duplicates"""
@@ -49,8 +59,8 @@ def test_error_handling():
     """Test that invalid input produces structured error"""
     # Arrange
     input_data = {
-        "file_path": "test.txt",
-        # Missing file_hash!
+        "file_path": "does_not_exist/test.txt",
+        # Missing file_hash, and no file to compute it from!
         "trace_id": "test-trace-004"
     }
     
@@ -61,5 +71,323 @@ def test_error_handling():
     assert result["status"] == "error"
     assert "error_message" in result
 
+def _words(seed, count=400):
+    rng = random.Random(seed)
+    return [f"word{rng.randrange(5000)}" for _ in range(count)]
+
+def test_detect_near_duplicate_file():
+    """Test that near-duplicates are reported with the closest match and its score"""
+    # Arrange - same text with one word changed and a trailing newline
+    words = _words(1)
+    edited = list(words)
+    edited[200] = "changed"
+    original = {
+        "file_path": "report.txt",
+        "file_hash": "near001",
+        "trace_id": "test-trace-005",
+        "near_duplicate": True,
+        "file_content": " ".join(words)
+    }
+    near_copy = dict(original, file_path="report_copy.txt", file_hash="near002",
+                     trace_id="test-trace-006", file_content=" ".join(edited) + "\n")
+    unrelated = dict(original, file_path="other.txt", file_hash="near003",
+                     trace_id="test-trace-007", file_content=" ".join(_words(2)))
+    
+    # Act
+    detect_duplicate(original)
+    result = detect_duplicate(near_copy)
+    other = detect_duplicate(unrelated)
+    
+    # Assert
+    assert result["status"] == "success"
+    assert result["is_duplicate"] == False
+    assert result["near_duplicate_of"] == "report.txt"
+    assert 0.9 <= result["similarity"] < 1.0
+    assert result["recommended_action"] == "review"
+    assert other["near_duplicate_of"] == ""
+    assert other["recommended_action"] == "proceed"
+
+def test_fingerprint_lookup_is_fast():
+    """Test that a lookup in a large fingerprint index stays under a millisecond"""
+    # Arrange
+    index = FingerprintIndex()
+    fingerprints = [compute_fingerprint(" ".join(_words(seed, 50))) for seed in range(2000)]
+    for number, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, f"file{number}.txt")
+    
+    # Act
+    start = time.perf_counter()
+    for fingerprint in fingerprints:
+        nearest = index.nearest(fingerprint)
+    per_lookup = (time.perf_counter() - start) / len(fingerprints)
+    
+    # Assert
+    assert nearest == ("file1999.txt", 1.0)
+    assert per_lookup < 0.001
+
+def test_fingerprint_covers_whole_file():
+    """Test that texts sharing only a long header are not near-duplicates"""
+    # Arrange - a 5KB header followed by unrelated bodies
+    header = " ".join(_words(3, 700))
+    first = header + " " + " ".join(_words(4, 5000))
+    second = header + " " + " ".join(_words(5, 5000))
+    
+    # Act
+    similarity = deduplicator.fingerprint_similarity(compute_fingerprint(first), compute_fingerprint(second))
+    
+    # Assert
+    assert len(header) > 5000
+    assert similarity < deduplicator.NEAR_DUPLICATE_THRESHOLD
+
+def test_fingerprint_hashes_each_word_once(tmp_path, monkeypatch):
+    """Test that fingerprinting is linear: blocks only overlap by one shingle"""
+    # Arrange
+    words = _words(3, 10000)
+    path = tmp_path / "large.txt"
+    path.write_text(" ".join(words))
+    expected = compute_fingerprint(" ".join(words))
+    block_sizes = []
+    shingle_bit_counts = deduplicator._shingle_bit_counts
+    def counting(block, counts):
+        block_sizes.append(len(block))
+        return shingle_bit_counts(block, counts)
+    monkeypatch.setattr(deduplicator, "_shingle_bit_counts", counting)
+    monkeypatch.setattr(deduplicator, "FINGERPRINT_BLOCK_WORDS", 1000)
+    monkeypatch.setattr(deduplicator, "FINGERPRINT_CHUNK_CHARS", 777)
+    
+    # Act
+    fingerprint = deduplicator.compute_file_fingerprint(str(path))
+    
+    # Assert
+    overlap = (len(block_sizes) - 1) * (deduplicator.SHINGLE_WORDS - 1)
+    assert fingerprint == expected
+    assert max(block_sizes) == 1000
+    assert sum(block_sizes) == len(words) + overlap
+
+def test_low_similarity_threshold_is_rejected():
+    """Test that a threshold below what the fingerprint index supports is an error"""
+    # Arrange
+    request = {
+        "file_path": "loose.txt",
+        "file_hash": "loose001",
+        "trace_id": "test-trace-013",
+        "near_duplicate": True,
+        "similarity_threshold": 0.5,
+        "file_content": "some text"
+    }
+    
+    # Act
+    result = detect_duplicate(request)
+    retried = detect_duplicate(dict(request, similarity_threshold=0.95))
+    
+    # Assert
+    assert result["status"] == "error"
+    assert "similarity_threshold" in result["error_message"]
+    assert result["trace_id"] == "test-trace-013"
+    assert retried["status"] == "success"
+    assert retried["is_duplicate"] == False
+
+def test_detect_duplicates_batch():
+    """Test that a batch is processed in order with one result per item"""
+    # Arrange
+    items = [
+        {"file_path": "batch_a.txt", "file_hash": "batch001", "trace_id": "test-trace-008"},
+        {"file_path": "batch_b.txt", "file_hash": "batch001", "trace_id": "test-trace-009"},
+        {"file_path": "batch_c.txt", "trace_id": "test-trace-010"},
+        ["not", "an", "object"]
+    ]
+    
+    # Act
+    results = detect_duplicates_batch(items)
+    
+    # Assert
+    assert [result["trace_id"] for result in results] == ["test-trace-008", "test-trace-009", "test-trace-010", "unknown"]
+    assert results[0]["is_duplicate"] == False
+    assert results[1]["duplicate_of"] == "batch_a.txt"
+    assert results[2]["status"] == "error"
+    assert results[3]["status"] == "error"
+
+def test_batch_registers_hashes_in_one_pass(monkeypatch):
+    """Test that a batch looks up and registers all of its hashes in one index call"""
+    # Arrange
+    calls = []
+    register_many = deduplicator._hash_index.check_and_register_many
+    monkeypatch.setattr(deduplicator._hash_index, "check_and_register_many",
+                        lambda entries: calls.append(len(entries)) or register_many(entries))
+    monkeypatch.setattr(deduplicator._hash_index, "check_and_register",
+                        lambda *args: pytest.fail("registered one hash at a time"))
+    items = [{"file_path": f"pass{n}.txt", "file_hash": f"pass{n % 3}", "trace_id": f"p{n}"} for n in range(6)]
+    items.insert(2, {"file_path": "no_trace.txt", "file_hash": "pass9"})
+    
+    # Act
+    results = detect_duplicates_batch(items)
+    
+    # Assert
+    assert calls == [6]
+    assert [result["status"] for result in results] == ["success"] * 2 + ["error"] + ["success"] * 4
+    assert [result.get("duplicate_of") for result in results if result["status"] == "success"] == \
+        ["", "", "", "pass0.txt", "pass1.txt", "pass2.txt"]
+
+def test_jsonl_mode():
+    """Test that JSON Lines input gives one result line per record"""
+    # Arrange
+    lines = [json.dumps({"file_path": f"jsonl{n}.txt", "file_hash": f"jsonl{n % 3}", "trace_id": f"t{n}"})
+             for n in range(5)]
+    lines.insert(2, "{broken")
+    output = io.StringIO()
+    
+    # Act
+    count = run_jsonl(io.StringIO("\n".join(lines) + "\n\n"), output, batch_size=2)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    
+    # Assert
+    assert count == 6
+    assert [result["trace_id"] for result in results] == ["t0", "t1", "unknown", "t2", "t3", "t4"]
+    assert results[2]["status"] == "error"
+    assert [result["is_duplicate"] for result in results if result["status"] == "success"] == [False, False, False, True, True]
+
+def test_jsonl_command_line():
+    """Test that --jsonl switches the plugin to JSON Lines on stdin and stdout"""
+    # Arrange
+    script = Path(__file__).resolve().parent.parent / "deduplicator.py"
+    records = "".join(json.dumps({"file_path": f"cli{n}.txt", "file_hash": "same", "trace_id": f"c{n}"}) + "\n"
+                      for n in range(3))
+    
+    # Act
+    completed = subprocess.run([sys.executable, str(script), "--jsonl"], input=records,
+                               capture_output=True, text=True, check=True)
+    results = [json.loads(line) for line in completed.stdout.splitlines()]
+    
+    # Assert
+    assert [result["duplicate_of"] for result in results] == ["", "cli0.txt", "cli0.txt"]
+
+def test_plugin_hashes_file(tmp_path, monkeypatch):
+    """Test that the plugin computes a stable digest when file_hash is missing and caches it"""
+    # Arrange
+    original = tmp_path / "original.bin"
+    copy = tmp_path / "copy.bin"
+    original.write_bytes(b"server side hashing" * 1000)
+    copy.write_bytes(original.read_bytes())
+    reads = []
+    digest_file = deduplicator._digest_file
+    monkeypatch.setattr(deduplicator, "_digest_file", lambda f: reads.append(f.name) or digest_file(f))
+    
+    # Act
+    first = detect_duplicate({"file_path": str(original), "trace_id": "test-trace-011"})
+    second = detect_duplicate({"file_path": str(copy), "trace_id": "test-trace-012"})
+    cached = compute_file_hash(str(original))
+    
+    # Assert
+    assert first["file_hash"] == hashlib.sha256(original.read_bytes()).hexdigest()
+    assert second["is_duplicate"] == True
+    assert second["duplicate_of"] == str(original)
+    assert cached == first["file_hash"]
+    assert len(reads) == 2
+
+def test_batch_hashes_files_in_parallel(tmp_path):
+    """Test that a batch hashes its files up front and reports unreadable ones"""
+    # Arrange
+    paths = []
+    for number in range(6):
+        path = tmp_path / f"batch_hash{number}.txt"
+        path.write_text(f"content {number % 2}")
+        paths.append(str(path))
+    items = [{"file_path": path, "trace_id": f"h{n}"} for n, path in enumerate(paths)]
+    items.append({"file_path": str(tmp_path / "missing.txt"), "trace_id": "missing"})
+    
+    # Act
+    results = detect_duplicates_batch(items)
+    
+    # Assert
+    assert [result["is_duplicate"] for result in results[:6]] == [False, False, True, True, True, True]
+    assert results[4]["duplicate_of"] == paths[0]
+    assert results[6]["status"] == "error"
+    assert results[6]["trace_id"] == "missing"
+
+def test_malformed_file_path_is_reported():
+    """Test that a file_path that is not a string fails its own record only"""
+    # Arrange
+    items = [
+        {"file_path": ["a", "b"], "trace_id": "bad-list"},
+        {"file_path": {"nested": "path"}, "trace_id": "bad-dict"},
+        {"file_path": "malformed_ok.txt", "file_hash": "malformed001", "trace_id": "good"}
+    ]
+    lines = "".join(json.dumps(item) + "\n" for item in items)
+    output = io.StringIO()
+    
+    # Act
+    results = detect_duplicates_batch(items)
+    run_jsonl(io.StringIO(lines), output)
+    jsonl_results = [json.loads(line) for line in output.getvalue().splitlines()]
+    
+    # Assert
+    assert [result["status"] for result in results] == ["error", "error", "success"]
+    assert [result["trace_id"] for result in jsonl_results] == ["bad-list", "bad-dict", "good"]
+    assert jsonl_results[2]["duplicate_of"] == "malformed_ok.txt"
+
+def test_worker_mode():
+    """Test that --serve answers requests one line at a time and keeps its state"""
+    # Arrange
+    script = Path(__file__).resolve().parent.parent / "deduplicator.py"
+    worker = subprocess.Popen([sys.executable, str(script), "--serve"], stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, text=True, bufsize=1)
+    
+    def request(data):
+        worker.stdin.write(json.dumps(data) + "\n")
+        worker.stdin.flush()
+        return json.loads(worker.stdout.readline())
+    
+    # Act
+    first = request({"file_path": "worker_a.txt", "file_hash": "worker001", "trace_id": "w1"})
+    second = request({"file_path": "worker_b.txt", "file_hash": "worker001", "trace_id": "w2"})
+    malformed = request({"file_path": ["worker_c.txt"], "trace_id": "w4"})
+    ping = request({"command": "ping", "trace_id": "w3"})
+    worker.stdin.close()
+    worker.wait(timeout=10)
+    
+    # Assert
+    assert first["is_duplicate"] == False
+    assert second["duplicate_of"] == "worker_a.txt"
+    assert malformed["status"] == "error"
+    assert malformed["trace_id"] == "w4"
+    assert ping["pid"] == worker.pid
+    assert ping["hashes"] == 1
+    assert worker.returncode == 0
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets only")
+def test_socket_worker_keeps_a_live_socket(tmp_path):
+    """Test that --socket replaces a stale socket but not one a worker is serving on"""
+    # Arrange - a socket file left by a worker that is gone
+    script = Path(__file__).resolve().parent.parent / "deduplicator.py"
+    socket_path = str(tmp_path / "dedup.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    
+    # Act
+    worker = subprocess.Popen([sys.executable, str(script), "--serve", "--socket", socket_path])
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(socket_path)
+                    client.sendall(b'{"command": "ping"}\n')
+                    ping = json.loads(client.makefile().readline())
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+        second = subprocess.run([sys.executable, str(script), "--serve", "--socket", socket_path],
+                                capture_output=True, text=True, timeout=10)
+    finally:
+        worker.terminate()
+        worker.wait(timeout=10)
+    
+    # Assert
+    assert ping["pid"] == worker.pid
+    assert second.returncode != 0
+    assert "already serving" in second.stderr
+
 # Run: pytest plugins/deduplicator/tests/ -v
 # Expected: ALL FAIL (no implementation yet)
\ No newline at end of file
@@ -0,0 +1,256 @@
+# plugins/deduplicator/tests/test_deduplicator_refactored.py
+import pytest
+import json
+import multiprocessing
+import os
+import threading
+from deduplicator_refactored import (BloomFilter, DuplicateDetector, HashStore, InMemoryHashStore,
+                                     LogStructuredHashStore, SQLiteHashStore)
+
+def test_registrations_survive_restart(tmp_path):
+    """Test that registered hashes are replayed from the log after a restart"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    detector = DuplicateDetector(str(storage))
+    detector.check_duplicate("first.txt", "aaa111")
+    detector.check_duplicate("second.txt", "bbb222")
+    detector.close()
+    
+    # Act
+    restarted = DuplicateDetector(str(storage))
+    
+    # Assert
+    assert restarted.check_duplicate("copy.txt", "aaa111") == (True, "first.txt")
+    assert restarted.check_duplicate("copy2.txt", "bbb222") == (True, "second.txt")
+    assert not storage.exists()  # Nothing compacted yet, only the log was written
+
+def test_log_is_compacted_into_snapshot(tmp_path):
+    """Test that a growing log is folded into the snapshot outside the registering thread"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    compacting_threads = []
+    
+    class RecordingStore(LogStructuredHashStore):
+        def compact(self):
+            compacting_threads.append(threading.current_thread())
+            super().compact()
+    
+    store = RecordingStore(str(storage), compact_min_records=10)
+    
+    # Act
+    for number in range(25):
+        store.add(f"hash{number}", f"file{number}.txt")
+    store.close()
+    
+    # Assert
+    snapshot = [json.loads(line) for line in storage.read_text().splitlines()]
+    log_lines = store.log_path.read_text().splitlines() if store.log_path.exists() else []
+    assert compacting_threads
+    assert threading.current_thread() not in compacting_threads
+    assert len(snapshot) >= 10
+    assert len(snapshot) + len(log_lines) == 25
+    assert len(LogStructuredHashStore(str(storage))) == 25
+
+def test_corrupt_snapshot_is_moved_aside(tmp_path):
+    """Test that a damaged snapshot is kept for recovery instead of being overwritten"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    storage.write_text('["aaa111", "first.txt"]\nnot json\n')
+    (tmp_path / "hashes.json.log").write_text('["bbb222", "second.txt"]\n')
+    
+    # Act
+    store = LogStructuredHashStore(str(storage))
+    store.compact()
+    store.close()
+    
+    # Assert
+    assert store.get("bbb222") == "second.txt"
+    assert (tmp_path / "hashes.json.corrupt").read_text() == '["aaa111", "first.txt"]\nnot json\n'
+    assert LogStructuredHashStore(str(storage)).get("bbb222") == "second.txt"
+
+def test_json_object_snapshot_is_still_read(tmp_path):
+    """Test that a snapshot in the older single-object format is loaded and converted"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    storage.write_text(json.dumps({"ccc333": "old.txt"}))
+    
+    # Act
+    store = LogStructuredHashStore(str(storage))
+    store.add("ddd444", "new.txt")
+    store.compact()
+    store.close()
+    reloaded = LogStructuredHashStore(str(storage))
+    
+    # Assert
+    assert [json.loads(line) for line in storage.read_text().splitlines()] == [["ccc333", "old.txt"],
+                                                                                ["ddd444", "new.txt"]]
+    assert reloaded.get("ccc333") == "old.txt"
+    assert reloaded.get("ddd444") == "new.txt"
+
+def test_torn_log_tail_is_dropped(tmp_path):
+    """Test that a partially written record from a crash is ignored"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    store = LogStructuredHashStore(str(storage))
+    store.add("ccc333", "kept.txt")
+    store.close()
+    with open(store.log_path, "a") as f:
+        f.write('["ddd444", "tor')
+    
+    # Act
+    reloaded = LogStructuredHashStore(str(storage))
+    reloaded.add("eee555", "after.txt")
+    reloaded.close()
+    
+    # Assert
+    assert reloaded.get("ccc333") == "kept.txt"
+    assert reloaded.get("ddd444") is None
+    assert LogStructuredHashStore(str(storage)).get("eee555") == "after.txt"
+
+def test_log_store_syncs_when_idle(tmp_path, monkeypatch):
+    """Test that the last records are fsynced after sync_interval without further adds"""
+    # Arrange
+    synced = threading.Event()
+    fsync = os.fsync
+    def recording_fsync(fd):
+        fsync(fd)
+        synced.set()
+    monkeypatch.setattr(os, "fsync", recording_fsync)
+    store = LogStructuredHashStore(str(tmp_path / "hashes.json"), sync_every=100, sync_interval=0.2)
+    
+    # Act
+    store.add("fff666", "idle.txt")
+    
+    # Assert
+    assert synced.wait(5)
+    store.close()
+
+def _register_all(db_path, worker, results):
+    store = SQLiteHashStore(db_path, commit_every=7)
+    new = sum(store.register(f"hash{number}", f"worker{worker}/file{number}.txt") is None
+              for number in range(200))
+    store.close()
+    results.put(new)
+
+def test_sqlite_store_has_no_lost_updates(tmp_path):
+    """Test that concurrent processes register each hash exactly once"""
+    # Arrange
+    db_path = str(tmp_path / "hashes.db")
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_register_all, args=(db_path, worker, results))
+               for worker in range(4)]
+    
+    # Act
+    for process in workers:
+        process.start()
+    registered = sum(results.get(timeout=60) for _ in workers)
+    for process in workers:
+        process.join()
+    
+    # Assert
+    assert registered == 200
+    detector = DuplicateDetector(db_path)
+    is_duplicate, duplicate_of = detector.check_duplicate("late.txt", "hash42")
+    detector.close()
+    assert is_duplicate
+    assert duplicate_of.endswith("/file42.txt")
+
+def test_in_memory_store():
+    """Test that the in-memory backend reports the first registration"""
+    # Arrange
+    detector = DuplicateDetector(store=InMemoryHashStore())
+    
+    # Act
+    first = detector.check_duplicate("a.txt", "fff666")
+    second = detector.check_duplicate("b.txt", "fff666")
+    
+    # Assert
+    assert first == (False, "")
+    assert second == (True, "a.txt")
+
+def test_incomplete_backend_cannot_be_created():
+    """Test that a backend missing part of the HashStore interface fails when created"""
+    # Arrange
+    class LookupOnlyStore(HashStore):
+        def get(self, file_hash):
+            return None
+    
+    # Act / Assert
+    with pytest.raises(TypeError, match="register"):
+        LookupOnlyStore()
+
+def test_bloom_filter_answers_new_hashes(tmp_path):
+    """Test that new hashes are answered by the Bloom filter and the filter is persisted"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    detector = DuplicateDetector(str(storage), bloom_capacity=1000)
+    
+    # Act
+    for number in range(500):
+        detector.check_duplicate(f"file{number}.txt", f"hash{number}")
+    duplicate = detector.check_duplicate("copy.txt", "hash7")
+    stats = detector.stats()
+    detector.close()
+    reopened = DuplicateDetector(str(storage), bloom_capacity=1000)
+    
+    # Assert
+    assert duplicate == (True, "file7.txt")
+    assert stats["bloom_negatives"] + stats["bloom_false_positives"] == 500
+    assert stats["bloom_positives"] == stats["bloom_false_positives"] + 1
+    assert stats["bloom"]["count"] == 500
+    assert stats["bloom"]["false_positive_rate"] < 0.01
+    assert (tmp_path / "hashes.json.bloom").exists()
+    assert reopened.stats()["bloom"]["count"] == 500
+    assert reopened.check_duplicate("copy2.txt", "hash499") == (True, "file499.txt")
+
+def test_stale_bloom_filter_is_rebuilt(tmp_path):
+    """Test that a filter saved before later registrations is rebuilt from the store"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    detector = DuplicateDetector(str(storage))
+    detector.check_duplicate("a.txt", "ggg777")
+    detector.close()
+    store = LogStructuredHashStore(str(storage))
+    store.add("hhh888", "b.txt")  # Registered without updating the filter
+    store.close()
+    
+    # Act
+    reopened = DuplicateDetector(str(storage))
+    
+    # Assert
+    assert reopened.stats()["bloom"]["count"] == 2
+    assert reopened.check_duplicate("c.txt", "hhh888") == (True, "b.txt")
+
+def test_bloom_filter_of_another_store_state_is_rebuilt(tmp_path):
+    """Test that a filter is not reused for a store holding other hashes of the same count"""
+    # Arrange
+    storage = tmp_path / "hashes.json"
+    detector = DuplicateDetector(str(storage))
+    detector.check_duplicate("a.txt", "iii999")
+    detector.close()
+    for path in tmp_path.glob("hashes.json*"):
+        if path.suffix != ".bloom":
+            path.unlink()
+    store = LogStructuredHashStore(str(storage))
+    store.add("jjj000", "b.txt")
+    store.close()
+    
+    # Act
+    reopened = DuplicateDetector(str(storage))
+    
+    # Assert
+    assert reopened.check_duplicate("c.txt", "jjj000") == (True, "b.txt")
+    assert reopened.stats()["bloom_negatives"] == 0
+
+def test_bloom_filter_accepts_surrogate_escaped_keys():
+    """Test that keys holding lone surrogates can be added and looked up"""
+    # Arrange
+    bloom = BloomFilter(capacity=10)
+    key = b"name\xff".decode("utf-8", "surrogateescape")
+    
+    # Act
+    bloom.add(key)
+    
+    # Assert
+    assert key in bloom
+    assert "name" not in bloom
@@ -0,0 +1,78 @@
+# plugins/deduplicator/tests/test_hash_index.py
+import threading
+from hash_index import ShardedHashIndex
+
+def test_check_and_register():
+    """Test that the first path registered for a hash is kept"""
+    # Arrange
+    index = ShardedHashIndex(num_shards=4, initial_capacity=8)
+    
+    # Act
+    first = index.check_and_register("abc123", "first.txt")
+    second = index.check_and_register("abc123", "second.txt")
+    for number in range(1000):  # Grows every shard several times
+        index.check_and_register(f"hash{number}", f"dir/file{number}.txt")
+    
+    # Assert
+    assert first is None
+    assert second == "first.txt"
+    assert len(index) == 1001
+    assert index.get("hash500") == "dir/file500.txt"
+    assert "hash999" in index
+    assert "missing" not in index
+    assert sorted(index.paths())[:2] == ["dir/file0.txt", "dir/file1.txt"]
+
+def test_check_and_register_many():
+    """Test that a batch registration gives the same results as one-by-one registration"""
+    # Arrange
+    index = ShardedHashIndex(num_shards=4, initial_capacity=8)
+    one_by_one = ShardedHashIndex(num_shards=4, initial_capacity=8)
+    index.check_and_register("known", "earlier.txt")
+    one_by_one.check_and_register("known", "earlier.txt")
+    entries = [(f"hash{number % 300}", f"file{number}.txt") for number in range(500)]
+    entries += [("known", "late.txt"), ("surrogate", "bad\udcff.txt")]
+    
+    # Act
+    results = index.check_and_register_many(entries)
+    expected = [one_by_one.check_and_register(file_hash, file_path) for file_hash, file_path in entries]
+    
+    # Assert
+    assert results == expected
+    assert results[300] == "file0.txt"
+    assert results[-2] == "earlier.txt"
+    assert index.get("surrogate") == "bad\udcff.txt"
+    assert len(index) == 302
+
+def test_concurrent_registration_is_atomic():
+    """Test that threads registering the same hashes register each one exactly once"""
+    # Arrange
+    index = ShardedHashIndex(num_shards=8, initial_capacity=16)
+    registered = []
+    
+    def register(worker):
+        registered.append(sum(index.check_and_register(f"hash{number}", f"worker{worker}/{number}") is None
+                              for number in range(2000)))
+    
+    threads = [threading.Thread(target=register, args=(worker,)) for worker in range(8)]
+    
+    # Act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    # Assert
+    assert sum(registered) == 2000
+    assert len(index) == 2000
+
+def test_entries_are_compact():
+    """Test that an entry takes far less memory than a hex digest and path in a dict"""
+    # Arrange
+    index = ShardedHashIndex(num_shards=4)
+    
+    # Act
+    for number in range(20000):
+        index.check_and_register(f"{number:064x}", f"/data/{number:08d}.txt")
+    
+    # Assert
+    assert index.memory_usage() / len(index) < 100
@@ -1,6 +1,32 @@
 # plugins/file-classifier/file_classifier.py
-def classify_file(file_path: str, file_content: str) -> dict:
-    """Classify a file based on path and content"""
+import sys
+from pathlib import Path
+from typing import Union
+
+# The text/binary heuristic is shared with compare_file_similarity, which
+# lives at the repository root
+_REPO_ROOT = str(Path(__file__).resolve().parents[2])
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
+from compare_file_similarity import SNIFF_SIZE, looks_like_text
+
+
+def classify_file(file_path: str, file_content: Union[str, bytes]) -> dict:
+    """
+    Classify a file based on path and content.
+    
+    Content whose first SNIFF_SIZE bytes fail looks_like_text is binary.
+    Text content is encoded back to UTF-8 for the check, so lone
+    surrogates left by a lossy decode count as binary too.
+    """
+    data = file_content if isinstance(file_content, bytes) else file_content.encode('utf-8', 'surrogatepass')
+    if not looks_like_text(data[:SNIFF_SIZE]):
+        return {
+            "classification": "binary",
+            "confidence": 0.9,
+            "recommended_location": "quarantine/"
+        }
     if file_path.endswith('.py'):
         return {
             "classification": "python_module",
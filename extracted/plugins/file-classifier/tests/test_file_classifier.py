@@ -1,6 +1,6 @@
 # plugins/file-classifier/tests/test_file_classifier.py
 import pytest
-from file_classifier import classify_file
+from file_classifier import classify_file, looks_like_text
 
 def test_classify_python_file():
     """Test that .py files are classified as 'python_module'"""
@@ -16,5 +16,31 @@ def test_classify_python_file():
     assert result["confidence"] >= 0.9
     assert result["recommended_location"] == "modules/python/"
 
+def test_classify_binary_content():
+    """Test that content with NUL bytes is classified as 'binary'"""
+    result = classify_file("data.py", "header\0\x01")
+    
+    assert result["classification"] == "binary"
+    assert result["recommended_location"] == "quarantine/"
+    assert looks_like_text("ok é".encode("utf-8")[:-1])
+    assert not looks_like_text(b"\xff\xfe\0")
+
+def test_classify_uses_text_heuristic():
+    """Test that raw bytes and undecodable text go through looks_like_text"""
+    # Arrange
+    utf8_bytes = "def café(): pass".encode("utf-8")
+    latin1_bytes = "def café(): pass".encode("latin-1")
+    escaped_text = latin1_bytes.decode("utf-8", "surrogateescape")
+    
+    # Act
+    from_bytes = classify_file("cafe.py", utf8_bytes)
+    from_latin1 = classify_file("cafe.py", latin1_bytes)
+    from_escaped = classify_file("cafe.py", escaped_text)
+    
+    # Assert
+    assert from_bytes["classification"] == "python_module"
+    assert from_latin1["classification"] == "binary"
+    assert from_escaped["classification"] == "binary"
+
 # Run: pytest plugins/file-classifier/tests/
 # Expected: FAIL (function doesn't exist yet)
\ No newline at end of file
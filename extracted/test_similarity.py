@@ -3,9 +3,35 @@
 Unit tests for the file similarity comparison script.
 """
 
+import csv
+import io
+import json
 import tempfile
 from pathlib import Path
-from compare_file_similarity import calculate_similarity, is_text_file
+import compare_file_similarity
+from benchmark_similarity import generate_corpus, run_benchmark
+from compare_file_similarity import (
+    calculate_similarity,
+    cluster_matches,
+    compare_files,
+    build_size_window,
+    compute_minhash,
+    compute_stream_sketch,
+    content_similarity,
+    find_similar,
+    get_all_files,
+    FileContentCache,
+    get_shingles,
+    is_text_file,
+    load_results,
+    iter_similar_pairs,
+    read_file_content,
+    ResultsWriter,
+    scan_similarity,
+    TextSniffer,
+    write_clusters_csv,
+    write_clusters_json,
+)
 
 
 def test_identical_files():
@@ -77,6 +103,491 @@ def test_is_text_file_detection():
         print("✓ JSON file detection passed")
 
 
+def test_minhash_signatures():
+    """Test that MinHash signatures agree more for similar content."""
+    base = "def handler(event):\n    return process(event)\n" * 20
+    similar = base.replace("process", "handle", 1)
+    different = "SELECT * FROM orders WHERE id = 42;\n" * 20
+    
+    sig_base = compute_minhash(get_shingles(base))
+    sig_similar = compute_minhash(get_shingles(similar))
+    sig_different = compute_minhash(get_shingles(different))
+    
+    def agreement(a, b):
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+    
+    assert sig_base == compute_minhash(get_shingles(base)), "Signatures should be deterministic"
+    assert agreement(sig_base, sig_similar) > agreement(sig_base, sig_different)
+    print("✓ MinHash signatures test passed")
+
+
+def test_lsh_engine_matches_exhaustive():
+    """Test that the LSH engine finds the same pairs as the exhaustive engine."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        template = "".join(f"Line {n}: the quick brown fox jumps\n" for n in range(40))
+        (root / "a.txt").write_text(template)
+        (root / "b.txt").write_text(template.replace("Line 7:", "Row 7:"))
+        (root / "c.txt").write_text(template)
+        (root / "d.txt").write_text("".join(f"{n} unrelated words here\n" for n in range(40)))
+        
+        exhaustive = compare_files(root, similarity_threshold=0.90, engine="exhaustive")
+        lsh = compare_files(root, similarity_threshold=0.90, engine="lsh")
+        
+        assert len(exhaustive) == 3, f"Expected 3 pairs, got {len(exhaustive)}"
+        assert lsh == exhaustive, f"Expected {exhaustive}, got {lsh}"
+        print("✓ LSH engine test passed")
+
+
+def test_content_cache_reads_each_file_once():
+    """Test that the content cache decodes each file once and evicts LRU entries."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = []
+        for n in range(3):
+            path = Path(tmpdir) / f"file{n}.txt"
+            path.write_bytes(f"shared line\r\nfile {n}\n".encode("utf-8"))
+            paths.append(path)
+        
+        cache = FileContentCache(use_mmap=True)
+        for _ in range(3):
+            for a in paths:
+                for b in paths:
+                    calculate_similarity(a, b, cache=cache)
+        assert cache.misses == len(paths), f"Expected {len(paths)} reads, got {cache.misses}"
+        assert cache.get_content(paths[0]) == paths[0].read_text(), "mmap reads should match text reads"
+        
+        contents_only = FileContentCache()
+        for path in paths:
+            contents_only.get_content(path)
+        assert cache.current_bytes > contents_only.current_bytes, "Histograms should count against the cache"
+        
+        small = FileContentCache(max_bytes=contents_only.current_bytes // 2)
+        for path in paths:
+            small.get_content(path)
+        assert small.evictions > 0 and small.current_bytes <= small.max_bytes
+        for path in paths:
+            small.get_features(path, "line")
+        assert small.current_bytes <= small.max_bytes, "Features should be evicted with their content"
+        assert set(small._features) <= set(small._contents)
+        print("✓ Content cache test passed")
+
+
+def test_parallel_workers_match_serial():
+    """Test that comparing in worker processes gives the serial result."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        template = "".join(f"Step {n}: validate the order payload\n" for n in range(30))
+        for n in range(6):
+            (root / f"copy{n}.txt").write_text(template.replace(f"Step {n}:", f"Stage {n}:"))
+        (root / "other.txt").write_text("nothing in common ü\n" * 30)
+        
+        serial = compare_files(root, similarity_threshold=0.90)
+        parallel = compare_files(root, similarity_threshold=0.90, workers=2)
+        parallel_lsh = compare_files(root, similarity_threshold=0.90, engine="lsh", workers=2)
+        
+        assert serial, "Expected similar pairs"
+        assert parallel == serial, f"Expected {serial}, got {parallel}"
+        assert parallel_lsh == serial, f"Expected {serial}, got {parallel_lsh}"
+        print("✓ Parallel workers test passed")
+
+
+def test_prefilter_matches_exhaustive():
+    """Test that prefilters eliminate pairs without changing the result."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        body = "".join(f"record {n}: status=ok\n" for n in range(50))
+        (root / "a.txt").write_text(body)
+        (root / "b.txt").write_text(body + "record 50: status=ok\n")
+        (root / "short.txt").write_text("record 0: status=ok\n")
+        (root / "letters.txt").write_text("zyxwvutsrq" * 110)
+        
+        stats = {}
+        prefiltered = compare_files(root, similarity_threshold=0.90, size_window=False, stats=stats)
+        exhaustive = compare_files(root, similarity_threshold=0.90, prefilter=False, size_window=False)
+        
+        assert prefiltered == exhaustive, f"Expected {exhaustive}, got {prefiltered}"
+        assert stats.get("real_quick_ratio", 0) >= 3, f"Length bound should reject short.txt pairs: {stats}"
+        assert stats.get("quick_ratio", 0) >= 1, f"Character bound should reject letters.txt pairs: {stats}"
+        assert sum(stats.values()) == 6, f"Every pair should be counted once: {stats}"
+        assert content_similarity("", "", threshold=0.90) == 1.0, "Empty files are identical"
+        print("✓ Prefilter test passed")
+
+
+def test_size_window_skips_distant_lengths():
+    """Test that the size window only pairs files whose lengths are within reach."""
+    order, limits = build_size_window([100, 1000, None, 95, 122, 123], 0.90)
+    pairs = {(order[p], order[q]) for p in range(len(order)) for q in range(p + 1, limits[p])}
+    assert order == [3, 0, 4, 5, 1], f"Unexpected order {order}"
+    # 2 * 100 / (100 + 122) >= 0.90 but 2 * 100 / (100 + 123) < 0.90
+    assert pairs == {(3, 0), (0, 4), (4, 5)}, f"Unexpected pairs {pairs}"
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "tiny.txt").write_text("x = 1\n")
+        for n in range(3):
+            (root / f"big{n}.txt").write_text("payload line\n" * 100 + f"tail {n}\n")
+        
+        stats = {}
+        windowed = compare_files(root, similarity_threshold=0.90, stats=stats)
+        exhaustive = compare_files(root, similarity_threshold=0.90, size_window=False)
+        assert windowed == exhaustive, f"Expected {exhaustive}, got {windowed}"
+        assert stats["size_window"] == 3, f"Expected 3 skipped pairs, got {stats}"
+        print("✓ Size window test passed")
+
+
+def test_incremental_index_reuses_unchanged_files():
+    """Test that a rerun with an index only compares new and changed files."""
+    with tempfile.TemporaryDirectory() as tmpdir, tempfile.TemporaryDirectory() as indexdir:
+        root = Path(tmpdir)
+        index_path = Path(indexdir) / "index.db"
+        template = "".join(f"config key_{n} = value_{n}\n" for n in range(40))
+        for n in range(4):
+            (root / f"conf{n}.ini").write_text(template.replace(f"key_{n} ", f"opt_{n} "))
+        (root / "notes.md").write_text("# Notes\n" + "unrelated prose line\n" * 40)
+        
+        first = compare_files(root, similarity_threshold=0.90, index_path=index_path)
+        assert first == compare_files(root, similarity_threshold=0.90), "Indexed run should match a plain run"
+        
+        stats = {}
+        rerun = compare_files(root, similarity_threshold=0.90, index_path=index_path, stats=stats)
+        assert rerun == first, f"Expected {first}, got {rerun}"
+        assert stats.get("sequence_matcher", 0) == 0, f"Nothing changed, nothing to compare: {stats}"
+        
+        (root / "notes.md").write_text(template)
+        (root / "conf3.ini").unlink()
+        stats = {}
+        updated = compare_files(root, similarity_threshold=0.90, index_path=index_path, stats=stats)
+        expected = compare_files(root, similarity_threshold=0.90)
+        assert updated == expected, f"Expected {expected}, got {updated}"
+        assert stats.get("sequence_matcher", 0) == 3, f"Only notes.md pairs should be compared: {stats}"
+        
+        lsh = compare_files(root, similarity_threshold=0.90, engine="lsh", index_path=index_path)
+        assert lsh == expected, f"Expected {expected}, got {lsh}"
+        print("✓ Incremental index test passed")
+
+
+def test_index_threshold_change_rescans():
+    """Test that pairs dropped under a stricter threshold come back when it is relaxed."""
+    with tempfile.TemporaryDirectory() as tmpdir, tempfile.TemporaryDirectory() as indexdir:
+        root = Path(tmpdir)
+        index_path = Path(indexdir) / "index.db"
+        base = "".join(f"config key_{n} = value_{n}\n" for n in range(40))
+        edited = base
+        for n in range(0, 40, 3):
+            edited = edited.replace(f"value_{n}\n", f"other_{n}\n")
+        (root / "a.ini").write_text(base)
+        (root / "b.ini").write_text(edited)  # About 0.93 similar to a.ini
+        
+        loose = compare_files(root, similarity_threshold=0.90, index_path=index_path)
+        strict = compare_files(root, similarity_threshold=0.95, index_path=index_path)
+        relaxed = compare_files(root, similarity_threshold=0.90, index_path=index_path)
+        assert len(loose) == 1 and strict == [], f"Expected one pair at 0.90 only: {loose}, {strict}"
+        assert relaxed == loose, f"Expected {loose} after relaxing the threshold, got {relaxed}"
+        
+        lsh = compare_files(root, similarity_threshold=0.90, engine="lsh", index_path=index_path)
+        assert lsh == loose, f"Expected {loose} after switching engine, got {lsh}"
+    print("✓ Index threshold change test passed")
+
+
+def test_large_files_are_streamed():
+    """Test that files above the size limit get a sketch-based estimate."""
+    lines = [f"2024-01-01T00:00:{n % 60:02d} worker-{n % 7} handled request {n}\n" for n in range(3000)]
+    edited = list(lines)
+    edited[1500] = "2024-01-01T00:25:00 worker-3 crashed\n"
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "a.log").write_text("".join(lines))
+        (root / "b.log").write_text("".join(edited))
+        (root / "c.log").write_text("".join(sorted(lines, key=lambda line: line[::-1])))
+        
+        assert calculate_similarity(root / "a.log", root / "b.log", max_size_mb=0, stream_large_files=False) == 0.0
+        similar = calculate_similarity(root / "a.log", root / "b.log", max_size_mb=0)
+        shuffled = calculate_similarity(root / "a.log", root / "c.log", max_size_mb=0)
+        assert similar > 0.90, f"Expected > 0.90, got {similar}"
+        assert shuffled < 0.5, f"Expected < 0.5, got {shuffled}"
+        
+        stats = {}
+        pairs = compare_files(root, similarity_threshold=0.90, max_size_mb=0, stats=stats)
+        parallel = compare_files(root, similarity_threshold=0.90, max_size_mb=0, workers=2)
+        lsh = compare_files(root, similarity_threshold=0.90, max_size_mb=0, engine="lsh")
+        assert [{p1.name, p2.name} for p1, p2, _ in pairs] == [{"a.log", "b.log"}], f"Unexpected {pairs}"
+        assert parallel == pairs and lsh == pairs, f"Expected {pairs}, got {parallel} and {lsh}"
+        assert stats["stream_sketch"] == 3, f"Expected 3 streamed pairs: {stats}"
+    
+    sketch = compute_stream_sketch(io.StringIO("".join(lines * 20)), sketch_size=64)
+    assert len(sketch) == 64 and list(sketch) == sorted(sketch), "Sketch size should stay bounded"
+    print("✓ Large file streaming test passed")
+
+
+def test_line_metric():
+    """Test that the line metric compares files line by line."""
+    lines = [f"def handler_{n}(event):\n    return process(event, {n})\n" for n in range(40)]
+    edited = list(lines)
+    edited[20] = "def handler_20(event):\n    raise NotImplementedError\n"
+    
+    assert content_similarity("a\nb\n", "a  \nb\n", metric="line") == 1.0, "Trailing whitespace is ignored"
+    assert content_similarity("a\nb\n", "b\na\n", metric="line") == 0.5, "Expected one matching line of two"
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "a.py").write_text("".join(lines))
+        (root / "b.py").write_text("".join(edited))
+        (root / "c.py").write_text("".join(reversed(lines)))
+        
+        similar = calculate_similarity(root / "a.py", root / "b.py", metric="line")
+        assert similar == 79 / 80, f"Expected one changed line of 80, got {similar}"
+        
+        pairs = compare_files(root, similarity_threshold=0.90, metric="line")
+        parallel = compare_files(root, similarity_threshold=0.90, metric="line", workers=2)
+        unfiltered = compare_files(root, similarity_threshold=0.90, metric="line", prefilter=False,
+                                   size_window=False)
+        assert [{p1.name, p2.name} for p1, p2, _ in pairs] == [{"a.py", "b.py"}], f"Unexpected {pairs}"
+        assert parallel == pairs and unfiltered == pairs, f"Expected {pairs}, got {parallel} and {unfiltered}"
+        
+        # Streamed files are measured in the same units as files read whole
+        (root / "d.py").write_text("é\r\n\n" * 30000 + "tail")
+        for metric in ("char", "line"):
+            whole = FileContentCache().get_length(root / "d.py", metric)
+            streamed = FileContentCache(max_size_mb=0).get_length(root / "d.py", metric)
+            assert streamed == whole, f"Expected {whole} {metric} units when streamed, got {streamed}"
+    print("✓ Line metric test passed")
+
+
+def test_get_all_files_prunes_and_honours_gitignore():
+    """Test that the walker skips excluded, ignored and binary files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        for name in ["src/app.py", "src/notes", "node_modules/pkg/index.js", "logs/run.log",
+                     "docs/keep.log", "docs/draft.md", "docs/sub/draft.md"]:
+            (root / name).parent.mkdir(parents=True, exist_ok=True)
+            (root / name).write_text("content\n")
+        (root / "src" / "image.bin").write_bytes(bytes(range(256)))
+        (root / ".gitignore").write_text("# build output\nlogs/\n*.log\n!keep.log\n")
+        (root / "docs" / ".gitignore").write_text("/draft.md\n")
+        
+        sizes = {}
+        files = get_all_files(root, sizes=sizes)
+        names = [file_path.relative_to(root).as_posix() for file_path in files]
+        assert names == [".gitignore", "docs/.gitignore", "docs/keep.log", "docs/sub/draft.md",
+                         "src/app.py", "src/notes"], f"Unexpected {names}"
+        assert sizes == {file_path: file_path.stat().st_size for file_path in files}, "Sizes should match stat()"
+        
+        unfiltered = get_all_files(root, respect_gitignore=False, scan_threads=1)
+        assert len(unfiltered) == 8, f"Expected every text file outside node_modules, got {unfiltered}"
+    print("✓ Directory walker test passed")
+
+
+def test_text_sniffer_reuses_prefix():
+    """Test that sniffed files are classified from their first block and its bytes reused."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "notes").write_bytes("line one\r\nligne deux é\r\n".encode("utf-8") * 400)
+        (root / "blob").write_bytes(b"header\0\0\x01\x02")
+        (root / "split").write_bytes(b"a" * 7 + "é".encode("utf-8"))
+        
+        sniffer = TextSniffer(sniff_size=8)
+        assert sniffer.is_text(root / "notes")
+        assert not sniffer.is_text(root / "blob"), "NUL bytes mark a binary file"
+        assert sniffer.is_text(root / "split"), "A character cut at the block end is still text"
+        assert sniffer.is_text(root / "script.py"), "Text names are accepted without opening"
+        assert sniffer.sniffed == 3, f"Only files without a text name should be sniffed, got {sniffer.sniffed}"
+        
+        cache = FileContentCache(sniffer=sniffer)
+        expected = read_file_content(root / "notes")
+        assert cache.get_content(root / "notes") == expected, "Prefix reuse should not change the content"
+        assert sniffer.take_prefix(root / "notes") is None, "The prefix should be handed over once"
+        assert not is_text_file(root / "blob")
+    print("✓ Text sniffer test passed")
+
+
+def test_exact_duplicates_are_collapsed():
+    """Test that byte-identical files are compared once and reported as identical."""
+    base = "".join(f"item {n}: value={n * n}\n" for n in range(40))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        for name in ["a.txt", "copy1.txt", "copy2.txt"]:
+            (root / name).write_text(base)
+        (root / "near.txt").write_text(base.replace("item 7:", "item 7b:"))
+        (root / "other.txt").write_text("unrelated content\n" * 20)
+        
+        stats = {}
+        collapsed = compare_files(root, similarity_threshold=0.90, stats=stats)
+        full = compare_files(root, similarity_threshold=0.90, exact_duplicates=False)
+        assert collapsed == full, f"Expected {full}, got {collapsed}"
+        assert len(collapsed) == 6, f"Expected every pair among the 4 similar files, got {collapsed}"
+        assert stats["exact_duplicate"] == 2, f"Expected 2 copies collapsed: {stats}"
+        
+        # Incremental runs keep every member of a group, even after its representative changes
+        index_path = root / "index.db"
+        first = compare_files(root, similarity_threshold=0.90, index_path=index_path)
+        (root / "a.txt").write_text("rewritten\n" * 40)
+        second = compare_files(root, similarity_threshold=0.90, index_path=index_path)
+        expected = compare_files(root, similarity_threshold=0.90, exact_duplicates=False)
+        names = lambda pairs: [(p1.name, p2.name, round(sim, 6)) for p1, p2, sim in pairs]
+        assert names(first) == names(full), f"Expected {full}, got {first}"
+        assert names(second) == names(expected), f"Expected {expected}, got {second}"
+    print("✓ Exact duplicate test passed")
+
+
+def test_duplicate_collapse_keeps_argument_order():
+    """Test that copies on either side of a partner are compared in their own order."""
+    # SequenceMatcher.ratio() scores these 0.75 one way round and 0.58 the other
+    copy, partner = "bbabaababaab\n", "abbaabbabbaa\n"
+    assert content_similarity(copy, partner) < 0.70 <= content_similarity(partner, copy)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "a_copy.txt").write_text(copy)
+        (root / "b_partner.txt").write_text(partner)
+        (root / "c_copy.txt").write_text(copy)
+        
+        collapsed = compare_files(root, similarity_threshold=0.70)
+        full = compare_files(root, similarity_threshold=0.70, exact_duplicates=False)
+        parallel = compare_files(root, similarity_threshold=0.70, workers=2)
+        names = [(p1.name, p2.name) for p1, p2, _ in collapsed]
+        assert collapsed == full == parallel, f"Expected {full}, got {collapsed} and {parallel}"
+        assert names == [("a_copy.txt", "c_copy.txt"), ("b_partner.txt", "c_copy.txt")], \
+            f"Only the copy after the partner should match it, got {collapsed}"
+        clusters = cluster_matches(3, [(1, 2, 0.75)], [[0, 2]])
+        assert clusters[0]["pairs"] == 2 and clusters[0]["representative"] == 2, f"Unexpected {clusters}"
+    print("✓ Argument order test passed")
+
+
+def test_clusters_group_transitive_matches():
+    """Test that clusters merge chains of matches and duplicate groups."""
+    # 0-1-2 form a chain, 3/4/5 are identical copies matching 6, 7 is alone
+    matches = [(0, 1, 0.95), (1, 2, 0.92), (3, 6, 0.91)]
+    clusters = cluster_matches(8, matches, [[3, 4, 5]])
+    
+    assert [cluster["members"] for cluster in clusters] == [[3, 4, 5, 6], [0, 1, 2]], f"Unexpected {clusters}"
+    assert clusters[0]["pairs"] == 6, "3 pairs among the copies plus 3 copies matching file 6"
+    assert clusters[0]["representative"] == 3, "Every member is similar to 3 others; ties go to the lowest index"
+    assert clusters[1]["representative"] == 1, "File 1 is similar to both ends of the chain"
+    assert (clusters[1]["min_similarity"], clusters[1]["max_similarity"]) == (0.92, 0.95)
+    
+    files = [Path(f"f{index}.txt") for index in range(8)]
+    json_out, csv_out = io.StringIO(), io.StringIO()
+    write_clusters_json(clusters, files, json_out)
+    write_clusters_csv(clusters, files, csv_out)
+    records = json.loads(json_out.getvalue())
+    rows = list(csv.DictReader(io.StringIO(csv_out.getvalue())))
+    assert records[1]["members"] == ["f0.txt", "f1.txt", "f2.txt"], f"Unexpected {records}"
+    assert len(rows) == 7 and rows[0]["representative"] == "f3.txt", f"Unexpected {rows}"
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        for name in ["a.txt", "b.txt", "c.txt"]:
+            (root / name).write_text("same content\n" * 10)
+        pairs = compare_files(root, similarity_threshold=0.90)
+        assert sorted(iter_similar_pairs(root, similarity_threshold=0.90)) == sorted(pairs)
+    print("✓ Clustering test passed")
+
+
+def test_results_stream_resumes_after_checkpoint():
+    """Test that an interrupted results stream is resumed without repeating work."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / "tree"
+        root.mkdir()
+        base = "".join(f"entry {n}\n" for n in range(80))
+        for n in range(6):
+            (root / f"f{n}.txt").write_text(base.replace(f"entry {n}\n", "changed\n"))
+        (root / "copy.txt").write_text((root / "f0.txt").read_text())
+        results_path = Path(tmpdir) / "results.jsonl"
+        
+        interval = compare_file_similarity.CHECKPOINT_INTERVAL
+        compare_file_similarity.CHECKPOINT_INTERVAL = 4
+        try:
+            writer = ResultsWriter.open(results_path, root)
+            expected = scan_similarity(root, 0.90, size_window=False, results=writer)
+            writer.finish()
+            writer.close()
+            
+            # Simulate a crash after the second checkpoint, mid-way through a record
+            lines = results_path.read_text().splitlines(keepends=True)
+            checkpoints = [n for n, line in enumerate(lines) if '"checkpoint"' in line]
+            results_path.write_text("".join(lines[:checkpoints[2] + 2]) + '{"type": "pa')
+            
+            stats = {}
+            writer = ResultsWriter.open(results_path, root, resume=True)
+            resumed = scan_similarity(root, 0.90, size_window=False, stats=stats, results=writer)
+            writer.finish()
+            writer.close()
+        finally:
+            compare_file_similarity.CHECKPOINT_INTERVAL = interval
+        
+        assert resumed == expected, f"Expected {expected}, got {resumed}"
+        assert sum(stats.values()) - stats["exact_duplicate"] == 15 - 8, f"Only 7 comparisons remain: {stats}"
+        header, files, matches, groups = load_results(results_path)
+        assert len(matches) == 15 and len(groups) == 1, f"Every pair should be recorded once: {matches}"
+        
+        # A crash before the first interval leaves only the initial checkpoint
+        lines = results_path.read_text().splitlines(keepends=True)
+        checkpoint = next(n for n, line in enumerate(lines) if '"checkpoint"' in line)
+        results_path.write_text("".join(lines[:checkpoint + 1]))
+        writer = ResultsWriter.open(results_path, root, resume=True)
+        resumed = scan_similarity(root, 0.90, size_window=False, results=writer)
+        writer.finish()
+        writer.close()
+        header, files, matches, groups = load_results(results_path)
+        assert resumed == expected, f"Expected {expected}, got {resumed}"
+        assert len(matches) == 15 and groups == [[0, 1]], f"Nothing should be recorded twice: {groups} {matches}"
+        
+        writer = ResultsWriter.open(results_path, root, resume=True)
+        try:
+            scan_similarity(root, 0.80, size_window=False, results=writer)
+            assert False, "Resuming with another threshold should fail"
+        except ValueError:
+            pass
+        finally:
+            writer.close()
+    print("✓ Results stream resume test passed")
+
+
+def test_benchmark_corpus_is_reproducible():
+    """Test that benchmark corpora are reproducible and the report is complete."""
+    with tempfile.TemporaryDirectory() as dir1, tempfile.TemporaryDirectory() as dir2:
+        corpus = generate_corpus(Path(dir1), num_files=12, mean_size=300, near_duplicate_rate=0.5, seed=7)
+        generate_corpus(Path(dir2), num_files=12, mean_size=300, near_duplicate_rate=0.5, seed=7)
+        contents = [{path.relative_to(root).as_posix(): path.read_text() for path in root.rglob("*.txt")}
+                    for root in (Path(dir1), Path(dir2))]
+        assert len(contents[0]) == 12 and contents[0] == contents[1], "Same seed should give the same corpus"
+        
+        report = run_benchmark(Path(dir1), corpus, ["exhaustive"], isolate=False)
+        reference, exhaustive = report["results"]
+        assert reference["mode"] == "reference" and reference["matches"] > 0, f"Unexpected {reference}"
+        assert (exhaustive["precision"], exhaustive["recall"]) == (1.0, 1.0), f"Unexpected {exhaustive}"
+        assert exhaustive["pairs_per_sec"] > 0 and report["corpus"]["seed"] == 7
+    print("✓ Benchmark corpus test passed")
+
+
+def test_find_similar_queries_the_index():
+    """Test that nearest-neighbour queries use the index band buckets."""
+    base = "".join(f"def step_{n}(state):\n    return state + {n}\n" for n in range(40))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / "tree"
+        root.mkdir()
+        (root / "a.py").write_text(base)
+        (root / "b.py").write_text(base.replace("step_3(", "step_three("))
+        (root / "c.py").write_text(base.replace("return", "yield"))
+        (root / "other.py").write_text("print('unrelated')\n" * 30)
+        index_path = Path(tmpdir) / "index.db"
+        compare_files(root, similarity_threshold=0.90, index_path=index_path)
+        
+        query = Path(tmpdir) / "query.py"
+        query.write_text(base.replace("step_7(", "step_seven("))
+        results = find_similar(query, index_path, k=5)
+        assert [path.name for path, _ in results] == ["a.py", "b.py"], f"Unexpected {results}"
+        assert results[0][1] >= results[1][1] >= 0.90, f"Results should be ranked: {results}"
+        assert len(find_similar(query, index_path, k=1)) == 1, "k limits the number of results"
+        
+        # Indexed files do not match themselves, and rescans update the buckets
+        assert [path.name for path, _ in find_similar(root / "a.py", index_path)] == ["b.py"]
+        (root / "other.py").write_text(base)
+        compare_files(root, similarity_threshold=0.90, index_path=index_path)
+        assert [path.name for path, _ in find_similar(root / "a.py", index_path)] == ["other.py", "b.py"]
+    print("✓ Nearest-neighbour query test passed")
+
+
 def main():
     """Run all tests."""
     print("Running unit tests for compare_file_similarity.py")
@@ -87,6 +598,24 @@ def main():
         test_completely_different_files()
         test_similar_files()
         test_is_text_file_detection()
+        test_minhash_signatures()
+        test_lsh_engine_matches_exhaustive()
+        test_content_cache_reads_each_file_once()
+        test_parallel_workers_match_serial()
+        test_prefilter_matches_exhaustive()
+        test_size_window_skips_distant_lengths()
+        test_incremental_index_reuses_unchanged_files()
+        test_index_threshold_change_rescans()
+        test_large_files_are_streamed()
+        test_line_metric()
+        test_get_all_files_prunes_and_honours_gitignore()
+        test_text_sniffer_reuses_prefix()
+        test_exact_duplicates_are_collapsed()
+        test_duplicate_collapse_keeps_argument_order()
+        test_clusters_group_transitive_matches()
+        test_results_stream_resumes_after_checkpoint()
+        test_benchmark_corpus_is_reproducible()
+        test_find_similar_queries_the_index()
         
         print("=" * 60)
         print("All tests passed! ✓")
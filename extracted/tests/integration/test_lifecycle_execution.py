@@ -0,0 +1,120 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("opentelemetry")
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "core"))
+
+from runner import PluginRegistry, run_plugin_graph  # noqa: E402
+
+SLOW_HANDLER = """
+import time
+
+def handle(input_data):
+    start = time.monotonic()
+    time.sleep(0.3)
+    return {"status": "success", "plugin": NAME, "start": start,
+            "end": time.monotonic(), "trace_id": input_data["trace_id"]}
+"""
+
+ASYNC_HANDLER = """
+import asyncio
+
+async def handle(input_data):
+    await asyncio.sleep(0.3)
+    return {"status": "success", "plugin": NAME, "trace_id": input_data["trace_id"]}
+"""
+
+FAILING_HANDLER = """
+def handle(input_data):
+    raise ValueError("broken plugin")
+"""
+
+
+def write_plugin(plugins_dir: Path, name: str, source: str, **spec) -> None:
+    plugin_dir = plugins_dir / name
+    plugin_dir.mkdir()
+    spec = {
+        "plugin_name": name,
+        "lifecycle_event": "FileDetected",
+        "entry_point": "plugin.py",
+        "handler": "handle",
+        **spec,
+    }
+    (plugin_dir / "plugin.spec.json").write_text(json.dumps(spec))
+    (plugin_dir / "plugin.py").write_text(f"NAME = {name!r}\n{source}")
+
+
+def run(plugins_dir: Path) -> list:
+    plugins = PluginRegistry(plugins_dir, use_index=False).plugins_for_event(
+        "FileDetected"
+    )
+    return run_plugin_graph(plugins, {"file_path": "a.txt", "trace_id": "trace-1"})
+
+
+class TestLifecycleExecution:
+    """Tests for concurrent plugin execution within a lifecycle event"""
+
+    def test_independent_plugins_run_concurrently(self, tmp_path):
+        """Test that independent plugins overlap and dependents wait"""
+        write_plugin(tmp_path, "scan", SLOW_HANDLER)
+        write_plugin(tmp_path, "hash", SLOW_HANDLER)
+        write_plugin(tmp_path, "notify", ASYNC_HANDLER, execution_mode="async")
+        write_plugin(tmp_path, "archive", SLOW_HANDLER, depends_on=["scan", "hash"])
+
+        start = time.monotonic()
+        results = run(tmp_path)
+        elapsed = time.monotonic() - start
+
+        by_name = {result["plugin"]: result for result in results}
+        assert [result["plugin"] for result in results] == [
+            "hash",
+            "notify",
+            "scan",
+            "archive",
+        ]
+        assert elapsed < 0.9
+        assert by_name["archive"]["start"] >= by_name["scan"]["end"]
+        assert by_name["archive"]["start"] >= by_name["hash"]["end"]
+        assert {result["trace_id"] for result in results} == {"trace-1"}
+
+    def test_process_mode(self, tmp_path):
+        """Test that CPU-bound plugins run in the process pool"""
+        write_plugin(tmp_path, "cpu", SLOW_HANDLER, execution_mode="process")
+
+        results = run(tmp_path)
+
+        assert results[0]["plugin"] == "cpu"
+        assert results[0]["trace_id"] == "trace-1"
+
+    def test_failed_dependency_skips_dependents(self, tmp_path):
+        """Test that plugins depending on a failed plugin are not run"""
+        write_plugin(tmp_path, "broken", FAILING_HANDLER)
+        write_plugin(tmp_path, "after", SLOW_HANDLER, depends_on=["broken"])
+
+        results = run(tmp_path)
+
+        assert results[0]["error_message"] == "broken plugin"
+        assert results[1]["status"] == "error"
+        assert "broken" in results[1]["error_message"]
+
+    def test_cycles_and_missing_dependencies_are_rejected(self, tmp_path):
+        """Test that unrunnable dependency graphs are reported by the registry"""
+        write_plugin(tmp_path, "a", SLOW_HANDLER, depends_on=["b"])
+        write_plugin(tmp_path, "b", SLOW_HANDLER, depends_on=["a"])
+        write_plugin(tmp_path, "c", SLOW_HANDLER, depends_on=["missing"])
+        write_plugin(tmp_path, "d", SLOW_HANDLER)
+
+        registry = PluginRegistry(tmp_path, use_index=False)
+
+        assert [p.name for p in registry.plugins_for_event("FileDetected")] == ["d"]
+        assert registry.errors == {
+            "a": ["part of a dependency cycle"],
+            "b": ["part of a dependency cycle"],
+            "c": ["depends on unavailable plugin missing"],
+        }
@@ -0,0 +1,142 @@
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("opentelemetry")
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "core"))
+
+from runner import (  # noqa: E402
+    PluginRegistry,
+    get_plugin_worker,
+    shutdown_plugin_workers,
+)
+
+
+def write_plugin(plugins_dir: Path, name: str, **spec) -> Path:
+    plugin_dir = plugins_dir / name
+    plugin_dir.mkdir(parents=True, exist_ok=True)
+    spec = {
+        "plugin_name": name,
+        "lifecycle_event": "FileDetected",
+        "entry_point": f"{name}.py",
+        "handler": "handle",
+        **spec,
+    }
+    (plugin_dir / "plugin.spec.json").write_text(json.dumps(spec))
+    (plugin_dir / f"{name}.py").write_text(
+        "import sys\n"
+        "sys.modules.setdefault('loaded_plugins', []).append(__name__)\n"
+        "def handle(input_data):\n"
+        f"    return {{'plugin': '{name}', 'trace_id': input_data['trace_id']}}\n"
+    )
+    return plugin_dir / "plugin.spec.json"
+
+
+class TestPluginRegistry:
+    """Tests for plugin discovery and the cached spec index"""
+
+    def test_specs_are_indexed_by_event(self, tmp_path):
+        """Test that valid, enabled plugins are registered by event and name"""
+        write_plugin(tmp_path, "zeta")
+        write_plugin(tmp_path, "alpha")
+        write_plugin(tmp_path, "merge-check", lifecycle_event="PreMerge")
+        write_plugin(tmp_path, "disabled", enabled=False)
+        write_plugin(tmp_path, "broken", entry_point="")
+
+        registry = PluginRegistry(tmp_path)
+
+        assert [p.name for p in registry.plugins_for_event("FileDetected")] == [
+            "alpha",
+            "zeta",
+        ]
+        assert registry.events() == ["FileDetected", "PreMerge"]
+        assert registry.errors == {"broken": ["missing entry_point"]}
+
+    def test_entry_points_are_imported_lazily(self, tmp_path):
+        """Test that a plugin module is only imported when it first runs"""
+        write_plugin(tmp_path, "lazy")
+        sys.modules.pop("loaded_plugins", None)
+
+        plugin = PluginRegistry(tmp_path).plugins_for_event("FileDetected")[0]
+        assert "loaded_plugins" not in sys.modules
+
+        result = plugin.execute({"trace_id": "t1"})
+        plugin.execute({"trace_id": "t2"})
+
+        assert result == {"plugin": "lazy", "trace_id": "t1"}
+        assert sys.modules["loaded_plugins"] == ["r_pipeline_plugins.lazy"]
+
+    def test_index_cache_is_invalidated_by_spec_mtime(self, tmp_path):
+        """Test that unchanged specs come from the cache and edited ones are re-read"""
+        write_plugin(tmp_path, "cached")
+        spec_path = write_plugin(tmp_path, "edited")
+        PluginRegistry(tmp_path)
+
+        unchanged = PluginRegistry(tmp_path)
+        write_plugin(tmp_path, "edited", lifecycle_event="PreMerge")
+        stat = spec_path.stat()
+        os.utime(spec_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        changed = PluginRegistry(tmp_path)
+
+        assert unchanged.parsed == 0
+        assert changed.parsed == 1
+        assert [p.name for p in changed.plugins_for_event("PreMerge")] == ["edited"]
+
+    def test_handler_and_worker_mode_are_exclusive(self, tmp_path):
+        """Test that a spec cannot pick both the in-process and the worker path"""
+        write_plugin(tmp_path, "both", worker_mode=True)
+
+        registry = PluginRegistry(tmp_path, use_index=False)
+
+        assert registry.plugins_for_event("FileDetected") == []
+        assert registry.errors == {
+            "both": ["handler and worker_mode are mutually exclusive"]
+        }
+
+    def test_deduplicator_runs_in_its_worker(self):
+        """Test that the registered deduplicator answers from its long-lived worker"""
+        registry = PluginRegistry(ROOT / "plugins", use_index=False)
+        plugin = next(
+            p
+            for p in registry.plugins_for_event("FileDetected")
+            if p.name == "deduplicator"
+        )
+
+        first = plugin.execute(
+            {"file_path": "reg_a.txt", "file_hash": "reg1", "trace_id": "r1"}
+        )
+        second = plugin.execute(
+            {"file_path": "reg_b.txt", "file_hash": "reg1", "trace_id": "r2"}
+        )
+        worker = get_plugin_worker(str(plugin.entry_point))
+        ping = worker.execute({"command": "ping"})
+        shutdown_plugin_workers()
+
+        assert first["is_duplicate"] is False
+        assert second["duplicate_of"] == "reg_a.txt"
+        assert ping["pid"] != os.getpid()
+        assert plugin._module is None
+
+    def test_concurrent_loads_restore_sys_path(self, tmp_path):
+        """Test that plugins loaded from many threads at once leave sys.path as it was"""
+        names = [f"concurrent{number}" for number in range(8)]
+        for name in names:
+            write_plugin(tmp_path, name)
+        plugins = PluginRegistry(tmp_path, use_index=False).plugins_for_event(
+            "FileDetected"
+        )
+        path_before = list(sys.path)
+
+        with ThreadPoolExecutor(max_workers=len(plugins)) as executor:
+            results = list(
+                executor.map(lambda plugin: plugin.execute({"trace_id": "c"}), plugins)
+            )
+
+        assert [result["plugin"] for result in results] == names
+        assert sys.path == path_before
@@ -0,0 +1,61 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("opentelemetry")
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "core"))
+
+from runner import PluginWorker, get_plugin_worker, shutdown_plugin_workers  # noqa: E402
+
+
+class TestPluginWorker:
+    """Integration tests for long-lived plugin workers"""
+
+    def test_worker_is_reused_across_requests(self):
+        """Test that one deduplicator worker keeps its state between requests"""
+        entry_point = str(ROOT / "plugins" / "deduplicator" / "deduplicator.py")
+        worker = get_plugin_worker(entry_point)
+
+        first = worker.execute({"file_path": "a.txt", "file_hash": "h1", "trace_id": "t1"})
+        second = get_plugin_worker(entry_point).execute(
+            {"file_path": "b.txt", "file_hash": "h1", "trace_id": "t2"}
+        )
+        shutdown_plugin_workers()
+
+        assert first["is_duplicate"] is False
+        assert second["duplicate_of"] == "a.txt"
+
+    def test_worker_restarts_after_exit(self):
+        """Test that a worker that died is started again on the next request"""
+        entry_point = str(ROOT / "plugins" / "deduplicator" / "deduplicator.py")
+        worker = get_plugin_worker(entry_point)
+        worker.execute({"command": "ping"})
+        worker.close()
+
+        result = worker.execute({"command": "ping"})
+        shutdown_plugin_workers()
+
+        assert result["status"] == "success"
+
+    def test_worker_is_killed_and_restarted_after_timeout(self, tmp_path):
+        """Test that a worker missing its deadline is killed and replaced"""
+        entry_point = tmp_path / "slow.py"
+        entry_point.write_text(
+            "import json, sys, time\n"
+            "for line in sys.stdin:\n"
+            "    request = json.loads(line)\n"
+            "    time.sleep(request.get('sleep', 0))\n"
+            "    print(json.dumps({'status': 'success'}), flush=True)\n"
+        )
+        worker = PluginWorker(str(entry_point))
+
+        with pytest.raises(subprocess.TimeoutExpired):
+            worker.execute({"sleep": 30}, timeout=0.5)
+        result = worker.execute({}, timeout=10)
+        worker.close()
+
+        assert result["status"] == "success"